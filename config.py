@@ -1,20 +1,136 @@
+# Game configuration, validated and compiled once at startup
 import json
+from types import MappingProxyType
+
+from game.board import Board
+from game.playfield import ShapeTable
+
+
+class ConfigError(ValueError):
+    """Raised for invalid configuration files."""
+
+
+def freeze(value):
+    """Get a read-only copy of JSON data: dicts become mappings that can't
+    be modified and lists become tuples.
+    """
+    if isinstance(value, dict):
+        return MappingProxyType({k: freeze(v) for k, v in value.items()})
+    elif isinstance(value, list):
+        return tuple(freeze(v) for v in value)
+    return value
 
 
 class Config:
     """Simple configuration loader."""
 
-    def __init__(self, data):
-        self._config = json.loads(record)
+    def __init__(self, data: dict):
+        """
+        data - Configuration data, frozen (see freeze).
+        """
+        self._config = freeze(data)
 
     @classmethod
     def from_file(cls, path: str):
-        with f as open(path):
-            return cls(json.loads(f.read()))
+        with open(path) as f:
+            return cls(json.load(f))
 
-    def get(key, default):
+    def get(self, key: str, default=None):
         """Get configuration data from key."""
-        try:
-            return key
-        except:
-            return default
+        return self._config.get(key, default)
+
+
+class GameConfig:
+    """Game rules compiled from standard.json, its blocks file and the
+    gravity frames. Every table is read-only, so every room and board shares
+    one GameConfig by reference.
+    """
+
+    def __init__(self, standard: dict, blocks: dict, frames: list):
+        """
+        standard - Game config (see config/README.md).
+        blocks - Block config, with "blocks" grids and their "colors".
+        frames - Frames per row of gravity, by level.
+        Raises ConfigError if any of them is invalid.
+        """
+        playfield = _require(_require(standard, "board", dict), "playfield",
+            dict)
+        self.width = _require(playfield, "width", int)
+        self.height = _require(playfield, "height", int)
+        if self.width < 4 or self.height < 4:
+            raise ConfigError("playfield must be at least 4 x 4")
+        self.layout = freeze(standard["board"].get("layout", {}))
+        auto_repeat = standard["board"].get("autoRepeat", {})
+        # Held input frames: DAS, ARR and soft drop (see Board.set_auto_repeat)
+        self.auto_repeat = (auto_repeat.get("das", Board.DAS),
+            auto_repeat.get("arr", Board.ARR),
+            auto_repeat.get("softDrop", Board.SOFT_DROP_RATE))
+        for count in self.auto_repeat:
+            if not isinstance(count, int) or isinstance(count, bool) or \
+                count < 0:
+                raise ConfigError("autoRepeat frames must be ints >= 0")
+        if self.auto_repeat[2] < 1:
+            raise ConfigError("autoRepeat softDrop must be >= 1")
+
+        grids = _require(blocks, "blocks", dict)
+        if len(grids) < 1:
+            raise ConfigError("blocks must not be empty")
+        for name, grid in grids.items():
+            _check_block(name, grid)
+        self.blocks = freeze(grids)
+
+        colors = _require(blocks, "colors", list)
+        if len(colors) < len(grids):
+            raise ConfigError("colors must have one color per block")
+        for color in colors:
+            if not (isinstance(color, list) and len(color) == 3 and
+                all(isinstance(c, int) and 0 <= c <= 255 for c in color)):
+                raise ConfigError("color {} is not RGB".format(color))
+        self.colors = freeze(colors)
+
+        if not (isinstance(frames, list) and len(frames) > 0):
+            raise ConfigError("frames must be a list of levels")
+        for f in frames:
+            if not (isinstance(f, (int, float)) and not isinstance(f, bool)
+                and f > 0):
+                raise ConfigError("frames per row must be > 0: {}".format(f))
+        self.gravity = freeze(frames)
+
+        self.shapes = ShapeTable(self.blocks)
+
+    @classmethod
+    def from_files(cls, path: str = "config/standard.json",
+        frames_path: str = "config/frames.json"):
+        """Load the game config at path and the blocks file it names."""
+        standard = _load(path)
+        blocks_path = _require(_require(standard, "blocks", dict), "path",
+            str)
+        return cls(standard, _load(blocks_path), _load(frames_path))
+
+
+def _load(path: str):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError) as err:
+        raise ConfigError("Can't load {}: {}".format(path, err)) from err
+
+
+def _require(data: dict, key: str, kind: type):
+    """Get data[key], raising ConfigError if missing or not of kind."""
+    if not isinstance(data, dict) or key not in data:
+        raise ConfigError("missing {}".format(key))
+    value = data[key]
+    if not isinstance(value, kind) or isinstance(value, bool):
+        raise ConfigError("{} must be {}".format(key, kind.__name__))
+    return value
+
+
+def _check_block(name: str, grid):
+    """Raise ConfigError if grid isn't a square grid of 0s and 1s."""
+    if not (isinstance(grid, list) and len(grid) > 0 and
+        all(isinstance(row, list) and len(row) == len(grid) for row in grid)):
+        raise ConfigError("block {} must be a square grid".format(name))
+    values = {v for row in grid for v in row}
+    if not values <= {0, 1} or 1 not in values:
+        raise ConfigError("block {} must be 0s and 1s".format(name))
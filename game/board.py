@@ -1,7 +1,10 @@
 # Handles the playfield gameplay and HUD
 from copy import copy
+from itertools import islice
+from json import dumps
+from zlib import crc32
 
-from game.playfield import PlayField, Step
+from game.playfield import PlayField, Step, ShapeTable
 from game.generator import Generator
 from game import util
 from game.grid import Grid
@@ -55,25 +58,80 @@ class GameInput:
         """Hold piece."""
         return "hold"
 
+    @staticmethod
+    def rotate_180() -> str:
+        """Rotate twice."""
+        return "rotate_180"
+
+    @staticmethod
+    def opcode(name: str) -> int:
+        """Get the opcode of an input name, -1 if it is unknown."""
+        return OPCODES.get(name, -1)
+
+
+# Input names by opcode. Opcodes are sent by controllers, so new inputs
+# must be appended (see Board.register_input).
+INPUTS = [GameInput.left(), GameInput.right(), GameInput.soft_drop(),
+    GameInput.hard_drop(), GameInput.rotate_left(), GameInput.rotate_right(),
+    GameInput.hold(), GameInput.pause(), GameInput.rotate_180()]
+OPCODES = {name: op for op, name in enumerate(INPUTS)}
+
+FRAME_RATE = 60 # Frames per second of gravity and auto-repeat
+
+# Input events, see Board.perform
+TAP = 0
+PRESS = 1
+RELEASE = 2
+
 
 class Board:
     """A Board is essentially a player's field and related game stats."""
 
+    # Steps are never modified, so inputs share them
+    _LEFT = Step.horizontal(True)
+    _RIGHT = Step.horizontal(False)
+    _DOWN = Step.vertical()
+    _ROTATE_LEFT = Step.rotate(1)
+    _ROTATE_RIGHT = Step.rotate(3)
+
+    # Input handlers by opcode, filled in below the class
+    _DISPATCH = []
+
+    # Auto-repeated inputs
+    _SHIFTS = {OPCODES[GameInput.left()]: _LEFT,
+        OPCODES[GameInput.right()]: _RIGHT}
+    _SOFT_DROP = OPCODES[GameInput.soft_drop()]
+
+    # Default auto-repeat frames (updates), see set_auto_repeat
+    DAS = 10
+    ARR = 2
+    SOFT_DROP_RATE = 2
+    # Frames (updates) a landed block rests before gravity locks it
+    LOCK_DELAY = 30
+
     def __init__(self, width: int, height: int, block_data: dict,
-        frames: list, name: str="player", init_level: int = 0):
+        frames: list, name: str="player", init_level: int = 0,
+        shapes: ShapeTable = None, seed: int = None):
         """
         width - Width of entire board.
         height - Height of entire board.
-        frames - List of gravity frames for each level.
+        frames - List of gravity frames per row for each level, below 1 for
+            several rows per frame.
         name - Name of player.
         init_level - Initial level.
+        shapes - ShapeTable of block_data to share, None to make one.
+        seed - Seed of the block generator, None for a random one. Boards
+            made with the same seed and given the same inputs on the same
+            updates play out the same.
         """
         self._width = width
         self._height = height
-        self._field = PlayField(block_data, "", init_level, frames)
+        self._field = PlayField(block_data, "", init_level, frames,
+            dimensions=(height, width), shapes=shapes)
 
         # Gameplay state
-        self._fall_time = 0 # Timemes since last gravity effect
+        self._fall_rows = 0 # Rows fallen since the last whole row
+        self._rest_frames = 0 # Frames the active block has been landed
         self._clearing_time = 0 # Time so far animating line clear
         self._prev_pos = None # Last position placed
         self._score = 0
@@ -83,20 +141,133 @@ class Board:
         self.placed = False # Active block placed?
         self._lines = 0
         self._level = 0
+        self._hud_version = 0 # Bumped when a HUD value changes, see get_hud
+
+        # Held inputs
+        self._das = Board.DAS
+        self._arr = Board.ARR
+        self._soft_drop_rate = Board.SOFT_DROP_RATE
+        self._shifts_held = [] # Held shift opcodes, latest last
+        self._shift_frames = 0 # Frames the latest shift has been held
+        self._soft_drop_held = False
+        self._soft_drop_frames = 0
 
         # Generator
-        self._generator = Generator(list(block_data.keys()), 4)
+        self._generator = Generator(list(block_data.keys()), 4, seed)
+        self._spawn_next() # The first block comes from the generator too
 
         self.set_score(self._score)
         self.set_lines(0)
         self.set_name(self._name)
         self.set_level(0)
 
+    def get_field(self) -> PlayField:
+        """Get the board's playfield."""
+        return self._field
+
+    def get_level(self) -> int:
+        """Get the current level."""
+        return self._level
+
+    def get_preview(self) -> list:
+        """Get the names of the upcoming blocks, next first."""
+        names = self._generator.names
+        return [names[i] for i in
+            self._generator.stack[:self._generator.preview_size]]
+
+    def get_hud(self) -> dict:
+        """Get the HUD values, keyed by their config layout names."""
+        generator = self._generator
+        names = generator.names
+        return {
+            "points": self._score,
+            "lines": self._lines,
+            "level": self._level,
+            "name": self._name,
+            # Read off the stack in place, it is never shorter than preview
+            "next": [names[i] for i in
+                islice(generator.stack, generator.preview_size)],
+            "hold": self._held
+        }
+
+    def get_hud_version(self) -> int:
+        """Get a number that changes whenever get_hud would, so callers can
+        skip unchanged HUDs without building them.
+        """
+        return self._hud_version
+
+    def set_auto_repeat(self, das: int, arr: int, soft_drop_rate: int):
+        """Set how held inputs repeat, in frames (updates).
+        das - Delay before a held shift starts repeating.
+        arr - Frames between shift repeats, 0 to shift to the wall at once.
+        soft_drop_rate - Frames between held soft drops.
+        """
+        if das < 0 or arr < 0 or soft_drop_rate < 1:
+            raise ValueError("Invalid auto repeat frames")
+        self._das = das
+        self._arr = arr
+        self._soft_drop_rate = soft_drop_rate
+
+    def get_state(self) -> dict:
+        """Get the complete gameplay state, see set_state."""
+        return {
+            "field": self._field.get_state(),
+            "generator": self._generator.get_state(),
+            "fall_rows": self._fall_rows,
+            "rest_frames": self._rest_frames,
+            "clearing_time": self._clearing_time,
+            "prev_pos": self._prev_pos,
+            "score": self._score,
+            "name": self._name,
+            "held": self._held,
+            "hold_ready": self._hold_ready,
+            "placed": self.placed,
+            "lines": self._lines,
+            "level": self._level,
+            "held_inputs": [self._shifts_held[:], self._shift_frames,
+                self._soft_drop_held, self._soft_drop_frames]
+        }
+
+    def set_state(self, state: dict):
+        """Restore a state from get_state. The board must have been made
+        with the same dimensions, block data and frames.
+        """
+        self._field.set_state(state["field"])
+        self._generator.set_state(state["generator"])
+        self._fall_rows = state["fall_rows"]
+        self._rest_frames = state["rest_frames"]
+        self._clearing_time = state["clearing_time"]
+        prev = state["prev_pos"]
+        self._prev_pos = tuple(prev) if prev is not None else None
+        self._score = state["score"]
+        self._name = state["name"]
+        self._held = state["held"]
+        self._hold_ready = state["hold_ready"]
+        self.placed = state["placed"]
+        self._lines = state["lines"]
+        self._level = state["level"]
+        shifts, self._shift_frames, self._soft_drop_held, \
+            self._soft_drop_frames = state["held_inputs"]
+        self._shifts_held = list(shifts)
+        self._hud_version += 1
+
+    def checksum(self) -> int:
+        """Get a CRC-32 of the grid (with the active block), score, lines
+        and hold, to check that a replayed board matches this one.
+        """
+        return crc32(dumps([self.get_raw_grid(), self._score, self._lines,
+            self._held], separators=(",", ":")).encode())
+
     def get_raw_grid(self) -> list:
         """Get the raw grid data, with ghost block."""
         return self._field.get_view().get_raw()
 
-    def update(self, dt: float):
+    def update(self, dt: float) -> bool:
+        """Advance the board by dt seconds.
+        Returns True if a placed block was locked in (and rows were cleared,
+        if any) during this update.
+        """
+        locked = self.placed
         # Line clear check/place check
         if self.placed:
             self._prev_pos = self._field.get_active_block()[0].get_position()
@@ -112,12 +283,24 @@ class Board:
             self._hold_ready = True
 
         self.placed = False
+        self._auto_repeat()
 
-        if self._fall_time <= self._field.get_current_level_speed(dt):
-            self._fall_time += dt
-        else:
-            self._fall_time = 0
-            self.placed = self._field.step(Step.vertical())
+        # Gravity moves the block down to where it lands, and locks it there
+        # on a later gravity row once it has rested for LOCK_DELAY frames
+        if self._field.drop_distance() > 0:
+            self._rest_frames = 0
+        elif not self.placed:
+            self._rest_frames += dt * FRAME_RATE
+        self._fall_rows += self._field.get_gravity() * dt * FRAME_RATE
+        if self._fall_rows >= 1 and not self.placed and (
+            self._rest_frames == 0 or self._rest_frames >= Board.LOCK_DELAY):
+            rows = int(self._fall_rows)
+            self._fall_rows -= rows
+            self.placed = self._field.drop(rows)
+        if self.placed:
+            self._fall_rows = 0
+            self._rest_frames = 0
+        return locked
 
     def has_lost(self) -> bool:
         """Check if current step has caused game over."""
@@ -126,46 +309,128 @@ class Board:
     def set_score(self, score: int):
         """Set current score."""
         self._score = score
+        self._hud_version += 1
 
     def set_name(self, name: str):
         """Set player name."""
         self._name = name
+        self._hud_version += 1
 
     def set_lines(self, count: int):
         """Set the lines cleared."""
         self._lines = count
+        self._hud_version += 1
 
     def set_level(self, n: int):
         """Set the current level."""
         self._level = n
         self._field.set_level(self._level)
+        self._hud_version += 1
 
     def _field_step(self, step: Step):
         """Perform a step."""
         self.placed = self._field.step(step)
 
     def performInput(self, inp: str):
-        """Perform a game input command."""
-        if inp == GameInput.left():
-            self._field_step(Step.horizontal(True))
-        elif inp == GameInput.right():
-            self._field_step(Step.horizontal(False))
-        elif inp == GameInput.soft_drop():
-            self._field_step(Step.vertical())
-        elif inp == GameInput.rotate_left():
-            self._field_step(Step.rotate(1))
-        elif inp == GameInput.rotate_right():
-            self._field_step(Step.rotate(3))
-        elif inp == GameInput.hard_drop():
-            for r in range(self._field.get_height()):
-                if not self._field.step(Step.vertical()):
-                    continue
-                self.placed = True
-                break
-        elif inp == GameInput.hold():
-            if self._hold_ready:
-                self._spawn_next(self._hold())
-                self._hold_ready = False
+        """Perform a game input command by name."""
+        self.perform(OPCODES.get(inp, -1))
+
+    def perform(self, op: int, event: int = TAP):
+        """Perform a game input by opcode. Unknown opcodes are ignored.
+        event - TAP to perform the input once, PRESS to also repeat it on
+            updates while held (shifts and soft drop), RELEASE to stop.
+        """
+        if event == RELEASE:
+            self._release(op)
+            return
+        if 0 <= op < len(Board._DISPATCH):
+            handler = Board._DISPATCH[op]
+            if handler is not None:
+                handler(self)
+            if event == PRESS:
+                self._press(op)
+
+    def _press(self, op: int):
+        """Start repeating a held input."""
+        if op in Board._SHIFTS:
+            if op in self._shifts_held:
+                self._shifts_held.remove(op)
+            self._shifts_held.append(op)
+            self._shift_frames = 0
+        elif op == Board._SOFT_DROP:
+            self._soft_drop_held = True
+            self._soft_drop_frames = 0
+
+    def _release(self, op: int):
+        """Stop repeating a held input."""
+        if op in self._shifts_held:
+            if self._shifts_held[-1] == op: # Other held shift charges again
+                self._shift_frames = 0
+            self._shifts_held.remove(op)
+        elif op == Board._SOFT_DROP:
+            self._soft_drop_held = False
+
+    def _auto_repeat(self):
+        """Repeat held inputs that are due this update."""
+        if self._shifts_held:
+            self._shift_frames += 1
+            frames = self._shift_frames - self._das
+            if frames >= 0 and (self._arr == 0 or frames % self._arr == 0):
+                step = Board._SHIFTS[self._shifts_held[-1]]
+                if self._arr == 0:
+                    while self._field.try_step(step) is not None:
+                        self._field_step(step)
+                else:
+                    self._field_step(step)
+        if self._soft_drop_held and not self.placed:
+            self._soft_drop_frames += 1
+            if self._soft_drop_frames % self._soft_drop_rate == 0:
+                self._field_step(Board._DOWN)
+
+    @classmethod
+    def register_input(cls, name: str, handler) -> int:
+        """Add an input, or replace the handler of an existing one.
+        handler - Function taking the Board, None to ignore the input.
+        Returns the opcode of the input.
+        """
+        op = OPCODES.get(name)
+        if op is None:
+            op = len(INPUTS)
+            INPUTS.append(name)
+            OPCODES[name] = op
+        while len(cls._DISPATCH) <= op:
+            cls._DISPATCH.append(None)
+        cls._DISPATCH[op] = handler
+        return op
+
+    def _left(self):
+        self._field_step(Board._LEFT)
+
+    def _right(self):
+        self._field_step(Board._RIGHT)
+
+    def _soft_drop(self):
+        self._field_step(Board._DOWN)
+
+    def _rotate_left(self):
+        self._field_step(Board._ROTATE_LEFT)
+
+    def _rotate_right(self):
+        self._field_step(Board._ROTATE_RIGHT)
+
+    def _rotate_180(self):
+        self._field_step(Board._ROTATE_LEFT)
+        self._field_step(Board._ROTATE_LEFT)
+
+    def _hard_drop(self):
+        # Lands the block, then places it (right away if it had landed)
+        self.placed = self._field.drop(self._field.get_height()) or \
+            self._field.drop(1)
+
+    def _hold_input(self):
+        if self._hold_ready:
+            self._spawn_next(self._hold())
+            self._hold_ready = False
 
     def _hold(self) -> str:
         """Swap the hold block name with the current block.
@@ -181,8 +446,22 @@ class Board:
 
     def _spawn_next(self, name: str = ""):
         """Spawn next generated block."""
+        self._hud_version += 1 # Preview or hold changed
         if name == "":
             front, mult = self._generator.pop_front()
             self._field.spawn(front, mult + 1)
         else:
-            self._field.spawn(name)
+            # Same value as when it was generated, so it keeps its color
+            self._field.spawn(name, self._generator.names.index(name) + 1)
+
+
+for _name, _handler in ((GameInput.left(), Board._left),
+    (GameInput.right(), Board._right),
+    (GameInput.soft_drop(), Board._soft_drop),
+    (GameInput.hard_drop(), Board._hard_drop),
+    (GameInput.rotate_left(), Board._rotate_left),
+    (GameInput.rotate_right(), Board._rotate_right),
+    (GameInput.hold(), Board._hold_input),
+    (GameInput.pause(), None), # Handled by the room
+    (GameInput.rotate_180(), Board._rotate_180)):
+    Board.register_input(_name, _handler)
@@ -0,0 +1,398 @@
+# Computer player that searches block placements on a Board
+from collections import deque
+from time import perf_counter
+
+from game.board import Board, GameInput
+from game.grid import Grid
+from game.playfield import PlayField
+from game import util
+
+
+class Shape:
+    """Cells of a block at one rotation as bitmask rows.
+    Offsets are relative to the ActiveBlock position, so a shape at (x, y)
+    covers the same cells as an ActiveBlock with the same grid at (x, y).
+    """
+
+    __slots__ = ("left", "width", "top", "bottom", "rows", "columns")
+
+    def __init__(self, data: list):
+        """
+        data - Block grid data, non-zero values are cells.
+        """
+        cells = [(x, y) for y, row in enumerate(data)
+            for x, value in enumerate(row) if value != 0]
+        if len(cells) < 1:
+            raise ValueError("Shape needs at least one cell")
+        self.left = min(x for x, _ in cells)
+        self.width = max(x for x, _ in cells) - self.left + 1
+        self.top = min(y for _, y in cells)
+        self.bottom = max(y for _, y in cells)
+        rows = {}
+        spans = {} # Column to its (top, bottom) cell
+        for x, y in cells:
+            rows[y] = rows.get(y, 0) | 1 << (x - self.left)
+            top, bottom = spans.get(x - self.left, (y, y))
+            spans[x - self.left] = min(top, y), max(bottom, y)
+        self.rows = tuple(sorted(rows.items()))
+        self.columns = tuple((c, t, b) for c, (t, b) in sorted(spans.items()))
+
+
+class Snapshot:
+    """Compact, picklable state of a Board needed to plan a placement."""
+
+    __slots__ = ("rows", "width", "height", "name", "x", "y", "rotations",
+        "preview", "spawn")
+
+    def __init__(self, rows: tuple, width: int, height: int, name: str,
+        x: int, y: int, rotations: int, preview: tuple, spawn: tuple):
+        """
+        rows - Field rows as bitmasks, bit x set for filled cells.
+        width - Field width.
+        height - Field height.
+        name - Active block name.
+        x, y - Active block position.
+        rotations - Active block rotations from its spawn rotation.
+        preview - Names of the upcoming blocks, next first.
+        spawn - Spawn position of new blocks.
+        """
+        self.rows = rows
+        self.width = width
+        self.height = height
+        self.name = name
+        self.x = x
+        self.y = y
+        self.rotations = rotations
+        self.preview = preview
+        self.spawn = spawn
+
+    def __getstate__(self):
+        return tuple(getattr(self, key) for key in Snapshot.__slots__)
+
+    def __setstate__(self, state):
+        for key, value in zip(Snapshot.__slots__, state):
+            setattr(self, key, value)
+
+    @classmethod
+    def from_board(cls, board: Board):
+        """Take a snapshot of a board."""
+        field = board.get_field()
+        active, name = field.get_active_block()
+        return cls(tuple(_rows(field.get_grid())), field.get_width(),
+            field.get_height(), name, active.x, active.y, active.rotations,
+            tuple(board.get_preview()), field.get_spawn_position())
+
+
+class Planner:
+    """Placement search over a Snapshot.
+    Every reachable (rotation, column) placement of the active block is
+    enumerated, rotating with the same wall kicks as PlayField, and scored
+    together with the best placement of the next block. Scores weigh
+    aggregate height, holes, bumpiness and points (util.get_points). The
+    field is searched as bitmask rows with column profiles updated per
+    placement, and next-block results are memoized by field, so nothing is
+    cloned per candidate.
+    """
+
+    # Heuristic weights
+    HEIGHT = -0.51
+    HOLES = -0.36
+    BUMPINESS = -0.18
+    POINTS = 0.3 # Per util.get_points at level 0, divided by a single's
+    MEMO_LIMIT = 4096 # Memoized fields kept before the memo is reset
+
+    # Rotation inputs from spawn, by number of Step.rotate(1) turns
+    _ROTATIONS = ((), (GameInput.rotate_left(),),
+        (GameInput.rotate_left(), GameInput.rotate_left()),
+        (GameInput.rotate_right(),))
+
+    def __init__(self, block_data: dict, lookahead: bool = True):
+        """
+        block_data - Block grids, as given to PlayField.
+        lookahead - Search the next block's placement too.
+        """
+        self._blocks = block_data
+        self._lookahead = lookahead
+        self._shapes = {} # (name, rotations) to Shape
+        self._memo = {} # (rows, name) to best score
+
+    def plan(self, snapshot: Snapshot) -> list:
+        """Search placements without a time budget.
+        Returns the list of inputs for the best placement found.
+        """
+        search = self.search(snapshot)
+        try:
+            while True:
+                next(search)
+        except StopIteration as done:
+            return done.value
+
+    def _shape(self, name: str, rotations: int) -> Shape:
+        """Get the memoized shape of block name at a rotation."""
+        key = name, rotations % 4
+        shape = self._shapes.get(key)
+        if shape is None:
+            grid = Grid.from_data(self._blocks[name])
+            grid.rotate90(key[1])
+            shape = Shape(grid._grid)
+            self._shapes[key] = shape
+        return shape
+
+    def _rotate(self, rows: tuple, snapshot: Snapshot, pos: tuple,
+        right: bool) -> tuple:
+        """Rotate like PlayField.try_step_with, wall kicks included.
+        pos - Tuple of x, y, rotations.
+        Returns the new position tuple, None if the rotation fails.
+        """
+        x, y, rotations = pos
+        rotations = (rotations + (-1 if right else 1)) % 4
+        shape = self._shape(snapshot.name, rotations)
+        w, h = snapshot.width, snapshot.height
+        if _fits(rows, w, h, shape, x, y):
+            return x, y, rotations
+        key = str(rotations)
+        if snapshot.name == "O" or snapshot.name == "I":
+            key += snapshot.name
+        for kick in PlayField._KICK[key]:
+            if _fits(rows, w, h, shape, x + kick[0], y - kick[1]):
+                return x + kick[0], y - kick[1], rotations
+        return None
+
+    def search(self, snapshot: Snapshot):
+        """Search generator, yields after each candidate placement.
+        Returns (StopIteration value) the inputs of the best placement.
+        """
+        width, height = snapshot.width, snapshot.height
+        rows = list(snapshot.rows)
+        heights, holes = _profile(rows, width, height)
+        best, best_inputs = None, [GameInput.hard_drop()]
+        for inputs in Planner._ROTATIONS:
+            pos = snapshot.x, snapshot.y, snapshot.rotations
+            for inp in inputs:
+                pos = self._rotate(rows, snapshot, pos,
+                    inp == GameInput.rotate_right())
+                if pos is None:
+                    break
+            if pos is None:
+                continue
+            shape = self._shape(snapshot.name, pos[2])
+            for x, y in _placements(rows, width, height, shape, pos[0],
+                pos[1]):
+                score, placed = _place(rows, heights, holes, width, height,
+                    shape, x, y)
+                if self._lookahead and len(snapshot.preview) > 0:
+                    score += self._best(placed, snapshot,
+                        snapshot.preview[0])
+                else:
+                    score += _score(placed[1], placed[2])
+                if best is None or score > best:
+                    best = score
+                    moves = x - pos[0]
+                    step = GameInput.left() if moves < 0 else GameInput.right()
+                    best_inputs = list(inputs) + [step] * abs(moves) + \
+                        [GameInput.hard_drop()]
+                yield
+        return best_inputs
+
+    def _best(self, placed: tuple, snapshot: Snapshot, name: str) -> float:
+        """Get the best score of placing block name from spawn, memoized."""
+        rows, heights, holes = placed
+        width, height = snapshot.width, snapshot.height
+        key = tuple(rows), name
+        best = self._memo.get(key)
+        if best is not None:
+            return best
+        x, y = snapshot.spawn
+        for rotations in range(4):
+            shape = self._shape(name, rotations)
+            if not _fits(rows, width, height, shape, x, y):
+                continue
+            for px, py in _placements(rows, width, height, shape, x, y):
+                score, after = _place(rows, heights, holes, width, height,
+                    shape, px, py)
+                score += _score(after[1], after[2])
+                if best is None or score > best:
+                    best = score
+        if best is None: # Nowhere to go: game over
+            best = -1e9
+        if len(self._memo) >= Planner.MEMO_LIMIT:
+            self._memo.clear()
+        self._memo[key] = best
+        return best
+
+
+class Bot:
+    """Computer player for a Board.
+    Placements are searched by a Planner for at most budget seconds per
+    update(), resuming on the next one. With a pool (see
+    server.planner.PlannerPool), the search runs in another process instead
+    and the plan is applied on a later update; a request that misses its
+    deadline is cancelled and searched locally.
+    """
+
+    def __init__(self, block_data: dict, budget: float = 0.002,
+        delay: int = 4, lookahead: bool = True, pool=None,
+        deadline: float = 0.25):
+        """
+        block_data - Block grids, as given to PlayField.
+        budget - Seconds of local search allowed per update.
+        delay - Updates to wait between inputs.
+        lookahead - Search the next block's placement too.
+        pool - Optional planner pool to search in.
+        deadline - Seconds a pool request may take.
+        """
+        self._planner = Planner(block_data, lookahead)
+        self._budget = budget
+        self._delay = delay
+        self._pool = pool
+        self._deadline = deadline
+        self._wait = 0
+        self._plan = deque() # Inputs left to perform
+        self._search = None # Local search generator in progress
+        self._request = None # Pool request in progress
+
+    def update(self, board: Board) -> str:
+        """Think and get the next input to perform.
+        Returns None when there is nothing to perform yet.
+        """
+        if self._wait > 0:
+            self._wait -= 1
+            return None
+        if len(self._plan) < 1:
+            plan = self._think(board)
+            if plan is None:
+                return None
+            self._plan.extend(plan)
+        self._wait = self._delay
+        return self._plan.popleft()
+
+    def cancel(self):
+        """Drop any search in progress."""
+        if self._request is not None:
+            self._request.cancel()
+        self._request = None
+        self._search = None
+
+    def _think(self, board: Board) -> list:
+        """Advance the search. Returns the plan once it is found."""
+        if self._pool is not None and self._search is None:
+            if self._request is None:
+                self._request = self._pool.submit(Snapshot.from_board(board),
+                    self._deadline)
+                return None
+            if not self._request.done():
+                if not self._request.expired():
+                    return None
+                self.cancel() # Too slow, search locally instead
+            else:
+                plan = self._request.result()
+                self._request = None
+                if plan is not None:
+                    return plan
+        if self._search is None:
+            self._search = self._planner.search(Snapshot.from_board(board))
+        deadline = perf_counter() + self._budget
+        try:
+            while perf_counter() < deadline:
+                next(self._search)
+            return None
+        except StopIteration as done:
+            self._search = None
+            return done.value
+
+
+def _rows(grid: Grid) -> list:
+    """Get grid rows as bitmasks, bit x set for non-zero cells."""
+    result = []
+    for row in grid.get_raw():
+        bits = 0
+        for x, value in enumerate(row):
+            if value != 0:
+                bits |= 1 << x
+        result.append(bits)
+    return result
+
+
+def _profile(rows: list, width: int, height: int) -> tuple:
+    """Get the height and hole count of each column."""
+    heights = [0] * width
+    holes = [0] * width
+    for x in range(width):
+        bit = 1 << x
+        for y in range(height):
+            if rows[y] & bit:
+                if heights[x] == 0:
+                    heights[x] = height - y
+            elif heights[x] > 0:
+                holes[x] += 1
+    return heights, holes
+
+
+def _fits(rows: list, width: int, height: int, shape: Shape, x: int,
+    y: int) -> bool:
+    """Check if shape fits at (x, y), like Grid.has_conflict."""
+    col = x + shape.left
+    if col < 0 or col + shape.width > width or y + shape.top < 0 or \
+        y + shape.bottom >= height:
+        return False
+    for dy, bits in shape.rows:
+        if rows[y + dy] & bits << col:
+            return False
+    return True
+
+
+def _placements(rows: list, width: int, height: int, shape: Shape, x: int,
+    y: int):
+    """Generate the landing (x, y) of each column reachable from (x, y)."""
+    left = x
+    while _fits(rows, width, height, shape, left - 1, y):
+        left -= 1
+    right = x
+    while _fits(rows, width, height, shape, right + 1, y):
+        right += 1
+    for px in range(left, right + 1):
+        py = y
+        while _fits(rows, width, height, shape, px, py + 1):
+            py += 1
+        yield px, py
+
+
+def _place(rows: list, heights: list, holes: list, width: int, height: int,
+    shape: Shape, x: int, y: int) -> tuple:
+    """Place shape at (x, y).
+    Returns the points score of the placement and the resulting (rows,
+    heights, holes). Column profiles are only recomputed when rows clear.
+    """
+    col = x + shape.left
+    full = (1 << width) - 1
+    placed = rows[:]
+    cleared = 0
+    for dy, bits in shape.rows:
+        placed[y + dy] |= bits << col
+        if placed[y + dy] == full:
+            cleared += 1
+    if cleared > 0:
+        placed = [0] * cleared + [r for r in placed if r != full]
+        heights, holes = _profile(placed, width, height)
+    else:
+        heights = heights[:]
+        holes = holes[:]
+        for c, top, bottom in shape.columns:
+            c += col
+            old_top = height - heights[c]
+            if y + bottom < old_top: # Cells above the stack cover a gap
+                holes[c] += old_top - (y + bottom) - 1
+                heights[c] = height - (y + top)
+            else: # Filled an overhang
+                holes[c] -= bottom - top + 1
+    points = util.get_points(0, cleared) / util.MULTIPLIER[0]
+    return Planner.POINTS * points, (placed, heights, holes)
+
+
+def _score(heights: list, holes: list) -> float:
+    """Score a field profile."""
+    bumpiness = 0
+    for i in range(len(heights) - 1):
+        bumpiness += abs(heights[i] - heights[i + 1])
+    return Planner.HEIGHT * sum(heights) + Planner.HOLES * sum(holes) + \
+        Planner.BUMPINESS * bumpiness
@@ -13,9 +13,12 @@ class Generator:
         names - List of block name strings.
         preview_size - Length of future block preview. Used to determine when
             to make new bags.
-        seed - Random generator seed.
+        seed - Random generator seed. None for a random one.
         """
-        random.seed(seed)
+        # Seeded per generator so its sequence can be restored
+        self._seed = seed if seed is not None else random.getrandbits(64)
+        self._random = random.Random(self._seed)
+        self._bags = 0 # Bags made since seeding
         self._names = names
         self._preview_size = preview_size
         self._bag_size = len(names)
@@ -52,6 +55,23 @@ class Generator:
         else:
             raise TypeError("names must be instace of list")
 
+    def get_state(self) -> dict:
+        """Get the generator state, see set_state."""
+        return {"seed": self._seed, "bags": self._bags,
+            "stack": self.stack[:]}
+
+    def set_state(self, state: dict):
+        """Restore a state from get_state.
+        The random generator is reseeded and replays the bags made so far,
+        which is cheaper to store than its internal state.
+        """
+        self._seed = state["seed"]
+        self._random = random.Random(self._seed)
+        self._bags = 0
+        for i in range(state["bags"]):
+            self.make_bag()
+        self.stack = list(state["stack"])
+
     def pop_front(self) -> tuple:
         """Pop the front of the stack and return it.
         Returns the string name of the font and its integer equivalent."""
@@ -74,7 +94,8 @@ class Generator:
         bag = []
         free = [x for x in range(self.bag_size)]
         for i in range(len(free)):
-            select = random.choice(free)
+            select = self._random.choice(free)
             bag.append(select)
             free.remove(select)
+        self._bags += 1
         return bag
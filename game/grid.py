@@ -35,7 +35,7 @@ class Grid:
         else:
             result = cls(len(data), len(data[0]))
             for j in range(len(data)):
-                result._grid[j] = data[j][:]
+                result._grid[j] = list(data[j])
             return result
 
     @classmethod
@@ -43,27 +43,73 @@ class Step:
         return self._type == "rotate"
 
 
+class ShapeTable:
+    """Grids of every block in each rotation and color value, made once and
+    shared by active blocks. The grids must not be modified.
+    """
+
+    def __init__(self, block_data: dict):
+        """
+        block_data - Block grids, with values of 0 or 1.
+        """
+        self._grids = {}
+        values = range(1, len(block_data) + 1)
+        for name, data in block_data.items():
+            for value in list(values) + [-v for v in values]:
+                grid = Grid.from_data(util.apply_multiplier(data, value))
+                rotations = []
+                for r in range(4):
+                    rotations.append(Grid.from_grid(grid))
+                    grid.rotate90()
+                self._grids[name, value] = tuple(rotations)
+
+    def get(self, name: str, value: int) -> tuple:
+        """Get the grids of a block with a value, by rotations from spawn.
+        Raises KeyError for unknown blocks or values.
+        """
+        return self._grids[name, value]
+
+    def __contains__(self, key: tuple) -> bool:
+        return key in self._grids
+
+
 class ActiveBlock:
     """Basic active block data.
     An active block is one that isn't placed on the field (yet)."""
 
     def __init__(self, x: int, y: int, data: list, ghost: bool = False,
-        rotations: int = 0, name=""):
-        self.reset(x, y, data, ghost, rotations, name)
+        rotations: int = 0, name="", shapes: tuple = None):
+        self.reset(x, y, data, ghost, rotations, name, shapes)
 
     @classmethod
     def copy(cls, other: ActiveBlock, ghost: bool = False):
         """Copy another ActiveBlock."""
-        return cls(other.x, other.y, other._grid._grid[:], ghost,
+        if other._shapes is not None and not ghost:
+            # Shared grids are never modified
+            block = cls.__new__(cls)
+            block.x, block.y = other.x, other.y
+            block._grid = other._grid
+            block._shapes = other._shapes
+            block.rotations = other.rotations
+            block.name = other.name
+            return block
+        return cls(other.x, other.y, other._grid._grid, ghost,
             other.rotations, other.name)
 
     def reset(self, x: int, y: int, data: list, ghost: bool = False,
-        rot: int = 0, name: str = ""):
-        """Reset position and grid data."""
+        rot: int = 0, name: str = "", shapes: tuple = None):
+        """Reset position and grid data.
+        shapes - Optional shared grids by rotation (see ShapeTable), used
+            instead of data.
+        """
         self.x = x
         self.y = y
-        real_data = data[:] if not ghost else util.apply_multiplier(data, -1)
-        self._grid = Grid.from_data(real_data)
+        self._shapes = shapes
+        if shapes is not None:
+            self._grid = shapes[rot]
+        else:
+            real_data = data if not ghost else util.apply_multiplier(data, -1)
+            self._grid = Grid.from_data(real_data)
         self.rotations = rot # Rotations from spawn rotation
         self.name = name
 
@@ -86,7 +132,10 @@ class ActiveBlock:
                     self.rotations = 3
                 elif self.rotations > 3:
                     self.rotations = 0
-                self._grid.rotate90(step.get_value())
+                if self._shapes is not None:
+                    self._grid = self._shapes[self.rotations]
+                else:
+                    self._grid.rotate90(step.get_value())
 
     def get_grid(self) -> Grid:
         """Get the grid of the block."""
@@ -120,7 +169,8 @@ class PlayField:
 
     def __init__(self, block_data: dict, initial_block: str,
         initial_level: int = 0, level_speeds: list = [53],
-        spawn_position: tuple = None, dimensions: tuple =None):
+        spawn_position: tuple = None, dimensions: tuple =None,
+        shapes: ShapeTable = None):
         """
         block_data - Block grids.
         initial_block - Initial block to spawn.
@@ -128,18 +178,23 @@ class PlayField:
         level_speeds - Level gravity info (frames per row).
         spawn_position - Active spawn position. None for default.
         dimensions - Set to None for default board dimensions (row, col).
+        shapes - ShapeTable of block_data, None to make one.
         """
         self._blocks = block_data
         if len(block_data) < 1 or block_data is None:
             raise ValueError("block_data must be valid")
+        self._shapes = shapes if shapes is not None else \
+            ShapeTable(block_data)
 
         if dimensions is not None:
-            self._field = Grid.create_default(*dimensions)
+            self._field = Grid(*dimensions)
         else:
             self._field = Grid.create_default()
 
         self._level = initial_level
         self._level_speeds = level_speeds
+        # Rows per frame by level, fractional below 1 row per frame
+        self._gravity = tuple(1 / f for f in level_speeds)
         self._filled_rows = []
         if spawn_position is not None:
             self._spawn_position = spawn_position
@@ -164,7 +219,7 @@ class PlayField:
         if l <= 0:
             self._level = 0
         elif l >= len(self._level_speeds):
-            self._level = len(self._level_speeds)
+            self._level = len(self._level_speeds) - 1
         else:
             self._level = l
 
@@ -172,6 +227,32 @@ class PlayField:
         """Get the current active block and name."""
         return self._active, self._active_name
 
+    def get_state(self) -> dict:
+        """Get the field, active block and level, see set_state."""
+        active = self._active
+        return {
+            "grid": [row[:] for row in self._field.get_raw()],
+            "active": [active.x, active.y, active.get_grid().get_raw(),
+                active.rotations, active.name],
+            "active_name": self._active_name,
+            "level": self._level,
+            "filled": self._filled_rows[:]
+        }
+
+    def set_state(self, state: dict):
+        """Restore a state from get_state."""
+        self._field = Grid.from_data(state["grid"])
+        x, y, data, rotations, name = state["active"]
+        value = max((v for row in data for v in row), key=abs, default=0)
+        if (name, value) in self._shapes:
+            self._active.reset(x, y, data, rot=rotations, name=name,
+                shapes=self._shapes.get(name, value))
+        else:
+            self._active.reset(x, y, data, rot=rotations, name=name)
+        self._active_name = state["active_name"]
+        self._level = state["level"]
+        self._filled_rows = list(state["filled"])
+
     def get_spawn_position(self) -> tuple:
         """Get the coordinates of the spawn position."""
         return self._spawn_position
@@ -184,6 +265,10 @@ class PlayField:
         """Current level speed in frames."""
         return self.get_level_speed(self.get_level(), dt)
 
+    def get_gravity(self) -> float:
+        """Rows per frame the active block falls at the current level."""
+        return self._gravity[self._level]
+
     def spawn(self, i: str = "", multiplier: int = 1):
         """Spawn next block.
         Chooses random if i is empty string.
@@ -194,9 +279,8 @@ class PlayField:
                 block, nm = self.get_random_block()
             else:
                 block, nm = self._blocks[i], i
-            self._active.reset(*self._spawn_position,
-                util.apply_multiplier(block, multiplier),
-                name=nm)
+            self._active.reset(*self._spawn_position, block, name=nm,
+                shapes=self._shapes.get(nm, multiplier))
             self._active_name = nm
         except(KeyError):
             print("Warning: tried to spawn invalid block '{}'".format(i))
@@ -298,6 +382,48 @@ class PlayField:
             return 0
         return diff
 
+    def drop_distance(self, ab: ActiveBlock = None) -> int:
+        """Get the rows a block can fall before landing, found from the
+        lowest cell of each of its columns instead of stepping row by row.
+        ab - Block to drop, None for the active block.
+        """
+        if ab is None:
+            ab = self._active
+        shape = ab.get_grid().get_raw()
+        field = self._field.get_raw()
+        height = len(field)
+        distance = height
+        for i in range(len(shape[0])):
+            # Lowest cell of the block's column
+            bottom = -1
+            for j in range(len(shape) - 1, -1, -1):
+                if shape[j][i] != 0:
+                    bottom = j
+                    break
+            if bottom < 0:
+                continue
+            x = ab.x + i
+            y = ab.y + bottom + 1
+            free = 0
+            while y + free < height and field[y + free][x] == 0 and \
+                free < distance:
+                free += 1
+            distance = min(distance, free)
+        return distance
+
+    def drop(self, rows: int) -> bool:
+        """Move the active block down rows at once, stopping on the row it
+        lands on. A block that had already landed is placed like by step.
+        Returns True if it was placed.
+        """
+        distance = self.drop_distance()
+        if distance < 1:
+            return self.step(Step.vertical())
+        dropped = ActiveBlock.copy(self._active)
+        dropped.y += min(rows, distance)
+        self._active = dropped
+        return False
+
     def get_filled_rows(self) -> list:
         """Get list of non-zero filled rows."""
         return self._filled_rows
@@ -321,10 +447,20 @@ class PlayField:
         Ghost blocks should have negative values.
         """
         ghost = ActiveBlock.copy(self._active, False)
-        for r in range(self.get_height()):
-            if self.try_step_with(ghost, Step.vertical()) is not None:
-                ghost.y += 1
-                continue
-            break
-        ghost._grid.apply_multiplier(-1)
+        ghost.y += self.drop_distance(ghost)
+        value = ghost.name, -self._active_value()
+        if ghost._shapes is not None and value in self._shapes:
+            ghost._shapes = self._shapes.get(*value)
+            ghost._grid = ghost._shapes[ghost.rotations]
+        else:
+            ghost._grid = Grid.from_grid(ghost._grid)
+            ghost._grid.apply_multiplier(-1)
         return ghost
+
+    def _active_value(self) -> int:
+        """Get the value of the active block's cells."""
+        for row in self._active.get_grid().get_raw():
+            for v in row:
+                if v != 0:
+                    return v
+        return 0
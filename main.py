@@ -1,37 +1,202 @@
-from threading import Thread, RLock
+import os
+ASYNC_MODE = os.environ.get("ASYNC_MODE", "threading") # Or eventlet, gevent
+# Patched before anything else is imported, also when Gunicorn preloads the
+# app (its worker patches again, which is harmless). Planner processes
+# import this module as __mp_main__ and don't need green threads.
+if ASYNC_MODE == "eventlet" and __name__ != "__mp_main__":
+    import eventlet
+    eventlet.monkey_patch()
+elif ASYNC_MODE == "gevent" and __name__ != "__mp_main__":
+    from gevent import monkey
+    monkey.patch_all()
+
+from threading import RLock
 from multiprocessing import Manager
-from queue import Queue
-from json import load, loads
+from queue import Queue, Empty
+from json import loads
+from hmac import compare_digest
 import time
-import os
 
 #from uuid import uuid4
 from shortuuid import uuid
 from shortuuid import encode
-from flask import Flask, Blueprint, send_from_directory, render_template, request
+from flask import Flask, Blueprint, send_from_directory, render_template, request, jsonify
 from flask_socketio import SocketIO, join_room, leave_room, emit, close_room
 import base62
 
-from game.board import Board
+from config import GameConfig
+from game.board import Board, GameInput, INPUTS, TAP, PRESS, RELEASE
+from game.bot import Bot
+from server.buffer import FrameBuffer, Frame
+from server.hud import HudTracker
+from server.match import MatchStream
+from server.broadcast import BroadcastClock
+from server.output import OutputStage
+from server.expiry import TimerWheel
+from server.planner import PlannerPool
+from server.metrics import Metrics
+from server.trace import LatencyTracer
+from server.log import Logger
+from server.admission import Admission
+from server.pool import Pool
+from server.limit import RateLimiter
+from server.protocol import decode_input, is_release
+from server import snapshot
+from server.registry import CheckpointWriter, LocalRegistry, RedisRegistry
 
 
-THREADS_LIMIT = 225 # Semi-arbitrary limit; Heroku allows 255 threads for free
+# Rooms are admitted while the node has capacity, see Admission
+TICK_BUDGET = 0.7 # Share of time rooms may spend ticking
+LAG_LIMIT = 0.02 # Highest p99 seconds a tick may start late
+MEMORY_AVAILABLE = os.environ.get("MEMORY_AVAILABLE") # MB, set by Heroku
+MEMORY_LIMIT = int(float(MEMORY_AVAILABLE) * 0.9 * 2 ** 20) if \
+    MEMORY_AVAILABLE else None # Resident bytes
+ROOM_LIMIT = int(os.environ.get("ROOM_LIMIT", 0)) or None # Optional cap
+RETRY_TIME = 5 # Seconds a refused host waits before asking again
 INPUT_LIMIT = 8 # Maximum inputs to process per tick for a game
-BLOCKS_PATH = "config/blocks.json"
+INPUT_QUEUE = 256 # Maximum taps and presses queued for a game
+TICK_RATE = 60 # Simulation ticks per second
+BROADCAST_RATE = 30 # Default frames sent per second to a room
+MIN_BROADCAST_RATE = 5 # Lowest broadcast rate a room may ask or back off to
+SENDERS = 2 # Output sender workers
+OUTPUT_LIMIT = 256 # Maximum queued frames per sender
+TRACE_EVERY = 16 # Trace the latency of one in this many inputs, 0 for none
+LOG_INPUT_SAMPLE = 100 # Log one in this many inputs
+LOG_ERROR_RATE = 50 # Maximum error records per second
+CONFIG_PATH = "config/standard.json"
 FRAMES_PATH = "config/frames.json"
-DEAD_TIME = 1 # Seconds to check for dead games
+DEAD_TIME = 1 # Seconds between dead game checks (expiry resolution)
 EXPIRE_TIME = 60 * 6 # Seconds until a game can be considered for death,
                      # a game is 'dead' when it has been alive for this amount
                      # of time, and 'running' is False.
 NAMES = ["Left Board", "Right Board"]
+EVENTS = {"press": PRESS, "release": RELEASE} # JSON input events
+PAUSE = GameInput.opcode(GameInput.pause()) # Pauses or resumes the room
+HELD_INPUTS = tuple(GameInput.opcode(i) for i in (GameInput.left(),
+    GameInput.right(), GameInput.soft_drop())) # Repeat until released
+BOT_BUDGET = 0.002 # Seconds a bot may search per tick
+BOT_DEADLINE = 0.25 # Seconds a bot waits on the planner pool for a plan
+# Bot planner worker processes, 0 to search on game threads. Bots only poll
+# their plans, so the pool doesn't block green threads either.
+PLANNERS = 2
+CHECKPOINT_TIME = 5 # Seconds between snapshots of a running room
+CHECKSUM_TICKS = 60 # Ticks between board checksums of match streams
+POOL_SIZE = 16 # Idle rooms made ahead of time, for hosts arriving at once
+POOL_REFILL = 0.1 # Seconds between refills of the room pool
+NAP_TIME = 30 # Seconds a room that isn't ticking idles before it hibernates
+GRACE_TIME = 60 # Seconds a room nobody plays or watches waits for them
+HEARTBEAT_TIME = 10 # Seconds between heartbeats (Socket.IO pings)
+HEARTBEAT_TIMEOUT = 10 # Seconds without a heartbeat until a disconnect
+
+
+def env_limits(name: str, default: tuple) -> tuple:
+    """Get token bucket limits (events per second, burst) from environment
+    variable name, set as "rate,burst", or default if it isn't set.
+    """
+    value = os.environ.get(name)
+    return tuple(float(v) for v in value.split(",")) if value else default
 
-new_q = Queue() # New host queue
-inp_q = Queue() # Input queue
-out_q = Queue() # Output queue
-room_lock = RLock()
+
+# Token bucket limits, address limits are loose as a classroom may share one
+INPUT_LIMITS = env_limits("INPUT_LIMITS", (30, 30)) # Per controller socket
+ADDRESS_INPUT_LIMITS = env_limits("ADDRESS_INPUT_LIMITS", (600, 300))
+RELEASE_LIMITS = env_limits("RELEASE_LIMITS", (60, 60)) # Of inputs not held
+HOST_LIMITS = env_limits("HOST_LIMITS", (0.2, 3)) # Rooms per host socket
+ADDRESS_HOST_LIMITS = env_limits("ADDRESS_HOST_LIMITS", (1, 20))
+TRUST_PROXY = bool(os.environ.get("TRUST_PROXY")) # Behind a router that
+                                                  # sets X-Forwarded-For
+REDIS_URL = os.environ.get("REDIS_URL") # Share rooms with other nodes
+REMOTE_TIMEOUT = 1 # Seconds to wait for a room on another node to reply
+
+game_config = GameConfig.from_files(CONFIG_PATH, FRAMES_PATH) # Shared rules
+HUD_TITLES = {name: panel.get("title", "") for name, panel in
+    game_config.layout.items() if name != "playfield"} # Sent on greet
+PLAYFIELD = {"width": game_config.width, "height": game_config.height,
+    "colors": game_config.colors} # Sent on greet and watch
+sockets = SocketIO() # SocketIO, set up by create_app
+workers_started = False # See start_workers
+planners = None # PlannerPool for bots, started by the room worker
+
+# Locks, queues and other state of the process, made by init_state
+state_pid = None # Process that made them
+inp_q = None # Input queue
+room_lock = None
 rooms = {} # Dictionary of 'rooms' aka GameThreads
-app = Flask(__name__)
-sockets = SocketIO(app, async_mode="threading") # SocketIO, started in page worker
+room_pool = None # Idle rooms, filled by the room worker
+sessions = {} # Controller socket ID (also its board ID) to joined room ID
+viewers = {} # Host and spectator socket ID to watched room ID
+addresses = {} # Socket ID to remote address, for rate limits
+held = {} # Socket ID to the opcodes it pressed and hasn't released
+input_limit = None # Token buckets, see env_limits
+address_input_limit = None
+release_limit = None
+host_limit = None
+address_host_limit = None
+LIMITERS = {}
+registry = None # Room owners and checkpoints, shared by nodes
+checkpoints = None # Writes checkpoints off the ticks
+expiry = None # Room expiry deadlines
+naps = None # Deadlines of idle rooms to hibernate
+metrics = None # Server statistics, see /stats
+log = None # Written by the log worker
+tracer = None # Input latency tracing
+out_q = None # Output queue
+admission = None # Sampled by the killer worker
+
+
+def init_state():
+    """Make the locks, queues and other state of this process. Called by
+    create_app, and again by start_workers in a worker forked after that
+    (gunicorn --preload), which has monkey patched since and must not share
+    a connection or queue with its parent.
+    """
+    global state_pid, inp_q, room_lock, rooms, room_pool, sessions, \
+        viewers, addresses, held, input_limit, address_input_limit, \
+        release_limit, host_limit, address_host_limit, LIMITERS, registry, \
+        checkpoints, expiry, naps, metrics, log, tracer, out_q, admission
+    state_pid = os.getpid()
+    inp_q = Queue()
+    room_lock = RLock()
+    rooms = {}
+    room_pool = Pool(lambda: new_room(), POOL_SIZE)
+    sessions = {}
+    viewers = {}
+    addresses = {}
+    held = {}
+    input_limit = RateLimiter(*INPUT_LIMITS)
+    address_input_limit = RateLimiter(*ADDRESS_INPUT_LIMITS)
+    release_limit = RateLimiter(*RELEASE_LIMITS)
+    host_limit = RateLimiter(*HOST_LIMITS)
+    address_host_limit = RateLimiter(*ADDRESS_HOST_LIMITS)
+    LIMITERS = {"input": input_limit, "address_input": address_input_limit,
+        "release": release_limit, "host": host_limit,
+        "address_host": address_host_limit}
+    registry = RedisRegistry.from_url(REDIS_URL) if REDIS_URL else \
+        LocalRegistry()
+    checkpoints = CheckpointWriter(registry)
+    now = time.perf_counter()
+    expiry = TimerWheel(DEAD_TIME, int(EXPIRE_TIME / DEAD_TIME) + 1, now)
+    naps = TimerWheel(DEAD_TIME, int(NAP_TIME / DEAD_TIME) + 1, now)
+    metrics = Metrics()
+    log = Logger()
+    log.configure("input", sample=LOG_INPUT_SAMPLE)
+    log.configure("error", rate=LOG_ERROR_RATE)
+    tracer = LatencyTracer(metrics, TRACE_EVERY)
+    out_q = OutputStage(lambda room, payload: sockets.emit("update", payload,
+        room=room, namespace="/host"), SENDERS, OUTPUT_LIMIT,
+        on_sent=sent_frame, emit_message=lambda room, event, message:
+        sockets.emit(event, message, room=room, namespace="/host"))
+    admission = Admission(metrics.histogram("tick"),
+        metrics.histogram("tick_lag"), out_q.depth, TICK_BUDGET, LAG_LIMIT,
+        SENDERS * OUTPUT_LIMIT // 2, MEMORY_LIMIT, ROOM_LIMIT, RETRY_TIME)
+
+
+def sent_frame(room: str, frame: Frame):
+    """Ask the room's host to ack frames that show traced inputs."""
+    if tracer.emitted(room, frame.seq):
+        sockets.emit("trace", frame.seq, room=room, namespace="/host")
+
+
 html = Blueprint("html", __name__, "static", template_folder="static")
 
 
@@ -60,230 +225,1053 @@ def music(path):
     return send_from_directory("static/music", path)
 
 
-def pageWorker():
-    """Static page serving and SocketIO."""
-    print("Starting page worker...")
-    global sockets
-    app.register_blueprint(html, url_prefix="/")
-    blocks = load(open(BLOCKS_PATH))
-    frames = load(open(FRAMES_PATH))
+@html.route("/stats")
+def stats():
+    """Server statistics: rooms, output stage and tick metrics."""
+    with room_lock:
+        total = len(rooms)
+        running = sum(1 for r in rooms.values() if r.running)
+        hibernating = sum(1 for r in rooms.values() if r.hibernating())
+    return jsonify({
+        "rooms": total,
+        "running": running,
+        "hibernating": hibernating,
+        "output": {
+            "depth": out_q.depth(),
+            "sent": out_q.sent,
+            "dropped": out_q.dropped,
+            "stale": out_q.stale
+        },
+        "log": {"written": log.written, "dropped": log.dropped},
+        "checkpoints": {"written": checkpoints.written,
+            "failed": checkpoints.failed},
+        "admission": admission.to_dict(),
+        "pool": room_pool.to_dict(),
+        "limits": {name: {"dropped": limit.dropped, "keys": len(limit)} for
+            name, limit in LIMITERS.items()},
+        "trace": tracer.to_dict(),
+        **metrics.to_dict()
+    })
 
-    @sockets.on("host", namespace="/host")
-    def host():
-        hid = request.sid
-        with room_lock:
-            if len(rooms) < THREADS_LIMIT:
-                uid = uuid()[:10] # More chance of duplicate
-                                  # But 'rare enough'
-                join_room(uid)
-                new_q.put(uid)
-            else:
-                print("Warning: maximum capacity reached for game threads")
-
-    @sockets.on("ready", namespace="/host")
-    def ready(hid):
-        """When the host is ready to begin the match.
-        Will only start the match if 2 players have joined.
-        Returns (boolean, message) to client, where boolean is True when
-        the game is starting.
-        """
-        with room_lock:
-            if not hid in rooms:
-                return False, "Invalid room"
-            elif len(rooms[hid].boards) < 2:
-                return False, "Need 2 players to start"
-            else:
-                rooms[hid].state_q.put("start")
-                return True, "Starting game"
 
-    @sockets.on_error_default
-    def all_error_handler(e):
-        print(f"SocketIO Error: {e}")
+def room_join(room_id: str, bid: str, token: str = "") -> list:
+    """Seat a player in a room of this node.
+    token - Reclaim token of a seat to take back (see GameThread.claimable),
+        empty for a new board.
+    Returns [boolean, message, token] where the boolean is True when seated
+    and token is the seat's secret reclaim token.
+    """
+    with room_lock:
+        room = rooms.get(room_id)
+        if room is None:
+            return [False, "Invalid Room"]
+        elif bid in room.boards: # One seat per socket
+            return [False, "Already joined"]
+        room.wake()
+        seat = room.claimable(token)
+        if seat is not None:
+            room.claim(seat, bid)
+        elif len(room.boards) >= 2:
+            return [False, "Full Room"]
+        else:
+            room.boards[bid] = room.new_board()
+            room.tokens[bid] = uuid()
+        room.attended()
+        return [True, NAMES[list(room.boards).index(bid)], room.tokens[bid]]
 
-    @sockets.on("join")
-    def join(data):
-        """
-        Handle player joining room. Data should be an object with:
-            room - Room ID to join.
-        Returns (boolean, message, [bid]) to client. Where the boolean is
-        True when the client has successfully joined the room. bid is only
-        returned when the client is in the room.
-        """
-        try:
-            data = loads(data)
-            room_id = str(data["room"])
-            with room_lock:
-                if room_id not in rooms:
-                    return False, "Invalid Room"
-                elif len(rooms[room_id].boards) >= 2:
-                    return False, "Full Room"
-                join_room(room_id)
-                board_id = request.sid
-                room = rooms[room_id]
-                room.boards[board_id] = room.new_board()
-                return True, NAMES[len(room.boards) - 1], board_id
-        except Exception as e:
-            print(f"An error occurred on join: {e}")
-            return False, "Error"
-
-    @sockets.on("leave")
-    def leave(data):
-        """
-        Handle player leaving room. Data should be an object with:
-            room - Room ID to leave.
-            bid - Board ID.
-        """
+
+def room_leave(room_id: str, bid: str):
+    """Remove a player's board from a room of this node."""
+    with room_lock:
+        room = rooms.get(room_id)
+        if room is not None:
+            room.wake()
+            room.boards.pop(bid, None)
+            room.tokens.pop(bid, None)
+            room.check_deserted()
+
+
+def room_add_bot(room_id: str, sid: str) -> list:
+    """Fill an empty seat of a room of this node with a computer player.
+    sid - Socket ID asking, only the room's host may add bots.
+    Returns [boolean, message].
+    """
+    with room_lock:
+        room = rooms.get(room_id)
+        if room is None:
+            return [False, "Invalid room"]
+        elif sid != room.host:
+            return [False, "Only the host can add bots"]
+        room.wake()
+        if len(room.boards) >= 2:
+            return [False, "Full Room"]
+        bid = "bot-" + uuid()[:6]
+        room.bots[bid] = room.new_bot()
+        room.boards[bid] = room.new_board()
+        return [True, NAMES[len(room.boards) - 1]]
+
+
+def room_ready(room_id: str, sid: str) -> list:
+    """Start a room of this node if 2 players have joined, or resume it if
+    it is paused.
+    sid - Socket ID asking, only the room's host may start the room.
+    Returns [boolean, message], the boolean is True if starting or
+    resuming.
+    """
+    with room_lock:
+        room = rooms.get(room_id)
+        if room is None:
+            return [False, "Invalid room"]
+        elif sid != room.host:
+            return [False, "Only the host can start"]
+        elif room.paused:
+            room.resume()
+            return [True, "Resuming game"]
+        elif room.started:
+            return [False, "Already started"]
+        elif len(room.boards) < 2:
+            return [False, "Need 2 players to start"]
+        room.wake()
+        room.started = True
+        room.start()
+        return [True, "Starting game"]
+
+
+def room_keyframe(room_id: str) -> list:
+    """Get [keyframe, huds, match] of a room of this node: the last frame
+    sent, None if nothing was sent yet, the [bid, HUD] of each board and,
+    for rooms that stream events, the match messages to catch up with (see
+    MatchStream.sync). Returns None for no room.
+    """
+    room = rooms.get(room_id)
+    if room is None:
+        return None
+    match = room.match.sync() if room.match is not None else []
+    return [out_q.keyframe(room_id), room.hud.full(room.boards), match]
+
+
+def room_watch(room_id: str, sid: str, key: str = "") -> list:
+    """Add a viewer to a room of this node.
+    key - The room's host key (see open_room), to take the room back as
+        its host after reconnecting. Empty for spectators.
+    Returns room_keyframe's result for it, None for no room.
+    """
+    with room_lock:
+        room = rooms.get(room_id)
+        if room is None:
+            return None
+        elif key and compare_digest(key, room.host_key):
+            room.host = sid
+        room.viewers.add(sid)
+        room.attended()
+    return room_keyframe(room_id)
+
+
+def room_unwatch(room_id: str, sid: str):
+    """Remove a viewer that disconnected from a room of this node."""
+    with room_lock:
+        room = rooms.get(room_id)
+        if room is not None:
+            room.viewers.discard(sid)
+            room.check_deserted()
+
+
+def room_away(room_id: str, bid: str):
+    """Mark the player of a board as disconnected. The board is kept so the
+    player can rejoin with its reclaim token (see room_join) until the room
+    is deserted for GRACE_TIME.
+    """
+    with room_lock:
+        room = rooms.get(room_id)
+        if room is not None and bid in room.boards:
+            room.away.add(bid)
+            room.release_held(bid)
+            room.check_deserted()
+
+
+def room_input(room_id: str, bid: str, op: int, event: int = TAP,
+    seq: int = None, client_time: float = None):
+    """Queue an input for a room of this node, applied on its next tick."""
+    room = rooms.get(room_id)
+    if room is None or bid not in room.boards or bid in room.away:
+        return # Only seated players play, or resume the room
+    elif room.paused and event != RELEASE: # Any tap or press resumes the
+        with room_lock:                    # room, and is used up doing so
+            room.resume()
+        return
+    # Only frames can show when a traced input landed
+    room.performInput((bid, op, event, tracer.sample(room_id, seq,
+        client_time) if room.match is None else None))
+
+
+def room_ack(room_id: str, seq: int):
+    """End the input latency traces shown by a frame of a room."""
+    tracer.acked(room_id, seq)
+
+
+# Room operations by message kind, see room_call
+ROOM_CALLS = {
+    "join": room_join,
+    "leave": room_leave,
+    "add bot": room_add_bot,
+    "ready": room_ready,
+    "keyframe": room_keyframe,
+    "watch": room_watch,
+    "unwatch": room_unwatch,
+    "away": room_away,
+    "input": room_input,
+    "ack": room_ack
+}
+
+
+def handle_room_call(kind: str, room_id: str, args: list):
+    """Handle a room operation sent by another node."""
+    return ROOM_CALLS[kind](room_id, *args)
+
+
+def room_call(room_id: str, kind: str, *args):
+    """Run a room operation on the node that owns the room.
+    Returns its result, None if the room wasn't found or didn't reply.
+    """
+    if room_id in rooms:
+        return ROOM_CALLS[kind](room_id, *args)
+    return registry.call(room_id, kind, list(args), REMOTE_TIMEOUT)
+
+
+def room_send(room_id: str, kind: str, *args):
+    """Run a room operation on the node that owns the room, without
+    waiting for its result.
+    """
+    if room_id in rooms:
+        ROOM_CALLS[kind](room_id, *args)
+    else:
+        registry.send(room_id, kind, list(args))
+
+
+@sockets.on("host", namespace="/host")
+def create_room(options=None):
+    """Create a room for the host, greeting it with the room's ID and host
+    key (see room_watch). options may be an object with:
+        rate - Broadcast rate (frames per second) for the room.
+        resume - ID of a room that was lost, to restore from its last
+            checkpoint. Its players rejoin with their reclaim tokens.
+        stream - "events" to be sent "match" events (see MatchStream) for
+            a deterministic engine to replay, instead of "update" frames.
+    """
+    if limited(host_limit, address_host_limit):
+        emit("host busy", {"retry": RETRY_TIME})
+        return
+    rate = BROADCAST_RATE
+    resume = None
+    events = isinstance(options, dict) and options.get("stream") == "events"
+    if isinstance(options, dict) and "rate" in options:
         try:
-            data = loads(data)
-            room_id = str(data["room"])
-            bid = str(data["bid"])
-            leave_room(room_id)
-            with room_lock:
-                del rooms[room_id].boards[bid]
-        except Exception as e:
-            print(f"Error occurred when leaving room: {e}")
-
-    @sockets.on("input")
-    def inp(msg):
+            rate = min(TICK_RATE, max(MIN_BROADCAST_RATE,
+                float(options["rate"])))
+        except (TypeError, ValueError):
+            pass
+    if isinstance(options, dict) and "resume" in options:
+        resume = str(options["resume"])
+    if not admission.admit(len(rooms)):
+        log.warning("At capacity, refused a room", load=admission.load)
+        emit("host busy", {"retry": admission.get_retry()})
+        return
+    # Registry calls may go to Redis, so they are made without room_lock
+    room = room_pool.take()
+    name = room.name
+    data = None
+    if resume is not None and registry.owner(resume) is None:
+        data = checkpoints.get(resume)
+        if data is not None:
+            name = resume
+    if not registry.claim(name):
+        log.warning("Room is owned by another node", room=name)
+        room_pool.put(room)
+        emit("host busy", {"retry": admission.get_retry()})
+        return
+    room.name = name
+    join_room(name)
+    with room_lock:
+        room.host = request.sid
+        room.viewers.add(request.sid)
+        viewers[request.sid] = name
+        open_room(room, rate, data, events)
+    emit("host greet", {"room_id": name, "hud": HUD_TITLES,
+        "playfield": PLAYFIELD, "host_key": room.host_key})
+
+
+def new_room():
+    """Make an idle room for the pool, with its ID and the boards of its
+    players made ahead of time.
+    """
+    room = GameThread(None, None, game_config)
+    room.name = uuid()[:10] # More chance of duplicate
+                            # But 'rare enough'
+    room.host_key = uuid()
+    room.warm(2)
+    return room
+
+
+def open_room(room, rate: float, data: bytes, events: bool):
+    """Start a room taken from the pool. Call with room_lock held, once the
+    room's ID is claimed and its host set.
+    rate - Broadcast rate (frames per second) for the room.
+    data - Snapshot to resume the room from, None for a new room.
+    events - Stream the match as events instead of frames.
+    """
+    room.clock = BroadcastClock(rate, MIN_BROADCAST_RATE)
+    if events:
+        room.match = MatchStream(TICK_RATE, CHECKSUM_TICKS)
+    if data is not None:
         try:
+            room.restore(data)
+            log.info("Resumed", room=room.name)
+        except (snapshot.SnapshotError, KeyError) as err:
+            log.warning("Can't resume", room=room.name, error=repr(err))
+    room.expire_time = time.perf_counter() + EXPIRE_TIME
+    rooms[room.name] = room
+    expiry.schedule(room.name, room.expire_time)
+    naps.schedule(room.name, time.perf_counter() + NAP_TIME)
+
+
+@sockets.on("watch", namespace="/host")
+def watch(room_id, key=""):
+    """Subscribe a spectator to a room's "update" stream, or the host
+    again after it reconnected when key is the room's host key.
+    The latest keyframe is sent right away if the game has started.
+    Returns (boolean, message, playfield) to client.
+    """
+    room_id = str(room_id)
+    result = room_call(room_id, "watch", request.sid, str(key or ""))
+    if result is None:
+        return False, "Invalid room"
+    join_room(room_id)
+    viewers[request.sid] = room_id
+    send_keyframe(result)
+    return True, "Watching room", PLAYFIELD
+
+
+@sockets.on("keyframe", namespace="/host")
+def keyframe(room_id):
+    """Send the latest keyframe of a room to the requesting viewer."""
+    result = room_call(str(room_id), "keyframe")
+    if result is not None:
+        send_keyframe(result)
+
+
+def send_keyframe(result: list):
+    """Send a room_keyframe result to the requesting viewer."""
+    keyframe, huds, match = result
+    if keyframe is not None:
+        emit("update", keyframe)
+    if len(huds) > 0:
+        emit("hud", {"boards": huds})
+    for message in match:
+        emit("match", message)
+
+
+@sockets.on("add bot", namespace="/host")
+def add_bot(hid):
+    """Fill an empty seat of the host's room with a computer player.
+    Returns (boolean, message) to client.
+    """
+    result = room_call(str(hid), "add bot", request.sid)
+    return tuple(result) if result is not None else (False,
+        "Invalid room")
+
+
+@sockets.on("ack", namespace="/host")
+def ack(room_id, seq):
+    """Host echo of a "trace" frame seq, ends input latency traces."""
+    if isinstance(seq, int):
+        room_send(str(room_id), "ack", seq)
+
+
+@sockets.on("ready", namespace="/host")
+def ready(hid):
+    """When the host is ready to begin the match.
+    Will only start the match if 2 players have joined, and only for the
+    room's host.
+    Returns (boolean, message) to client, where boolean is True when
+    the game is starting.
+    """
+    result = room_call(str(hid), "ready", request.sid)
+    return tuple(result) if result is not None else (False,
+        "Invalid room")
+
+
+@sockets.on_error_default
+def all_error_handler(e):
+    log.error("SocketIO error", error=repr(e))
+
+
+@sockets.on("join")
+def join(data):
+    """
+    Handle player joining room. Data should be an object with:
+        room - Room ID to join.
+        token - Optional reclaim token of a seat, to take it back after
+            reconnecting or in a resumed room.
+    Returns (boolean, message, [bid, token]) to client. Where the boolean
+    is True when the client has successfully joined the room. bid and the
+    seat's secret reclaim token are only returned when the client is in
+    the room.
+    """
+    try:
+        data = loads(data)
+        room_id = str(data["room"])
+        board_id = request.sid
+        result = room_call(room_id, "join", board_id,
+            str(data.get("token", "")))
+        if result is None:
+            return False, "Invalid Room"
+        elif not result[0]:
+            return tuple(result)
+        join_room(room_id)
+        sessions[board_id] = room_id
+        return True, result[1], board_id, result[2]
+    except Exception as e:
+        log.error("Join error", error=repr(e))
+        return False, "Error"
+
+
+@sockets.on("leave")
+def leave(data=None):
+    """
+    Handle player leaving the room joined with this socket. Its board is
+    the one of the socket: the room and board ID that older clients send
+    in data are ignored, as every viewer sees the board IDs.
+    """
+    try:
+        room_id = sessions.pop(request.sid, None)
+        if room_id is None:
+            return
+        leave_room(room_id)
+        room_send(room_id, "leave", request.sid)
+    except Exception as e:
+        log.error("Leave error", error=repr(e))
+
+
+@sockets.on("input")
+def inp(msg):
+    """
+    Handle player input. msg is either a binary input (see
+    server.protocol) for the room joined with this socket, or an
+    object with:
+        room - Room ID.
+        command - Input command name.
+        seq - Optional input sequence number.
+        t - Optional client timestamp (milliseconds since epoch).
+        event - Optional "press" or "release" of a held input, the input
+            is tapped (performed once) otherwise.
+    """
+    release = is_release(msg) # Limited once parsed, see below
+    if not release and limited(input_limit, address_input_limit): # Before
+        return                                                   # parsing
+    try:
+        bid = request.sid
+        if isinstance(msg, bytes):
+            room_id = sessions.get(bid)
+            decoded = decode_input(msg)
+            if room_id is None or decoded is None:
+                return
+            op, event, seq, client_time = decoded
+        else:
             formatted = loads(msg)
-            print(formatted)
-            formatted["bid"] = request.sid
-            if not contains(formatted, ["room", "bid", "command"]):
+            if not contains(formatted, ["room", "command"]):
                 return
-            with room_lock:
-                if formatted["room"] in rooms:
-                    rooms[formatted["room"]].boards[formatted["bid"]].performInput(formatted["command"])
-        except Exception as err:
-            print(f"Input error: {err}")
-    
-    sockets.run(app, port=os.environ.get("PORT", 33507), log_output=False,
-        host="0.0.0.0", debug=False)
+            room_id = str(formatted["room"])
+            op = GameInput.opcode(formatted["command"])
+            if op < 0:
+                return
+            seq, client_time = formatted.get("seq"), formatted.get("t")
+            event = EVENTS.get(formatted.get("event"), TAP)
+        if release and event != RELEASE: # Only looked like one
+            if limited(input_limit, address_input_limit):
+                return
+        elif release:
+            # Releases of held inputs are never dropped, or the input would
+            # repeat; there is one per press let through. Others have their
+            # own bucket.
+            pressed = held.get(bid, ())
+            if op in pressed:
+                pressed.discard(op)
+            elif limited(release_limit, address_input_limit):
+                return
+        elif event == PRESS and op in HELD_INPUTS:
+            held.setdefault(bid, set()).add(op)
+        metrics.count("inputs")
+        log.log("input", "Input", room=room_id, bid=bid, command=INPUTS[op],
+            event=event)
+        room_send(room_id, "input", bid, op, event, seq, client_time)
+    except Exception as err:
+        log.error("Input error", error=repr(err))
+
+
+def limited(socket_limit: RateLimiter, address_limit: RateLimiter) -> bool:
+    """Check if an event of the requesting socket is over the limit of the
+    socket or its address, and should be dropped.
+    """
+    now = time.perf_counter()
+    return not (socket_limit.allow(request.sid, now) and
+        address_limit.allow(addresses.get(request.sid), now))
+
+
+def remote_address() -> str:
+    """Get the address of the requesting client. With TRUST_PROXY set, e.g.
+    behind Heroku's router, it is the last address of X-Forwarded-For, the
+    ones before it are sent by the client and can't be trusted. Otherwise
+    the header is ignored, as any client could set it.
+    """
+    forwarded = request.headers.get("X-Forwarded-For") if TRUST_PROXY \
+        else None
+    if forwarded:
+        return forwarded.rsplit(",", 1)[-1].strip()
+    return request.remote_addr
+
+
+@sockets.on("connect")
+@sockets.on("connect", namespace="/host")
+def connect(auth=None):
+    start_workers()
+    addresses[request.sid] = remote_address()
+
+
+@sockets.on("disconnect")
+def disconnect(reason=None):
+    """A controller left or missed its heartbeats. Its board waits for it
+    to rejoin, see room_away.
+    """
+    forget_socket(request.sid)
+    room_id = sessions.pop(request.sid, None)
+    if room_id is not None:
+        room_send(room_id, "away", request.sid)
+
+
+@sockets.on("disconnect", namespace="/host")
+def host_disconnect(reason=None):
+    """A host or spectator left or missed its heartbeats."""
+    forget_socket(request.sid)
+    room_id = viewers.pop(request.sid, None)
+    if room_id is not None:
+        room_send(room_id, "unwatch", request.sid)
+
+
+def forget_socket(sid: str):
+    """Drop the rate limits of a socket that disconnected."""
+    addresses.pop(sid, None)
+    held.pop(sid, None)
+    input_limit.forget(sid)
+    release_limit.forget(sid)
+    host_limit.forget(sid)
+
+
+def start_workers():
+    """Start the background workers of this process, once. Called on the
+    first request or connection, so under Gunicorn they start in the worker
+    process once it has monkey patched.
+    """
+    global workers_started
+    if state_pid != os.getpid(): # Forked from the process that made it
+        init_state()
+        workers_started = False
+    with room_lock:
+        if workers_started:
+            return
+        workers_started = True
+    sockets.start_background_task(log.worker)
+    sockets.start_background_task(checkpoints.worker)
+    log.info("Starting workers...", mode=ASYNC_MODE)
+    registry.start(handle_room_call)
+    sockets.start_background_task(roomWorker)
+    sockets.start_background_task(deadCheckWorker)
+    for i in range(out_q.get_workers()):
+        sockets.start_background_task(out_q.worker, i)
+
+
+def create_app() -> Flask:
+    """Create the app, e.g. for Gunicorn: gunicorn "main:create_app()".
+    Nothing is started until the first request or connection, so the app
+    may be preloaded and forked (see start_workers).
+    """
+    init_state()
+    app = Flask(__name__)
+    app.register_blueprint(html, url_prefix="/")
+    app.before_request(start_workers)
+    sockets.init_app(app, async_mode=ASYNC_MODE, message_queue=REDIS_URL,
+        ping_interval=HEARTBEAT_TIME, ping_timeout=HEARTBEAT_TIMEOUT)
+    return app
 
 
-class GameThread(Thread):
+class GameThread:
+    """A room, run as a background task (a thread or green thread)."""
 
-    def __init__(self, state_q: Queue, input_q: Queue, blocks, frames):
+    def __init__(self, state_q: Queue, input_q: Queue, config: GameConfig,
+        rate: float = BROADCAST_RATE, events: bool = False):
         """
         state_q - Game State Queue (start, stop, etc.).
         input_q - Game Input Queue (from players).
-        blocks - Block data.
-        Frames - Frame data.
+        config - Game rules, shared by every room.
+        rate - Broadcast rate (frames per second sent to the room).
+        events - Stream the match as events instead of frames.
         """
-        super().__init__()
         self.name = ""
-        self.polling = True # Polling for state_q event
+        self.host = None # Socket ID of the host, who starts the room
+        self.host_key = "" # Secret of the host, see room_watch
+        self.started = False # Asked to start by the host?
+        self.paused = False # Paused by a player, see resume
+        self.ticking = False # Has a running thread?
+        self._sleep = None # Snapshot of the boards while hibernating
+        self.viewers = set() # Socket IDs of the host and spectators
+        self.away = set() # Board IDs of disconnected players
+        self.deserting = False # Nobody left, removed after GRACE_TIME
         self.expire_time = 0
-        self._blocks = blocks
-        self._frames = frames
+        self._config = config
         self.boards = {} # Keys will be board ID (bid)
+        self._spares = [] # Boards made ahead of time, see warm
+        self.bots = {} # Computer players, keys are their board's bid
+        self.tokens = {} # Player board ID to its secret reclaim token
+        self._traces = [] # Traced inputs applied since the last frame
         self.losses = 0 # When 2, end game
         self.state_q = state_q if state_q else Queue()
         self.input_q = input_q if input_q else Queue()
         self.running = False # Game active?
+        self.frames = FrameBuffer() # Published board frames
+        self.hud = HudTracker() # HUD values sent to the room
+        self.match = MatchStream(TICK_RATE, CHECKSUM_TICKS) if events \
+            else None # Match events sent instead of frames
+        self.clock = BroadcastClock(rate, MIN_BROADCAST_RATE)
 
     def new_board(self) -> Board:
-        return Board(10, 20, self._blocks, self._frames)
-
-    def board_update(self):
-        """Update all player boards.
-        Returns list of dictionary of board IDs and their raw grid data. Ready
-        to send to host client in following JSON format:
-        {
-            "bid": Str,
-            "grid": list
-        }
+        """Get a board for a new player, made ahead of time if warm."""
+        if len(self._spares) > 0:
+            return self._spares.pop()
+        return self._make_board()
+
+    def warm(self, boards: int):
+        """Make boards ahead of time, see new_board."""
+        self._spares = [self._make_board() for i in range(boards)]
+
+    def _make_board(self) -> Board:
+        config = self._config
+        board = Board(config.width, config.height, config.blocks,
+            config.gravity, shapes=config.shapes)
+        board.set_auto_repeat(*config.auto_repeat)
+        return board
+
+    def new_bot(self) -> Bot:
+        return Bot(self._config.blocks, BOT_BUDGET, pool=planners,
+            deadline=BOT_DEADLINE)
+
+    def claimable(self, token: str) -> str:
+        """Get the board ID of the player seat token reclaims, None if it
+        reclaims none. Tokens are only sent to the seat's player, unlike
+        board IDs, which every viewer sees.
+        """
+        if not token:
+            return None
+        for bid, seat_token in self.tokens.items():
+            if compare_digest(token, seat_token):
+                return bid
+        return None
+
+    def claim(self, seat: str, bid: str):
+        """Give the board of seat (see claimable) to a player's new board ID.
+        Call with room_lock held.
+        """
+        # Replaced at once, keeping the seat order for a running game
+        self.boards = {bid if k == seat else k: b for k, b in
+            self.boards.items()}
+        self.tokens = {bid if k == seat else k: t for k, t in
+            self.tokens.items()}
+        self.away.discard(seat)
+        self.release_held(bid) # Releases queued for seat no longer apply
+
+    def release_held(self, bid: str):
+        """Queue the release of every input a board may be holding, so it
+        doesn't keep moving once its player is gone.
+        """
+        for op in HELD_INPUTS:
+            self.performInput((bid, op, RELEASE, None))
+
+    def deserted(self) -> bool:
+        """Check if nobody is left to play or watch the room."""
+        return len(self.viewers) == 0 and all(bid in self.away or
+            bid in self.bots for bid in self.boards)
+
+    def check_deserted(self):
+        """Stop a room nobody plays or watches: it is paused and hibernates
+        (see run), and is removed unless someone is back within GRACE_TIME.
+        Call with room_lock held.
+        """
+        if self.deserting or not self.deserted():
+            return
+        log.info("Deserted", room=self.name)
+        self.deserting = True
+        if self.ticking:
+            self.paused = True
+        else: # Right away, by the killer worker (see nap_rooms)
+            naps.schedule(self.name, time.perf_counter())
+        expiry.schedule(self.name, time.perf_counter() + GRACE_TIME)
+
+    def attended(self):
+        """Keep a deserted room, someone is back. Call with room_lock held."""
+        if self.deserting:
+            self.deserting = False
+            expiry.schedule(self.name, time.perf_counter() + EXPIRE_TIME)
+
+    def snapshot(self) -> bytes:
+        """Snapshot the boards of the room, see restore.
+        Only call from the room's own thread while it is running.
+        """
+        return snapshot.dump({
+            "boards": [[bid, b.get_state()] for bid, b in
+                list(self.boards.items())],
+            "bots": list(self.bots),
+            "tokens": dict(self.tokens),
+            "losses": self.losses
+        })
+
+    def restore(self, data: bytes):
+        """Replace the boards of the room with a snapshot's, before the room
+        is started. Raises snapshot.SnapshotError if it can't be restored.
+        """
+        state = snapshot.load(data)
+        boards = {}
+        for bid, board_state in state["boards"]:
+            board = self.new_board()
+            board.set_state(board_state)
+            boards[bid] = board
+        self.bots = {bid: self.new_bot() for bid in state["bots"]}
+        self.tokens = dict(state["tokens"])
+        self.boards = boards
+        self.losses = state["losses"]
+
+    def board_update(self) -> Frame:
+        """Update all player boards and publish their grids as a new Frame.
+        HUD values that changed are posted to the output stage, on their
+        own "hud" event. Returns the published frame, None if the room
+        streams match events instead (posted too). Readers should use
+        self.frames.latest() instead of touching the boards, which belong
+        to the game thread.
+        """
+        grids = []
+        huds = []
+        locked = False
+        boards = list(self.boards.items())
+        for bid, b in boards:
+            locked = b.update(1 / TICK_RATE) or locked
+            if self.match is None:
+                grids.append((bid, Frame.freeze(b.get_raw_grid())))
+            changed = self.hud.update(bid, b)
+            if changed is not None:
+                huds.append([bid, changed])
+        if len(huds) > 0 and len(self.viewers) > 0 and not out_q.post(
+            self.name, "hud", {"boards": huds}, HudTracker.merge):
+            self.hud.forget(bid for bid, changed in huds) # Resent whole
+        if self.match is not None:
+            for message in self.match.tick(dict(boards)):
+                self._emit_match(message)
+            return None
+        frame = self.frames.publish(tuple(grids), locked)
+        if len(self._traces) > 0:
+            tracer.published(self._traces, frame.seq)
+            self._traces = []
+        return frame
+
+    def _emit_match(self, message: str):
+        # Late viewers catch up (see sync), and so do viewers that missed a
+        # message dropped on a full queue
+        if len(self.viewers) > 0 and not out_q.post(self.name, "match",
+            message):
+            self.match.resync()
+
+    def start(self):
+        """Run the game in a background task. Rooms take no thread until
+        then. Call with room_lock held.
         """
-        result = []
-        for bid, b in self.boards.items():
-            b.update(1 / 60)
-            result.append({ "bid": bid, "grid": b.get_raw_grid() })
-        return result
+        self.ticking = True
+        sockets.start_background_task(self.run)
 
     def run(self):
-        while self.polling:
-            if self.state_q.get() == "start":
-                polling = False
-                self.start_game()
-                break
-        self.destroy()
-
-    def performInput(self, inp):
-        """Add an input command to the input queue."""
-        input_q.put(inp)
-
-    def start_game(self):
+        resumable = False
+        expiry.cancel(self.name) # Running games don't expire
+        try:
+            while self.start_game(): # Paused
+                with room_lock:
+                    paused = self.paused # Not resumed meanwhile?
+                    if paused:
+                        data = self.hibernate()
+                        expiry.schedule(self.name, time.perf_counter() +
+                            (GRACE_TIME if self.deserting else EXPIRE_TIME))
+                        self.ticking = False
+                if paused: # Can be resumed from its checkpoint
+                    checkpoints.set(self.name, data)
+                    return
+        except Exception as err:
+            log.error("Room crashed", room=self.name, error=repr(err))
+            resumable = True
+        self.ticking = False
+        self.destroy(resumable)
+
+    def stop(self):
+        """Stop the room, removing it right away if it isn't running."""
+        if self.ticking:
+            self.state_q.put("stop")
+        else:
+            self.destroy()
+
+    def hibernate(self) -> bytes:
+        """Keep the room as a compact snapshot, without its boards, until it
+        is woken (see wake). Only call with room_lock held, while the room
+        has no running thread.
+        Returns the snapshot, to checkpoint once room_lock is released;
+        None if the room was hibernating already.
+        """
+        if self._sleep is not None:
+            return None
+        self._sleep = self.snapshot()
+        # Keys stay for counting and claiming seats, see wake
+        self.boards = dict.fromkeys(self.boards)
+        self.bots = dict.fromkeys(self.bots)
+        self._spares = []
+        log.info("Hibernating", room=self.name)
+        return self._sleep
+
+    def hibernating(self) -> bool:
+        """Check if the room is hibernating, see hibernate."""
+        return self._sleep is not None
+
+    def wake(self):
+        """Restore the boards of a hibernating room. Call with room_lock
+        held before touching the boards of the room.
+        """
+        if not self.ticking: # Waiting and paused rooms nap again when idle
+            naps.schedule(self.name, time.perf_counter() + NAP_TIME)
+        if self._sleep is None:
+            return
+        data, self._sleep = self._sleep, None
+        self.restore(data)
+
+    def resume(self):
+        """Resume a paused room. Call with room_lock held."""
+        if not self.paused:
+            return
+        self.wake()
+        if self.ticking: # Its thread hasn't stopped yet, it carries on
+            self.paused = False
+        else:
+            expiry.cancel(self.name)
+            self.paused = False
+            self.start()
+        log.info("Resuming", room=self.name)
+
+    def performInput(self, inp: tuple) -> bool:
+        """Add an input command to the input queue, returning whether it
+        was. Taps and presses past INPUT_QUEUE are dropped, releases are
+        always queued (inp limits them) so no input is left held.
+        inp - Tuple of board ID, input opcode, input event and Trace (or
+            None).
+        """
+        if inp[2] != RELEASE and self.input_q.qsize() >= INPUT_QUEUE:
+            metrics.count("inputs_dropped")
+            return False
+        self.input_q.put(inp)
+        return True
+
+    def _update_bots(self):
+        """Let each computer player think and perform its next input."""
+        for bid, bot in list(self.bots.items()):
+            board = self.boards.get(bid)
+            if board is None:
+                continue
+            inp = bot.update(board)
+            if inp is not None:
+                op = GameInput.opcode(inp)
+                board.perform(op)
+                if self.match is not None:
+                    self.match.record(bid, op, TAP)
+
+    def _apply_inputs(self):
+        """Apply up to INPUT_LIMIT queued inputs to their boards."""
+        for i in range(INPUT_LIMIT):
+            try:
+                bid, op, event, trace = self.input_q.get_nowait()
+            except Empty:
+                return
+            board = self.boards.get(bid)
+            if board is None:
+                continue
+            elif op == PAUSE: # Stops ticking after this tick
+                self.paused = True
+                return
+            else:
+                board.perform(op, event)
+                if self.match is not None:
+                    self.match.record(bid, op, event)
+                if trace is not None:
+                    tracer.applied(trace)
+                    self._traces.append(trace)
+
+    def start_game(self) -> bool:
+        """Run the game until it ends or is paused.
+        Returns True if it was paused.
+        """
         sockets.emit("start game", room=self.name, namespace="/host")
         self.running = True
-        current = None # Current frame's grid from update
-        last = None # Last frame's grid from update
-        while self.running and len(self.boards) >= 2:
+        if self.match is not None:
+            self._emit_match(self.match.start(self.boards))
+        last = None # Last emitted frame
+        next_tick = time.perf_counter()
+        tick_time = metrics.histogram("tick") # Work done per tick
+        lag_time = metrics.histogram("tick_lag") # Lateness of tick starts
+        checkpoint_time = metrics.histogram("checkpoint")
+        ticks = 0
+        while self.running and len(self.boards) >= 2 and not self.paused:
+            start = time.perf_counter()
+            lag_time.record(max(0, start - next_tick))
             try:
                 if self.state_q.get_nowait() == "stop": # Currently unused
-                    print(f"({self.name}) Received stop in state queue")
+                    log.info("Received stop in state queue", room=self.name)
                     self.running = False
-                for i in range(INPUT_LIMIT):
-                    inp = self.input_q.get_nowait()
-                    self.boards[inp[0]].performInput(inp[1])
-            except: # get_nowait
+            except Empty:
                 pass
+            self._apply_inputs()
+            self._update_bots()
 
-            for bid, b in self.boards.items():
+            for bid, b in list(self.boards.items()):
                 self.running = not b.has_lost()
                 if not self.running:
-                    print(f"({self.name}) Player {bid} has lost")
+                    log.info("Player has lost", room=self.name, bid=bid)
                     break
-            # Send new boards
-            # TODO: Optimize later
-            if current != None:
-                last = current[:]
-            current = self.board_update()
-            if current != last:
-                sockets.emit("update", current, room=self.name, namespace="/host")
-            time.sleep(.016)
+            self.board_update()
+            last = self._broadcast(last, not self.running)
+            ticks += 1
+            if self.running and ticks % (CHECKPOINT_TIME * TICK_RATE) == 0:
+                checkpoint_start = time.perf_counter()
+                checkpoints.set(self.name, self.snapshot())
+                checkpoint_time.record(time.perf_counter() -
+                    checkpoint_start)
+
+            now = time.perf_counter()
+            tick_time.record(now - start)
+            next_tick += 1 / TICK_RATE
+            delay = next_tick - now
+            if delay > 0:
+                sockets.sleep(delay)
+            else: # Behind schedule, don't try to catch up
+                next_tick = time.perf_counter()
+        self._broadcast(last, True)
+        if self.running and len(self.boards) >= 2: # Paused, even if resumed
+            self.running = False                   # meanwhile
+            sockets.emit("paused", room=self.name, namespace="/host")
+            return True
+        if self.match is not None:
+            self._emit_match(self.match.end())
+        return False
+
+    def _broadcast(self, last: Frame, force: bool = False) -> Frame:
+        """Send the latest frame if it changed and the clock allows it.
+        last - Last frame sent.
+        force - Send regardless of the clock (e.g. game over).
+        Returns the last frame sent.
+        """
+        current = self.frames.latest()
+        if len(self.viewers) == 0: # Late viewers get a keyframe anyway
+            return last
+        elif current is None or current.same_boards(last):
+            return last
+        if not self.clock.due(time.perf_counter(), force or current.flush):
+            return last
+        if not out_q.push(self.name, current):
+            self.clock.report_load(1)
+            return last
+        self.clock.report_load(max(out_q.pressure(self.name),
+            admission.pressure())) # Back off when the node is busy too
+        return current
 
-    def destroy(self):
-        print(f"({self.name}) Ending.")
+    def destroy(self, resumable: bool = False):
+        """Remove the room.
+        resumable - Keep its last checkpoint so a host can resume it.
+        """
+        log.info("Ending", room=self.name)
+        expiry.cancel(self.name)
+        with room_lock:
+            removed = rooms.get(self.name) in (self, None) # Not replaced
+            if removed:
+                rooms.pop(self.name, None)
+                if resumable: # Dropped by the killer worker if not resumed
+                    expiry.schedule(self.name,
+                        time.perf_counter() + EXPIRE_TIME)
+        if removed:
+            registry.release(self.name)
+            if not resumable:
+                checkpoints.drop(self.name)
+        out_q.close(self.name)
+        tracer.close(self.name)
 
 
 
 def deadCheckWorker():
-    """Checks if any game threads are dead and closes them."""
-    print("Starting killer worker...")
+    """Checks if any game threads are dead and closes them. Also samples
+    the load of the node for admission and prunes address rate limits.
+    """
+    log.info("Starting killer worker...")
     while True:
-        time.sleep(DEAD_TIME)
+        sockets.sleep(DEAD_TIME)
+        admission.sample(time.perf_counter())
+        for limit in (address_input_limit, address_host_limit):
+            limit.prune(time.perf_counter())
         with room_lock:
-            current = time.perf_counter()
-            for key in list(rooms.keys()):
-                if current >= rooms[key].expire_time and not rooms[key].running:
-                    print(f"{key} has been inactive, killing...")
-                    rooms[key].polling = False # Possible data race?
-                    del rooms[key]
-                    print(f"Active rooms:\n{list(rooms.keys())}")
-
-
-def restartingThread():
-    """Handles creation of new game threads."""
-    print("Starting room worker...")
-    blocks = load(open("config/blocks.json"))["blocks"]
-    frames = load(open("config/frames.json"))
-    while True:
-        hid = new_q.get() # Unique room ID as string
+            names = list(rooms)
+        registry.renew(names)
+        nap_rooms(time.perf_counter())
+        expire_rooms(time.perf_counter())
+
+
+def expire_rooms(now: float):
+    """Remove the rooms whose expiry is due (see EXPIRE_TIME and
+    GRACE_TIME) unless they are running, and drop the checkpoints of
+    crashed rooms that weren't resumed.
+    """
+    for key in expiry.advance(now):
         with room_lock:
-            if len(rooms) < THREADS_LIMIT:
-                game_thread = GameThread(None, None, blocks, frames)
-                game_thread.name = hid
-                game_thread.expire_time = time.perf_counter() + EXPIRE_TIME
-                rooms[hid] = game_thread
-                game_thread.start()
-                #eventlet.spawn(game_thread.run)
-                sockets.emit("host greet",
-                    {"room_id": hid},
-                    room=hid,
-                    namespace="/host")
-                #sockets.emit("start game", room=hid, namespace="/host")
-            else:
-                print("Warning: maximum capacity reached for game threads")
+            room = rooms.get(key)
+            if room is not None and not room.running:
+                del rooms[key]
+        if room is None: # Crashed room that wasn't resumed
+            checkpoints.drop(key)
+            continue
+        elif room.running:
+            continue
+        log.info("Inactive, killing...", room=key)
+        room.stop()
+
+
+def nap_rooms(now: float):
+    """Hibernate the rooms due for a nap (see GameThread.wake) that aren't
+    ticking. Paused games are checkpointed again, as players may have
+    rejoined since.
+    """
+    for key in naps.advance(now):
+        data = None
+        with room_lock:
+            room = rooms.get(key)
+            if room is not None and not room.ticking:
+                data = room.hibernate()
+        if data is not None and room.started:
+            checkpoints.set(key, data)
+
+
+def roomWorker():
+    """Keeps the pool of idle rooms filled."""
+    log.info("Starting room worker...")
+    global planners
+    if PLANNERS > 0: # Workers are sent a plain copy of the blocks
+        planners = PlannerPool(dict(game_config.blocks), PLANNERS)
+    while True:
+        room_pool.fill()
+        sockets.sleep(POOL_REFILL)
 
 
 def contains(target: dict, keyList: list) -> bool:
@@ -293,9 +1281,10 @@ def contains(target: dict, keyList: list) -> bool:
             return False
     return True
 
-page_thread = Thread(target=pageWorker, name="page")
-handler_thread = Thread(target=restartingThread, name="handler")
-kill_thread = Thread(target=deadCheckWorker, name="killer")
-page_thread.start()
-handler_thread.start()
-kill_thread.start()
+
+# Guarded so planner worker processes can import this module safely
+if __name__ == "__main__":
+    app = create_app()
+    start_workers()
+    sockets.run(app, port=int(os.environ.get("PORT", 33507)), log_output=False,
+        host="0.0.0.0", debug=False)
@@ -0,0 +1,107 @@
+# Room admission from measured node load, instead of a fixed room count
+import os
+
+
+def rss_bytes() -> int:
+    """Get the resident memory of this process, None if unknown (it is
+    read from /proc, so only known on Linux).
+    """
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class Admission:
+    """Decides whether this node takes new rooms, from its measured load.
+    Every sample() compares each signal with its limit:
+        - Tick budget: share of the time spent running room ticks. Rooms
+          share one core (the GIL or the event loop), so 1 is saturated.
+        - p99 lateness of tick starts since the last sample.
+        - Output queue depth.
+        - Resident memory.
+    The load is the highest of these ratios. At 1 or more the node is
+    saturated: new rooms are refused with a retry hint. From degrade on,
+    pressure() rises so running rooms lower their broadcast rate.
+    """
+
+    DEGRADE = 0.8 # Load from which rooms broadcast less
+
+    def __init__(self, tick_hist, lag_hist, depth, tick_budget: float = 0.7,
+        lag_p99: float = 0.02, depth_limit: int = 256,
+        memory_limit: int = None, max_rooms: int = None, retry: float = 5,
+        memory=rss_bytes):
+        """
+        tick_hist - Histogram of the work done per room tick.
+        lag_hist - Histogram of how late room ticks start.
+        depth - Callable that gets the output queue depth.
+        tick_budget - Share of time rooms may spend ticking.
+        lag_p99 - Highest p99 seconds a tick may start late.
+        depth_limit - Most queued frames.
+        memory_limit - Most resident bytes, None for no limit.
+        max_rooms - Most rooms, None for no limit.
+        retry - Seconds a refused host is told to wait before retrying.
+        memory - Callable that gets the resident bytes, None if unknown.
+        """
+        self._tick_hist = tick_hist
+        self._lag_hist = lag_hist
+        self._depth = depth
+        self._tick_budget = tick_budget
+        self._lag_p99 = lag_p99
+        self._depth_limit = depth_limit
+        self._memory_limit = memory_limit
+        self._max_rooms = max_rooms
+        self._retry = retry
+        self._memory = memory
+        self._last = None # Time, tick work sum and lag snapshot
+        self._signals = {} # Signal name to load ratio, last sample
+        self.load = 0 # Highest ratio of the last sample
+        self.refused = 0 # Rooms refused
+
+    def sample(self, now: float):
+        """Measure the load of the node, e.g. every second.
+        now - Current time in seconds (perf_counter).
+        """
+        current = now, self._tick_hist.get_sum(), self._lag_hist.snapshot()
+        signals = {"depth": self._depth() / self._depth_limit}
+        if self._last is not None and now > self._last[0]:
+            then, work, counts = self._last
+            signals["ticks"] = (current[1] - work) / (now - then) / \
+                self._tick_budget
+            signals["lag"] = self._lag_hist.percentile(99, counts) / \
+                self._lag_p99
+        if self._memory_limit is not None:
+            rss = self._memory()
+            if rss is not None:
+                signals["memory"] = rss / self._memory_limit
+        self._last = current
+        self._signals = signals
+        self.load = max(signals.values())
+
+    def admit(self, rooms: int) -> bool:
+        """Check if a new room can be taken, counting it as refused if not.
+        rooms - Rooms this node runs now.
+        """
+        if self.load < 1 and (self._max_rooms is None or
+            rooms < self._max_rooms):
+            return True
+        self.refused += 1
+        return False
+
+    def get_retry(self) -> float:
+        """Get the seconds a refused host should wait before retrying."""
+        return self._retry
+
+    def pressure(self) -> float:
+        """Get how far the node is past degrade, from 0 to 1. Rooms report
+        it as broadcast load (see BroadcastClock.report_load).
+        """
+        return min(1, max(0, (self.load - Admission.DEGRADE) /
+            (1 - Admission.DEGRADE)))
+
+    def to_dict(self) -> dict:
+        """Get the last sample, for the stats endpoint."""
+        return {"load": self.load, "refused": self.refused,
+            "signals": dict(self._signals)}
@@ -0,0 +1,63 @@
+# Per-room broadcast pacing, independent of the simulation tick rate
+
+
+class BroadcastClock:
+    """Decides when a room sends its latest frame.
+    Frames are sent at most rate times per second. The effective rate
+    adapts to backpressure: it is halved when sending takes too much of the
+    send interval, and recovers by 1 Hz per send when sending is cheap.
+    Significant frames (placement, line clear, loss) are always sent.
+    """
+
+    HIGH_LOAD = 0.5 # Share of the interval spent sending that backs off
+    LOW_LOAD = 0.25 # Share of the interval under which the rate recovers
+
+    def __init__(self, rate: float = 30, min_rate: float = 5):
+        """
+        rate - Target (maximum) broadcasts per second.
+        min_rate - Lowest rate backpressure may reduce the clock to.
+        """
+        if min_rate <= 0 or rate < min_rate:
+            raise ValueError("Rates must satisfy 0 < min_rate <= rate")
+        self._rate = rate
+        self._min_rate = min_rate
+        self._current = rate # Effective rate
+        self._next = 0 # Time when the next broadcast is due
+
+    def get_rate(self) -> float:
+        """Get the target broadcast rate."""
+        return self._rate
+
+    def set_rate(self, rate: float):
+        """Set the target broadcast rate, clamped to the minimum rate."""
+        self._rate = max(self._min_rate, rate)
+        self._current = min(self._current, self._rate)
+
+    def get_current_rate(self) -> float:
+        """Get the effective (adapted) broadcast rate."""
+        return self._current
+
+    def due(self, now: float, significant: bool = False) -> bool:
+        """Check if a frame should be sent at time now (seconds).
+        Returns True, and schedules the next broadcast, when the interval
+        has passed or the frame is significant.
+        """
+        if significant or now >= self._next:
+            self._next = now + 1 / self._current
+            return True
+        return False
+
+    def report(self, elapsed: float):
+        """Adapt the effective rate after a send.
+        elapsed - Seconds the send took (or was stalled by backpressure).
+        """
+        self.report_load(elapsed * self._current)
+
+    def report_load(self, load: float):
+        """Adapt the effective rate to a measured load.
+        load - Share of the send budget in use, e.g. output queue fullness.
+        """
+        if load > BroadcastClock.HIGH_LOAD:
+            self._current = max(self._min_rate, self._current / 2)
+        elif load < BroadcastClock.LOW_LOAD:
+            self._current = min(self._rate, self._current + 1)
@@ -0,0 +1,107 @@
+# Lock-free hand-off of board state from the simulation to the network layer
+from json import dumps
+
+
+class Frame:
+    """An immutable snapshot of every board in a room for a single tick."""
+
+    __slots__ = ("seq", "boards", "flush", "_encoded")
+
+    def __init__(self, seq: int, boards: tuple, flush: bool = False):
+        """
+        seq - Sequence number of the frame, increases by 1 per publish.
+        boards - Tuple of (board ID, grid) pairs, grids are tuples of rows.
+        flush - True if the frame holds a significant event (placement,
+            line clear, loss) and should be sent right away.
+        """
+        self.seq = seq
+        self.boards = boards
+        self.flush = flush
+        self._encoded = None
+
+    @staticmethod
+    def freeze(grid: list) -> tuple:
+        """Convert a raw 2D grid list into a tuple of row tuples."""
+        return tuple(map(tuple, grid))
+
+    def to_list(self) -> list:
+        """Get the frame in the host's "update" format:
+        [{"bid": Str, "grid": list}, ...]
+        """
+        return [{"bid": bid, "grid": grid} for bid, grid in self.boards]
+
+    def encode(self) -> str:
+        """Get the frame as a compact JSON keyframe, encoded only once:
+        {"seq": Int, "key": true, "boards": [{"bid": Str, "grid": list}, ...]}
+        """
+        if self._encoded is None:
+            self._encoded = dumps({"seq": self.seq, "key": True,
+                "boards": self.to_list()}, separators=(",", ":"))
+        return self._encoded
+
+    def delta(self, base) -> dict:
+        """Get the rows that changed since base, a previous Frame:
+        {"seq": Int, "base": Int, "boards": [{"bid": Str, "rows": list}, ...]}
+        where rows is a list of [row index, row] pairs. None is returned if
+        the boards differ from base (a keyframe is needed instead).
+        """
+        if base is None or len(base.boards) != len(self.boards):
+            return None
+        boards = []
+        for (bid, grid), (base_bid, base_grid) in zip(self.boards,
+            base.boards):
+            if bid != base_bid or len(grid) != len(base_grid):
+                return None
+            rows = [[y, row] for y, (row, old) in
+                enumerate(zip(grid, base_grid)) if row != old]
+            boards.append({"bid": bid, "rows": rows})
+        return {"seq": self.seq, "base": base.seq, "boards": boards}
+
+    def same_boards(self, other) -> bool:
+        """Check if other holds the same board data as this frame."""
+        return other is not None and self.boards == other.boards
+
+
+class FrameBuffer:
+    """Ring of recently published frames with a single writer.
+    The simulation publishes a new Frame every tick; readers (emitters,
+    spectators) call latest() from any thread without locking. Frames are
+    never mutated after publishing, and swapping the index is a single
+    reference assignment, so a reader always sees a whole frame.
+    """
+
+    def __init__(self, size: int = 3):
+        """
+        size - Number of frames kept, at least 2 (double buffering).
+        """
+        if size < 2:
+            raise ValueError("size must be >= 2")
+        self._slots = [None] * size
+        self._index = 0
+        self._seq = 0
+
+    def publish(self, boards: tuple, flush: bool = False) -> Frame:
+        """Publish board data as the newest frame and return it.
+        Should only be called from the simulation thread.
+        """
+        self._seq += 1
+        frame = Frame(self._seq, boards, flush)
+        index = (self._index + 1) % len(self._slots)
+        self._slots[index] = frame
+        self._index = index
+        return frame
+
+    def latest(self) -> Frame:
+        """Get the newest published frame, None if nothing was published."""
+        return self._slots[self._index]
+
+    def previous(self, n: int = 1) -> Frame:
+        """Get the frame published n frames before the newest, if still held.
+        """
+        if n >= len(self._slots):
+            return None
+        frame = self._slots[(self._index - n) % len(self._slots)]
+        latest = self.latest()
+        if frame is None or latest is None or frame.seq != latest.seq - n:
+            return None
+        return frame
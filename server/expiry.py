@@ -0,0 +1,77 @@
+# Room expiry: deadlines kept in a hashed timer wheel
+from math import ceil, floor
+from threading import Lock
+
+
+class TimerWheel:
+    """Hashed timing wheel of keyed deadlines.
+    Deadlines are rounded up to a tick of resolution seconds and stored in
+    the bucket for that tick, so scheduling and cancelling are O(1).
+    Advancing only visits the buckets of the ticks that passed, which hold
+    the deadlines that are due (plus any scheduled more than a full turn
+    of the wheel ahead), so reaping doesn't scan every key.
+    All methods are thread-safe.
+    """
+
+    def __init__(self, resolution: float = 1, slots: int = 512,
+        start: float = 0):
+        """
+        resolution - Seconds per tick.
+        slots - Buckets in the wheel; deadlines up to resolution * slots
+            seconds ahead never share a bucket with a later turn.
+        start - Current time, in seconds.
+        """
+        if resolution <= 0 or slots < 1:
+            raise ValueError("resolution and slots must be > 0")
+        self._resolution = resolution
+        self._slots = [{} for _ in range(slots)] # Key to deadline tick
+        self._where = {} # Key to its slot
+        self._tick = floor(start / resolution) # Next tick to process
+        self._lock = Lock()
+
+    def __len__(self) -> int:
+        return len(self._where)
+
+    def __contains__(self, key) -> bool:
+        return key in self._where
+
+    def schedule(self, key, deadline: float):
+        """Schedule (or reschedule) key to expire at deadline seconds."""
+        with self._lock:
+            self._cancel(key)
+            tick = max(ceil(deadline / self._resolution), self._tick)
+            slot = tick % len(self._slots)
+            self._slots[slot][key] = tick
+            self._where[key] = slot
+
+    def cancel(self, key) -> bool:
+        """Cancel the deadline of key. Returns False if none was set."""
+        with self._lock:
+            return self._cancel(key)
+
+    def _cancel(self, key) -> bool:
+        slot = self._where.pop(key, None)
+        if slot is None:
+            return False
+        del self._slots[slot][key]
+        return True
+
+    def advance(self, now: float) -> list:
+        """Advance the wheel to now (seconds).
+        Returns the keys whose deadlines passed, they are no longer
+        scheduled.
+        """
+        expired = []
+        with self._lock:
+            last = floor(now / self._resolution)
+            # Past a full turn every bucket has been visited
+            first = max(self._tick, last - len(self._slots) + 1)
+            for tick in range(first, last + 1):
+                bucket = self._slots[tick % len(self._slots)]
+                for key, deadline in list(bucket.items()):
+                    if deadline <= last:
+                        del bucket[key]
+                        del self._where[key]
+                        expired.append(key)
+            self._tick = max(self._tick, last + 1)
+        return expired
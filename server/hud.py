@@ -0,0 +1,54 @@
+# Change-only HUD updates (score, lines, level, next, hold) of a room
+class HudTracker:
+    """Remembers the HUD values sent for each board of a room, so only the
+    values that changed are sent. Boards are checked by their HUD version
+    (see Board.get_hud_version), so an unchanged board costs one compare.
+    Only the room's thread should call update(); full() is safe to call
+    from any thread.
+    """
+
+    def __init__(self):
+        self._versions = {} # Board ID to last HUD version seen
+        self._sent = {} # Board ID to last HUD sent, replaced on change
+
+    def update(self, bid: str, board) -> dict:
+        """Get the HUD values of a board that changed since the last update,
+        None if none did.
+        """
+        version = board.get_hud_version()
+        if self._versions.get(bid) == version:
+            return None
+        self._versions[bid] = version
+        hud = board.get_hud()
+        last = self._sent.get(bid, {})
+        changed = {k: v for k, v in hud.items() if last.get(k) != v}
+        if len(changed) == 0:
+            return None
+        self._sent[bid] = hud
+        return changed
+
+    def forget(self, bids):
+        """Forget what was sent for the boards in bids, so their next
+        update has every HUD value, e.g. after a "hud" message was dropped.
+        """
+        for bid in bids:
+            self._versions.pop(bid, None)
+            self._sent.pop(bid, None)
+
+    @staticmethod
+    def merge(older: dict, newer: dict) -> dict:
+        """Combine two "hud" messages ({"boards": [[bid, changed], ...]})
+        not sent yet into one, see OutputStage.post.
+        """
+        boards = {bid: dict(changed) for bid, changed in older["boards"]}
+        for bid, changed in newer["boards"]:
+            boards.setdefault(bid, {}).update(changed)
+        return {"boards": [[bid, changed] for bid, changed in
+            boards.items()]}
+
+    def full(self, bids) -> list:
+        """Get [bid, HUD] of the boards in bids sent so far, for late
+        viewers.
+        """
+        sent = self._sent
+        return [[bid, sent[bid]] for bid in list(bids) if bid in sent]
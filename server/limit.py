@@ -0,0 +1,57 @@
+# Token bucket rate limits of socket events, by socket ID or address
+
+
+class RateLimiter:
+    """Token buckets by key, e.g. socket ID or remote address.
+    Each key may do burst events at once, then rate events per second. A
+    bucket is only a list of tokens and time, refilled when checked, so a
+    check is a dict lookup and a little arithmetic. Without a lock, racing
+    checks of one key may rarely let an extra event through.
+    """
+
+    def __init__(self, rate: float, burst: float):
+        """
+        rate - Events allowed per second, on average.
+        burst - Events allowed at once.
+        """
+        if rate <= 0 or burst < 1:
+            raise ValueError("rate must be > 0 and burst >= 1")
+        self._rate = rate
+        self._burst = burst
+        self._buckets = {} # Key to [tokens, time last checked]
+        self.dropped = 0 # Events refused
+
+    def allow(self, key, now: float) -> bool:
+        """Take a token for an event of key, if there is one.
+        now - Current time in seconds (perf_counter).
+        Returns False if the event should be dropped.
+        """
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            self._buckets[key] = [self._burst - 1, now]
+            return True
+        tokens = min(self._burst, bucket[0] + (now - bucket[1]) * self._rate)
+        bucket[1] = now
+        if tokens < 1:
+            bucket[0] = tokens
+            self.dropped += 1
+            return False
+        bucket[0] = tokens - 1
+        return True
+
+    def forget(self, key):
+        """Drop the bucket of a key, e.g. a socket that disconnected."""
+        self._buckets.pop(key, None)
+
+    def prune(self, now: float) -> int:
+        """Drop the buckets that have filled up again, which are the same
+        as no bucket. Returns how many were dropped.
+        """
+        full = [key for key, (tokens, last) in list(self._buckets.items())
+            if tokens + (now - last) * self._rate >= self._burst]
+        for key in full:
+            self._buckets.pop(key, None)
+        return len(full)
+
+    def __len__(self) -> int:
+        return len(self._buckets)
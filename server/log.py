@@ -0,0 +1,103 @@
+# Structured logging with sampling and rate limits, written off-thread
+from json import dumps
+from queue import Queue, Full
+import sys
+import time
+
+
+class Logger:
+    """Structured log records written by a background writer.
+    log() only checks the category's sampling and rate limit and queues the
+    record; formatting and writing happen in worker(), so game and socket
+    threads never block on the output stream. Records that don't fit in
+    the queue are dropped and counted.
+    Records are written as JSON lines:
+        {"t": Float, "cat": Str, "msg": Str, ...fields}
+    """
+
+    def __init__(self, stream=None, size: int = 4096):
+        """
+        stream - Writable text stream, None for stdout.
+        size - Maximum records waiting to be written.
+        """
+        self._stream = stream
+        self._queue = Queue(size)
+        self._categories = {} # Category to [sample, rate, count, window, n]
+        self.dropped = 0 # Records dropped on a full queue or by rate limit
+        self.written = 0
+
+    def configure(self, category: str, sample: int = 1, rate: int = 0):
+        """Set how much of a category is logged.
+        sample - Log one of every sample records.
+        rate - Maximum records per second, 0 for no limit.
+        """
+        if sample < 1 or rate < 0:
+            raise ValueError("sample must be > 0 and rate >= 0")
+        self._categories[category] = [sample, rate, 0, 0, 0]
+
+    def log(self, category: str, message: str, **fields) -> bool:
+        """Queue a record. Returns False if it was sampled out, rate
+        limited, or dropped.
+        """
+        config = self._categories.get(category)
+        now = time.time()
+        if config is not None:
+            sample, rate, count, window, n = config
+            config[2] = count + 1
+            if count % sample != 0:
+                return False
+            if rate > 0:
+                second = int(now)
+                if second != window:
+                    config[3], config[4] = second, 0
+                elif n >= rate:
+                    self.dropped += 1
+                    return False
+                config[4] += 1
+        try:
+            self._queue.put_nowait((now, category, message, fields))
+            return True
+        except Full:
+            self.dropped += 1
+            return False
+
+    def info(self, message: str, **fields) -> bool:
+        return self.log("info", message, **fields)
+
+    def warning(self, message: str, **fields) -> bool:
+        return self.log("warning", message, **fields)
+
+    def error(self, message: str, **fields) -> bool:
+        return self.log("error", message, **fields)
+
+    def stop(self):
+        """Ask the writer to stop after the queued records."""
+        self._queue.put(None)
+
+    @staticmethod
+    def format(record: tuple) -> str:
+        """Format a queued record as a JSON line."""
+        t, category, message, fields = record
+        return dumps({"t": round(t, 3), "cat": category, "msg": message,
+            **fields}, default=str)
+
+    def worker(self):
+        """Writer loop, runs until stop()."""
+        while True:
+            record = self._queue.get()
+            stop = record is None
+            lines = [] if stop else [Logger.format(record)]
+            while not stop and not self._queue.empty():
+                record = self._queue.get_nowait()
+                if record is None:
+                    stop = True
+                else:
+                    lines.append(Logger.format(record))
+            if len(lines) > 0:
+                stream = self._stream if self._stream is not None \
+                    else sys.stdout
+                stream.write("\n".join(lines) + "\n")
+                stream.flush()
+                self.written += len(lines)
+            if stop:
+                break
@@ -0,0 +1,148 @@
+# Event-sourced match stream: the inputs of each tick instead of frames
+from json import dumps
+
+
+def _encode(message: dict) -> str:
+    return dumps(message, separators=(",", ":"))
+
+
+class MatchStream:
+    """Records the inputs applied to a room's boards by tick, so viewers
+    that run the same deterministic engine (see MatchReplay) rebuild the
+    boards themselves instead of being sent their grids. What is sent grows
+    with player actions rather than the frame rate. Messages are compact
+    JSON objects:
+        {"tick": Int, "rate": Int, "boards": [[bid, state], ...]} - Sync:
+            the state of every board (see Board.get_state) after tick.
+        {"tick": Int, "inputs": [[bid, op, event], ...]} - Inputs applied
+            in order on tick, before the boards were updated.
+        {"tick": Int, "sums": [[bid, checksum], ...]} - Board checksums
+            after tick (see Board.checksum), to detect divergence.
+        {"tick": Int, "end": true} - The match ended after tick.
+    A new sync is taken at every checksum, so late viewers start from it
+    (see sync) rather than from the start of the match. Only the room's
+    thread should call start, record, tick and end.
+    """
+
+    def __init__(self, rate: int, checksum_interval: int = 60):
+        """
+        rate - Board updates (ticks) per second.
+        checksum_interval - Ticks between checksums.
+        """
+        if checksum_interval < 1:
+            raise ValueError("checksum_interval must be > 0")
+        self._rate = rate
+        self._interval = checksum_interval
+        self._inputs = [] # Inputs recorded this tick
+        self._bids = () # Board IDs of the last sync
+        self._log = (None, []) # Last sync and the messages sent since
+        self.ticks = 0 # Ticks ended
+
+    def start(self, boards: dict) -> str:
+        """Get the sync message that starts the match.
+        boards - Board ID to Board.
+        """
+        return self._sync(boards)
+
+    def _sync(self, boards: dict) -> str:
+        items = list(boards.items())
+        self._bids = tuple(bid for bid, b in items)
+        base = _encode({"tick": self.ticks, "rate": self._rate,
+            "boards": [[bid, b.get_state()] for bid, b in items]})
+        self._log = (base, []) # Replaced at once for readers of sync()
+        return base
+
+    def resync(self):
+        """Send a sync on the next tick, e.g. after a message was dropped
+        and viewers can't follow the inputs anymore.
+        """
+        self._bids = ()
+
+    def record(self, bid: str, op: int, event: int):
+        """Record an input as it is applied to a board this tick."""
+        self._inputs.append([bid, op, event])
+
+    def tick(self, boards: dict) -> list:
+        """End a tick, after the boards were updated.
+        Returns the messages to send for it, if any.
+        """
+        self.ticks += 1
+        inputs, self._inputs = self._inputs, []
+        if tuple(boards) != self._bids: # A board joined or left
+            return [self._sync(boards)]
+        messages = []
+        if len(inputs) > 0:
+            messages.append(_encode({"tick": self.ticks, "inputs": inputs}))
+        if self.ticks % self._interval == 0:
+            messages.append(_encode({"tick": self.ticks, "sums": [[bid,
+                b.checksum()] for bid, b in list(boards.items())]}))
+            self._sync(boards) # Late viewers start here from now on
+        else:
+            self._log[1].extend(messages)
+        return messages
+
+    def end(self) -> str:
+        """Get the message that ends the match."""
+        message = _encode({"tick": self.ticks, "end": True})
+        self._log[1].append(message)
+        return message
+
+    def sync(self) -> list:
+        """Get the messages a late viewer needs to catch up: the last sync
+        and everything sent since. Empty if the match hasn't started.
+        Safe to call from any thread.
+        """
+        base, since = self._log
+        return [base] + list(since) if base is not None else []
+
+
+class MatchReplay:
+    """Rebuilds the boards of a room from its MatchStream messages."""
+
+    def __init__(self, new_board):
+        """
+        new_board - Callable that makes a Board with the room's config.
+        """
+        self._new_board = new_board
+        self.boards = {}
+        self.tick = None # Tick the boards are at, None until a sync
+        self.ended = False
+        self._dt = 0
+
+    def apply(self, message: dict) -> list:
+        """Apply a decoded message.
+        Returns the IDs of boards that didn't match a checksum; they are
+        out of sync until the next sync message.
+        """
+        if "boards" in message:
+            self.boards = {}
+            for bid, state in message["boards"]:
+                board = self._new_board()
+                board.set_state(state)
+                self.boards[bid] = board
+            self.tick = message["tick"]
+            self._dt = 1 / message["rate"]
+            self.ended = False
+            return []
+        elif self.tick is None or message["tick"] < self.tick:
+            return [] # Waiting for a sync, or already applied
+        if "inputs" in message:
+            if message["tick"] == self.tick:
+                return [] # Already in the sync it follows
+            self.advance(message["tick"] - 1)
+            for bid, op, event in message["inputs"]:
+                board = self.boards.get(bid)
+                if board is not None:
+                    board.perform(op, event)
+        self.advance(message["tick"])
+        if "end" in message:
+            self.ended = True
+        return [bid for bid, checksum in message.get("sums", ())
+            if bid in self.boards and self.boards[bid].checksum() != checksum]
+
+    def advance(self, tick: int):
+        """Update the boards up to tick, as the room did without inputs."""
+        while self.tick < tick:
+            for board in self.boards.values():
+                board.update(self._dt)
+            self.tick += 1
@@ -0,0 +1,127 @@
+# Cheap in-process counters and latency histograms for the stats endpoint
+from bisect import bisect_left
+from threading import Lock
+
+
+class Histogram:
+    """Latency histogram with fixed, roughly logarithmic buckets.
+    Recording is a binary search and an increment, so it is cheap enough
+    to do on every tick.
+    """
+
+    # Upper bounds of each bucket in seconds, the last bucket is unbounded
+    BOUNDS = tuple(b / 1e6 for b in (50, 100, 250, 500, 1000, 2000, 4000,
+        8000, 16000, 33000, 66000, 125000, 250000, 500000, 1000000,
+        2000000))
+
+    def __init__(self):
+        self._counts = [0] * (len(Histogram.BOUNDS) + 1)
+        self._total = 0
+        self._sum = 0
+        self._max = 0
+
+    @classmethod
+    def from_buckets(cls, buckets: list, maximum: float = 0):
+        """Rebuild a histogram from the "buckets" of to_dict, e.g. to diff
+        /stats fetched at two times (see percentile).
+        maximum - Longest duration recorded, in seconds.
+        """
+        if len(buckets) != len(Histogram.BOUNDS) + 1:
+            raise ValueError("Expected {} buckets".format(
+                len(Histogram.BOUNDS) + 1))
+        hist = cls()
+        hist._counts = list(buckets)
+        hist._total = sum(buckets)
+        hist._max = maximum
+        return hist
+
+    def record(self, seconds: float):
+        """Record a duration."""
+        self._counts[bisect_left(Histogram.BOUNDS, seconds)] += 1
+        self._total += 1
+        self._sum += seconds
+        if seconds > self._max:
+            self._max = seconds
+
+    def get_count(self) -> int:
+        """Get the number of recorded durations."""
+        return self._total
+
+    def get_sum(self) -> float:
+        """Get the sum of the recorded durations."""
+        return self._sum
+
+    def snapshot(self) -> tuple:
+        """Get the bucket counts so far, see percentile."""
+        return tuple(self._counts)
+
+    def percentile(self, p: float, since: tuple = None) -> float:
+        """Get the upper bound of the bucket holding the p-th percentile
+        (0 < p <= 100). Returns 0 if nothing was recorded.
+        since - Only count durations recorded after this snapshot().
+        """
+        counts = self._counts
+        if since is not None:
+            counts = [now - then for now, then in zip(counts, since)]
+        total = sum(counts)
+        if total < 1:
+            return 0
+        rank = total * p / 100
+        seen = 0
+        for i, count in enumerate(counts):
+            seen += count
+            if seen >= rank and count > 0:
+                return Histogram.BOUNDS[i] if i < len(Histogram.BOUNDS) \
+                    else self._max
+        return self._max
+
+    def to_dict(self) -> dict:
+        """Get a summary of the histogram, durations in milliseconds."""
+        return {
+            "count": self._total,
+            "mean": self._sum / self._total * 1000 if self._total else 0,
+            "p50": self.percentile(50) * 1000,
+            "p99": self.percentile(99) * 1000,
+            "max": self._max * 1000,
+            "buckets": list(self._counts)
+        }
+
+
+class Metrics:
+    """Named counters and histograms.
+    Counter increments and histogram records are unlocked; under the GIL
+    a rare lost increment is acceptable for statistics.
+    """
+
+    def __init__(self):
+        self._counters = {}
+        self._histograms = {}
+        self._lock = Lock() # Only guards creation
+
+    def count(self, name: str, n: int = 1):
+        """Add n to a counter."""
+        try:
+            self._counters[name] += n
+        except KeyError:
+            with self._lock:
+                self._counters[name] = self._counters.get(name, 0) + n
+
+    def get_count(self, name: str) -> int:
+        """Get the value of a counter, 0 if it was never counted."""
+        return self._counters.get(name, 0)
+
+    def histogram(self, name: str) -> Histogram:
+        """Get a histogram, created on first use."""
+        hist = self._histograms.get(name)
+        if hist is None:
+            with self._lock:
+                hist = self._histograms.setdefault(name, Histogram())
+        return hist
+
+    def to_dict(self) -> dict:
+        """Get every counter and histogram summary."""
+        return {
+            "counters": dict(self._counters),
+            "histograms": {name: hist.to_dict() for name, hist in
+                list(self._histograms.items())}
+        }
@@ -0,0 +1,181 @@
+# Output stage: sender workers that emit room frames off the game threads
+from queue import Queue, Empty, Full
+
+from server.stream import FrameStream
+
+
+class Batch(dict):
+    """Room to its newest frame, taken off a queue at once. Messages posted
+    meanwhile are kept in order, as [room, event, message], in messages.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.messages = []
+
+
+class OutputStage:
+    """Bounded queues of (room, frame) drained by sender workers.
+    Rooms push frames without blocking; a full queue drops the frame
+    instead of stalling the game tick. Each room always maps to the same
+    worker, so its frames are sent in order. A worker batches everything
+    queued, keeps only the newest frame per room (older ones are stale) and
+    encodes each frame once, as a delta or keyframe (see FrameStream), for
+    every viewer of the room. Other events of a room are posted to the same
+    queue, and sent in order rather than superseded (see post).
+    """
+
+    def __init__(self, emit, workers: int = 1, size: int = 256,
+        batch: int = 64, keyframe_interval: int = 60, on_sent=None,
+        emit_message=None):
+        """
+        emit - Callable(room, payload) that sends an encoded frame.
+        workers - Number of sender workers (and queues).
+        size - Maximum queued frames and messages per worker.
+        batch - Maximum frames and messages taken off a queue per batch.
+        keyframe_interval - Frames sent to a room between keyframes.
+        on_sent - Optional callable(room, frame) run after each emit.
+        emit_message - Callable(room, event, message) that sends a posted
+            message, needed to post.
+        """
+        if workers < 1 or size < 1 or batch < 1:
+            raise ValueError("workers, size and batch must be > 0")
+        self._emit = emit
+        self._emit_message = emit_message
+        self._on_sent = on_sent
+        self._queues = [Queue(size) for _ in range(workers)]
+        self._size = size
+        self._batch = batch
+        self._keyframe_interval = keyframe_interval
+        self._streams = {} # Room to FrameStream, owned by the room's worker
+        self.sent = 0 # Frames emitted
+        self.dropped = 0 # Frames dropped on a full queue
+        self.stale = 0 # Frames superseded before being sent
+
+    def get_workers(self) -> int:
+        """Get the number of sender workers."""
+        return len(self._queues)
+
+    def _queue_for(self, room: str) -> Queue:
+        return self._queues[hash(room) % len(self._queues)]
+
+    def push(self, room: str, frame) -> bool:
+        """Queue a frame for a room without blocking.
+        Returns False if the frame was dropped because the queue is full.
+        """
+        try:
+            self._queue_for(room).put_nowait((room, frame))
+            return True
+        except Full:
+            self.dropped += 1
+            return False
+
+    def post(self, room: str, event: str, message, merge=None) -> bool:
+        """Queue an event for a room without blocking. Posted messages are
+        sent in order with the room's frames, and never dropped as stale.
+        merge - Optional callable(older, newer) that combines the message
+            with one of the same event still queued for the room, e.g. for
+            messages that only carry what changed.
+        Returns False if the message was dropped because the queue is full.
+        """
+        try:
+            self._queue_for(room).put_nowait((room, event, message, merge))
+            return True
+        except Full:
+            self.dropped += 1
+            return False
+
+    def close(self, room: str) -> bool:
+        """Forget a room's stream once its queued frames have been sent.
+        Doesn't block either, so a stuck sender can't stall the caller.
+        Returns False if the queue is full; the stream is then kept.
+        """
+        try:
+            self._queue_for(room).put_nowait((room, None))
+            return True
+        except Full:
+            self.dropped += 1
+            return False
+
+    def keyframe(self, room: str) -> str:
+        """Get the keyframe of the last frame sent to a room, if any."""
+        stream = self._streams.get(room)
+        return stream.keyframe() if stream is not None else None
+
+    def pressure(self, room: str) -> float:
+        """Get how full the room's queue is, from 0 to 1."""
+        return self._queue_for(room).qsize() / self._size
+
+    def depth(self) -> int:
+        """Get the total number of queued frames."""
+        return sum(q.qsize() for q in self._queues)
+
+    def stop(self):
+        """Ask every worker to stop after what is already queued."""
+        for q in self._queues:
+            q.put(None)
+
+    def take(self, index: int, block: bool = True) -> Batch:
+        """Take a batch from worker index's queue.
+        Returns a Batch of room to its newest frame, or None if the worker
+        was asked to stop. A frame of None means the room is closed.
+        """
+        q = self._queues[index]
+        latest = Batch()
+        try:
+            item = q.get(block)
+        except Empty:
+            return latest
+        if item is None:
+            return None
+        messages = latest.messages
+        merges = {} # (room, event) to index in messages, see post
+        while True:
+            if len(item) == 2:
+                room, frame = item
+                if room in latest:
+                    self.stale += 1
+                latest[room] = frame
+            else:
+                room, event, message, merge = item
+                i = merges.get((room, event))
+                if merge is not None and i is not None:
+                    messages[i][2] = merge(messages[i][2], message)
+                else:
+                    merges[room, event] = len(messages)
+                    messages.append([room, event, message])
+            if len(latest) + len(messages) >= self._batch:
+                break
+            try:
+                item = q.get_nowait()
+            except Empty:
+                break
+            if item is None: # Stop after this batch
+                q.put(None)
+                break
+        return latest
+
+    def send(self, batch: Batch):
+        """Emit the messages of a batch, then encode and emit each frame."""
+        for room, event, message in batch.messages:
+            self._emit_message(room, event, message)
+        for room, frame in batch.items():
+            if frame is None:
+                self._streams.pop(room, None)
+                continue
+            stream = self._streams.get(room)
+            if stream is None:
+                stream = FrameStream(self._keyframe_interval)
+                self._streams[room] = stream
+            self._emit(room, stream.encode(frame))
+            self.sent += 1
+            if self._on_sent is not None:
+                self._on_sent(room, frame)
+
+    def worker(self, index: int):
+        """Sender worker loop for queue index, runs until stop()."""
+        while True:
+            batch = self.take(index)
+            if batch is None:
+                break
+            self.send(batch)
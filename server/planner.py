@@ -0,0 +1,89 @@
+# Process pool that runs bot placement searches off the game threads
+from concurrent.futures import ProcessPoolExecutor, CancelledError
+from multiprocessing import get_context
+from time import perf_counter
+
+from game.bot import Planner, Snapshot
+
+
+_planner = None # Planner of a worker process
+
+
+def _init(block_data: dict, lookahead: bool):
+    """Worker process initializer."""
+    global _planner
+    _planner = Planner(block_data, lookahead)
+
+
+def _plan(snapshot: Snapshot) -> list:
+    """Worker process task."""
+    return _planner.plan(snapshot)
+
+
+class PlanRequest:
+    """A pending placement search with a deadline."""
+
+    def __init__(self, future, deadline: float):
+        """
+        future - Future of the search.
+        deadline - perf_counter time after which the plan is not wanted.
+        """
+        self._future = future
+        self._deadline = deadline
+
+    def done(self) -> bool:
+        """Check if the search has finished (or was cancelled)."""
+        return self._future.done()
+
+    def expired(self, now: float = None) -> bool:
+        """Check if the deadline has passed."""
+        return (perf_counter() if now is None else now) > self._deadline
+
+    def cancel(self):
+        """Cancel the search if it hasn't started yet; its result is
+        ignored either way.
+        """
+        self._future.cancel()
+
+    def result(self) -> list:
+        """Get the planned inputs.
+        Returns None if the search is unfinished, failed, was cancelled,
+        or finished after the deadline.
+        """
+        if not self._future.done() or self.expired():
+            return None
+        try:
+            return self._future.result(0)
+        except CancelledError:
+            return None
+        except Exception:
+            return None
+
+
+class PlannerPool:
+    """Worker processes that search bot placements from Snapshots.
+    Searches run outside the GIL of the game threads, so rooms full of bots
+    scale with cores instead of stalling every other room.
+    """
+
+    def __init__(self, block_data: dict, workers: int = None,
+        lookahead: bool = True):
+        """
+        block_data - Block grids, sent once to each worker.
+        workers - Number of worker processes, None for one per core.
+        lookahead - Search the next block's placement too.
+        """
+        self._executor = ProcessPoolExecutor(workers,
+            mp_context=get_context("spawn"), initializer=_init,
+            initargs=(block_data, lookahead))
+
+    def submit(self, snapshot: Snapshot, timeout: float) -> PlanRequest:
+        """Start searching a snapshot, the plan is wanted within timeout
+        seconds.
+        """
+        return PlanRequest(self._executor.submit(_plan, snapshot),
+            perf_counter() + timeout)
+
+    def shutdown(self):
+        """Stop the workers, cancelling pending searches."""
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,52 @@
+# Objects made ahead of time, so taking one doesn't wait on making it
+from collections import deque
+
+
+class Pool:
+    """Objects made ahead of time, e.g. idle rooms.
+    take() pops one in O(1) and fill(), called by a background worker,
+    makes replacements. An empty pool makes the object on the spot. Pops
+    and appends of the deque are atomic, so no lock is needed.
+    """
+
+    def __init__(self, make, size: int):
+        """
+        make - Callable that makes a new object.
+        size - Objects to keep ready.
+        """
+        if size < 0:
+            raise ValueError("size must be >= 0")
+        self._make = make
+        self._size = size
+        self._items = deque()
+        self.taken = 0 # Objects taken
+        self.misses = 0 # Objects made on the spot, the pool being empty
+
+    def take(self):
+        """Take a ready object, or make one if there are none."""
+        self.taken += 1
+        try:
+            return self._items.popleft()
+        except IndexError:
+            self.misses += 1
+            return self._make()
+
+    def put(self, item):
+        """Give back a taken object that wasn't used, it is taken next."""
+        self._items.appendleft(item)
+
+    def fill(self) -> int:
+        """Make objects until size are ready. Returns how many were made."""
+        made = 0
+        while len(self._items) < self._size:
+            self._items.append(self._make())
+            made += 1
+        return made
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def to_dict(self) -> dict:
+        """Get pool statistics, for the stats endpoint."""
+        return {"ready": len(self._items), "taken": self.taken,
+            "misses": self.misses}
@@ -0,0 +1,59 @@
+# Compact binary controller input protocol
+from struct import Struct
+
+from game.board import INPUTS, OPCODES, TAP, RELEASE
+
+
+# Command byte is the input opcode (see Board.perform) in the low 6 bits,
+# and the input event in the high 2 bits
+COMMANDS = INPUTS
+CODES = OPCODES
+EVENT_SHIFT = 6
+OPCODE_MASK = (1 << EVENT_SHIFT) - 1
+
+# command (uint8), seq (uint16), [client time (float64, ms since epoch)]
+_SHORT = Struct(">BH")
+_LONG = Struct(">BHd")
+
+
+def encode_input(command: str, seq: int, client_time: float = None,
+    event: int = TAP) -> bytes:
+    """Encode an input message.
+    command - Input command name, see COMMANDS.
+    seq - Sequence number, wraps at 2^16.
+    client_time - Optional client timestamp in milliseconds.
+    event - TAP, PRESS or RELEASE (see Board.perform).
+    """
+    code = CODES[command] | event << EVENT_SHIFT
+    if client_time is None:
+        return _SHORT.pack(code, seq & 0xFFFF)
+    return _LONG.pack(code, seq & 0xFFFF, client_time)
+
+
+def is_release(data) -> bool:
+    """Check if an input message, binary or JSON text, may be a release
+    without decoding it, so releases can skip rate limits. Text messages
+    are only guessed, check the event once decoded.
+    """
+    if isinstance(data, bytes):
+        return len(data) > 0 and data[0] >> EVENT_SHIFT == RELEASE
+    return isinstance(data, str) and '"release"' in data
+
+
+def decode_input(data: bytes) -> tuple:
+    """Decode an input message.
+    Returns a tuple of input opcode, event, seq and client time (None if
+    not sent), or None if the message is malformed.
+    """
+    size = len(data)
+    if size == _SHORT.size:
+        code, seq = _SHORT.unpack(data)
+        client_time = None
+    elif size == _LONG.size:
+        code, seq, client_time = _LONG.unpack(data)
+    else:
+        return None
+    op, event = code & OPCODE_MASK, code >> EVENT_SHIFT
+    if op >= len(COMMANDS) or event > RELEASE:
+        return None
+    return op, event, seq, client_time
@@ -0,0 +1,307 @@
+# Room registry and room message bus, shared by server nodes
+from json import dumps, loads
+from threading import Event, Lock, Thread
+from time import perf_counter
+from uuid import uuid4
+
+
+class LocalRegistry:
+    """Registry of a single server node; every room is local.
+    Rooms are run by the node that claimed them. Other nodes reach a room
+    with send() and call(), which the owner handles with the handler given
+    to start(). Room checkpoints are stored so any node can resume them.
+    """
+
+    def __init__(self):
+        self.node = "local"
+        self._owned = set()
+        self._checkpoints = {}
+        self._handler = None
+
+    def claim(self, room: str) -> bool:
+        """Claim a room for this node. Returns False if it has an owner."""
+        if room in self._owned:
+            return False
+        self._owned.add(room)
+        return True
+
+    def release(self, room: str):
+        """Release a room claimed by this node."""
+        self._owned.discard(room)
+
+    def renew(self, rooms: list):
+        """Keep the claims of running rooms from expiring."""
+
+    def owner(self, room: str) -> str:
+        """Get the node that owns a room, None if no node does."""
+        return self.node if room in self._owned else None
+
+    def start(self, handler):
+        """Start handling messages for rooms of this node.
+        handler - Function of kind, room and args list, returning the
+            result of a call (must be JSON serializable).
+        """
+        self._handler = handler
+
+    def stop(self):
+        """Stop handling messages."""
+        self._handler = None
+
+    def send(self, room: str, kind: str, args: list) -> bool:
+        """Send a message to the owner of a room, without waiting.
+        Returns False if the room has no owner.
+        """
+        handler = self._handler
+        if handler is None or room not in self._owned:
+            return False
+        handler(kind, room, args)
+        return True
+
+    def call(self, room: str, kind: str, args: list,
+        timeout: float = 1) -> object:
+        """Send a message to the owner of a room and wait for its result.
+        Returns None if the room has no owner or it didn't reply in time.
+        """
+        handler = self._handler
+        if handler is None or room not in self._owned:
+            return None
+        return handler(kind, room, args)
+
+    def set_checkpoint(self, room: str, data: bytes):
+        """Store the latest snapshot of a room."""
+        self._checkpoints[room] = data
+
+    def get_checkpoint(self, room: str) -> bytes:
+        """Get the latest snapshot of a room, None if there is none."""
+        return self._checkpoints.get(room)
+
+    def drop_checkpoint(self, room: str):
+        """Delete the snapshot of a room."""
+        self._checkpoints.pop(room, None)
+
+
+class RedisRegistry(LocalRegistry):
+    """Registry shared by server nodes through Redis.
+    Room claims are keys that expire unless renewed, so the rooms of a node
+    that dies can be resumed elsewhere. Each node listens on its own pub/sub
+    channel for room messages and replies.
+    """
+
+    def __init__(self, client, node: str = None, ttl: int = 30,
+        checkpoint_ttl: int = 360, cache: float = 1, prefix: str = "tetris:"):
+        """
+        client - Redis client (redis.Redis or compatible).
+        node - Unique ID of this node, None for a random one.
+        ttl - Seconds until an unrenewed room claim expires.
+        checkpoint_ttl - Seconds a room checkpoint is kept.
+        cache - Seconds to remember the owner of a room.
+        prefix - Prefix of every key and channel.
+        """
+        super().__init__()
+        self.node = node if node is not None else uuid4().hex[:12]
+        self._client = client
+        self._ttl = ttl
+        self._checkpoint_ttl = checkpoint_ttl
+        self._cache = cache
+        self._prefix = prefix
+        self._owners = {} # Room to (owner, perf_counter time looked up)
+        self._pending = {} # Call ID to [Event, result]
+        self._lock = Lock()
+        self._pubsub = None
+        self._thread = None
+
+    @classmethod
+    def from_url(cls, url: str, **kwargs):
+        """Connect to the Redis server at url."""
+        import redis
+        return cls(redis.Redis.from_url(url), **kwargs)
+
+    def _key(self, kind: str, room: str) -> str:
+        return "{}{}:{}".format(self._prefix, kind, room)
+
+    def _channel(self, node: str) -> str:
+        return "{}node:{}".format(self._prefix, node)
+
+    def claim(self, room: str) -> bool:
+        if not self._client.set(self._key("room", room), self.node, nx=True,
+            ex=self._ttl):
+            return False
+        self._owned.add(room)
+        return True
+
+    def release(self, room: str):
+        if room not in self._owned:
+            return
+        self._owned.discard(room)
+        key = self._key("room", room)
+        if self.owner(room, False) == self.node:
+            self._client.delete(key)
+
+    def renew(self, rooms: list):
+        pipe = self._client.pipeline()
+        for room in rooms:
+            pipe.expire(self._key("room", room), self._ttl)
+        pipe.execute()
+
+    def owner(self, room: str, cached: bool = True) -> str:
+        """Get the node that owns a room, None if no node does.
+        cached - Allow an owner looked up less than cache seconds ago.
+        """
+        now = perf_counter()
+        if cached:
+            found = self._owners.get(room)
+            if found is not None and now - found[1] < self._cache:
+                return found[0]
+        node = self._client.get(self._key("room", room))
+        if node is None:
+            self._owners.pop(room, None)
+            return None
+        node = node.decode() if isinstance(node, bytes) else node
+        self._owners[room] = node, now
+        return node
+
+    def start(self, handler):
+        self._handler = handler
+        self._pubsub = self._client.pubsub(ignore_subscribe_messages=True)
+        self._pubsub.subscribe(self._channel(self.node))
+        self._thread = Thread(target=self._listen, name="registry",
+            daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._handler = None
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self._pubsub is not None:
+            self._pubsub.close()
+            self._pubsub = None
+
+    def _listen(self):
+        """Handle messages sent to this node until stopped."""
+        while self._handler is not None:
+            message = self._pubsub.get_message(timeout=0.5)
+            if message is None or message.get("type") != "message":
+                continue
+            try:
+                self._receive(loads(message["data"]))
+            except Exception:
+                pass # A bad message shouldn't stop the node
+
+    def _receive(self, message: dict):
+        """Handle a room message or a reply to one of our calls."""
+        if message["kind"] == "reply":
+            with self._lock:
+                waiting = self._pending.get(message["id"])
+            if waiting is not None:
+                waiting[1] = message["result"]
+                waiting[0].set()
+            return
+        handler = self._handler
+        if handler is None:
+            return
+        result = handler(message["kind"], message["room"], message["args"])
+        if message.get("id") is not None:
+            self._client.publish(self._channel(message["reply"]), dumps({
+                "kind": "reply", "id": message["id"], "result": result}))
+
+    def _publish(self, room: str, message: dict) -> bool:
+        node = self.owner(room)
+        if node is None:
+            return False
+        self._client.publish(self._channel(node), dumps(message))
+        return True
+
+    def send(self, room: str, kind: str, args: list) -> bool:
+        return self._publish(room, {"kind": kind, "room": room,
+            "args": args})
+
+    def call(self, room: str, kind: str, args: list,
+        timeout: float = 1) -> object:
+        call_id = uuid4().hex
+        waiting = [Event(), None]
+        with self._lock:
+            self._pending[call_id] = waiting
+        try:
+            if not self._publish(room, {"kind": kind, "room": room,
+                "args": args, "id": call_id, "reply": self.node}):
+                return None
+            waiting[0].wait(timeout)
+            return waiting[1]
+        finally:
+            with self._lock:
+                del self._pending[call_id]
+
+    def set_checkpoint(self, room: str, data: bytes):
+        self._client.set(self._key("checkpoint", room), data,
+            ex=self._checkpoint_ttl)
+
+    def get_checkpoint(self, room: str) -> bytes:
+        return self._client.get(self._key("checkpoint", room))
+
+    def drop_checkpoint(self, room: str):
+        self._client.delete(self._key("checkpoint", room))
+
+
+class CheckpointWriter:
+    """Writes room checkpoints to a registry off the game threads, so a
+    registry round trip never stalls a tick. Only the newest snapshot of a
+    room is kept until written; writes and drops of a room are done in the
+    order they were asked for.
+    """
+
+    def __init__(self, registry):
+        """
+        registry - LocalRegistry or RedisRegistry to write to.
+        """
+        self._registry = registry
+        self._pending = {} # Room to snapshot, None to drop its checkpoint
+        self._writing = {} # Pending taken by flush, until written
+        self._lock = Lock()
+        self._ready = Event() # Set when something is pending
+        self.written = 0
+        self.failed = 0
+
+    def set(self, room: str, data: bytes):
+        """Store the latest snapshot of a room, see set_checkpoint."""
+        with self._lock:
+            self._pending[room] = data
+        self._ready.set()
+
+    def drop(self, room: str):
+        """Delete the snapshot of a room, see drop_checkpoint."""
+        with self._lock:
+            self._pending[room] = None
+        self._ready.set()
+
+    def get(self, room: str) -> bytes:
+        """Get the latest snapshot of a room, written or not."""
+        with self._lock:
+            for pending in (self._pending, self._writing):
+                if room in pending:
+                    return pending[room]
+        return self._registry.get_checkpoint(room)
+
+    def flush(self):
+        """Write everything pending."""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._writing = pending
+            self._ready.clear()
+        for room, data in pending.items():
+            try:
+                if data is None:
+                    self._registry.drop_checkpoint(room)
+                else:
+                    self._registry.set_checkpoint(room, data)
+                self.written += 1
+            except Exception:
+                self.failed += 1 # Kept by the next checkpoint of the room
+        with self._lock:
+            self._writing = {}
+
+    def worker(self):
+        """Writer loop, runs forever."""
+        while True:
+            self._ready.wait()
+            self.flush()
@@ -0,0 +1,32 @@
+# Versioned, compressed room snapshots for migration and crash recovery
+from json import dumps, loads
+import zlib
+
+
+VERSION = 5 # Bump when the state layout changes
+
+
+class SnapshotError(ValueError):
+    """Raised for snapshots that are corrupt or of another version."""
+
+
+def dump(state: dict) -> bytes:
+    """Encode a room state as a snapshot.
+    state - JSON serializable room state (see GameThread.snapshot).
+    """
+    body = dumps(state, separators=(",", ":")).encode()
+    return bytes([VERSION]) + zlib.compress(body, 1)
+
+
+def load(data: bytes) -> dict:
+    """Decode a snapshot made by dump.
+    Raises SnapshotError if it can't be restored by this version.
+    """
+    if len(data) < 1:
+        raise SnapshotError("Empty snapshot")
+    if data[0] != VERSION:
+        raise SnapshotError("Unsupported snapshot version {}".format(data[0]))
+    try:
+        return loads(zlib.decompress(data[1:]))
+    except (zlib.error, ValueError) as err:
+        raise SnapshotError("Corrupt snapshot") from err
@@ -0,0 +1,40 @@
+# Keyframe/delta encoding of a room's frames, shared by all its viewers
+from json import dumps
+
+
+class FrameStream:
+    """Encodes the frames sent to a room exactly once for every viewer.
+    Most frames are sent as deltas from the previous frame sent, with a
+    full keyframe every keyframe_interval frames. Viewers that join late
+    are sent keyframe() directly and apply deltas from then on.
+    Only the room's sender worker should call encode().
+    """
+
+    def __init__(self, keyframe_interval: int = 60):
+        """
+        keyframe_interval - Frames sent between keyframes.
+        """
+        if keyframe_interval < 1:
+            raise ValueError("keyframe_interval must be > 0")
+        self._interval = keyframe_interval
+        self._last = None # Last frame sent
+        self._since_key = 0 # Frames sent since the last keyframe
+
+    def encode(self, frame) -> str:
+        """Encode the next frame sent to the room as a delta or keyframe."""
+        delta = None
+        if self._since_key < self._interval:
+            delta = frame.delta(self._last)
+        self._last = frame
+        if delta is None:
+            self._since_key = 0
+            return frame.encode()
+        self._since_key += 1
+        return dumps(delta, separators=(",", ":"))
+
+    def keyframe(self) -> str:
+        """Get the keyframe of the last frame sent, None if none were sent.
+        Safe to call from any thread.
+        """
+        last = self._last
+        return last.encode() if last is not None else None
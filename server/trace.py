@@ -0,0 +1,139 @@
+# Sampled input-to-display latency tracing
+from threading import Lock
+import time
+
+from server.metrics import Histogram, Metrics
+
+
+class Trace:
+    """Timestamps (perf_counter seconds) of one input through the server."""
+
+    __slots__ = ("room", "seq", "uplink", "received", "applied", "frame",
+        "published", "emitted")
+
+    def __init__(self, room: str, seq: int = None, uplink: float = None):
+        """
+        room - Room ID the input was sent to.
+        seq - Client input sequence number, if sent.
+        uplink - Seconds from the client timestamp to receipt, if sent.
+            Includes any clock difference between client and server.
+        """
+        self.room = room
+        self.seq = seq
+        self.uplink = uplink
+        self.received = time.perf_counter()
+        self.applied = None
+        self.frame = None # Seq of the first frame showing the input
+        self.published = None
+        self.emitted = None
+
+
+class LatencyTracer:
+    """Follows a sample of inputs from receipt to the host's display.
+    Every n-th input gets a Trace, stamped when it is applied to its board,
+    published in a frame, and emitted to the room. After emitting a traced
+    frame, the server sends the room "trace" with the frame seq and the
+    host echoes it back with "ack", closing the path. Stage latencies go
+    to metrics ("trace_queue", "trace_tick", "trace_output",
+    "trace_return", "trace_total", "trace_uplink"), and the total per room
+    to room histograms.
+    """
+
+    def __init__(self, metrics: Metrics, every: int = 16, limit: int = 64):
+        """
+        metrics - Metrics to record stage latencies in.
+        every - Trace one of every n inputs, 0 to disable.
+        limit - Maximum unfinished traces kept per room.
+        """
+        self._metrics = metrics
+        self._every = every
+        self._limit = limit
+        self._count = 0
+        self._pending = {} # Room to published traces waiting on an ack
+        self._rooms = {} # Room to Histogram of total latency
+        self._lock = Lock()
+
+    def sample(self, room: str, seq: int = None,
+        client_time: float = None) -> Trace:
+        """Maybe start tracing an input that was just received.
+        client_time - Client timestamp, milliseconds since the epoch.
+        Returns a Trace for sampled inputs, None otherwise.
+        """
+        if self._every < 1:
+            return None
+        self._count += 1
+        if self._count % self._every != 0:
+            return None
+        uplink = None
+        if isinstance(client_time, (int, float)):
+            uplink = time.time() - client_time / 1000
+        return Trace(room, seq, uplink)
+
+    def applied(self, trace: Trace):
+        """Stamp an input as applied to its board."""
+        trace.applied = time.perf_counter()
+
+    def published(self, traces: list, frame_seq: int):
+        """Stamp applied inputs as published in frame frame_seq."""
+        now = time.perf_counter()
+        with self._lock:
+            for trace in traces:
+                trace.frame = frame_seq
+                trace.published = now
+                pending = self._pending.setdefault(trace.room, [])
+                if len(pending) >= self._limit:
+                    pending.pop(0)
+                pending.append(trace)
+
+    def emitted(self, room: str, frame_seq: int) -> bool:
+        """Stamp inputs shown by frame frame_seq, just sent to a room.
+        Returns True if any traced input was in it (the host should be
+        asked to ack the frame).
+        """
+        now = time.perf_counter()
+        found = False
+        with self._lock:
+            for trace in self._pending.get(room, ()):
+                if trace.emitted is None and trace.frame <= frame_seq:
+                    trace.emitted = now
+                    found = True
+        return found
+
+    def acked(self, room: str, frame_seq: int):
+        """Finish the traces of inputs shown by a frame the host acked."""
+        now = time.perf_counter()
+        with self._lock:
+            pending = self._pending.get(room)
+            if not pending:
+                return
+            done = [t for t in pending if t.emitted is not None and
+                t.frame <= frame_seq]
+            if len(done) < 1:
+                return
+            self._pending[room] = [t for t in pending if t not in done]
+            hist = self._rooms.setdefault(room, Histogram())
+            for trace in done:
+                self._finish(trace, now, hist)
+
+    def _finish(self, trace: Trace, acked: float, hist: Histogram):
+        m = self._metrics
+        m.histogram("trace_queue").record(trace.applied - trace.received)
+        m.histogram("trace_tick").record(trace.published - trace.applied)
+        m.histogram("trace_output").record(trace.emitted - trace.published)
+        m.histogram("trace_return").record(acked - trace.emitted)
+        m.histogram("trace_total").record(acked - trace.received)
+        if trace.uplink is not None:
+            m.histogram("trace_uplink").record(max(0, trace.uplink))
+        hist.record(acked - trace.received)
+
+    def close(self, room: str):
+        """Forget a room's unfinished traces and histogram."""
+        with self._lock:
+            self._pending.pop(room, None)
+            self._rooms.pop(room, None)
+
+    def to_dict(self) -> dict:
+        """Get the total latency summary of each room."""
+        with self._lock:
+            return {room: hist.to_dict() for room, hist in
+                self._rooms.items()}
@@ -5,9 +5,19 @@ const socket = io()
 // TODO: Consistent naming conventions
 let roomid = "" // ID of the game room
 let boardid = "" // ID of the board to control
+let seatToken = "" // Secret to take our seat back after reconnecting
 let name = "" // Server-given name
 let joinMessage = "" // Returned message from join attempt
 let joinState = false // Returned status from join attempt
+let inputSeq = 0 // Sequence number of the next input sent
+// Input command byte, index must match server/protocol.py COMMANDS
+const COMMANDS = ["left", "right", "soft_drop", "hard_drop", "rotate_ccw",
+    "rotate_cw", "hold", "pause", "rotate_180"]
+// Input events, sent in the top 2 bits of the command byte. Held inputs are
+// repeated by the server until released.
+const TAP = 0
+const PRESS = 1
+const RELEASE = 2
 
 // TODO: delete this mess
 class GlobalState {
@@ -21,6 +31,18 @@ const introRoot = e(Intro, {"title":"Block Party", "state":globalState}, null)
 const waitRoot = e(PlayerName, {"state":globalState}, null)
 const playRoot = e(Controller, {"state":globalState}, null)
 
+socket.on("connect", () => {
+    // Reconnected: reclaim our board, which the server keeps for a while
+    if (roomid && seatToken) {
+        const data = {"room": roomid, "token": seatToken}
+        socket.emit("join", JSON.stringify(data), (success, message, bid) => {
+            if (success) {
+                boardid = bid
+            }
+        })
+    }
+})
+
 socket.on("start game", (data) => {
     globalState.value = "play"
 })
@@ -28,12 +50,13 @@ socket.on("start game", (data) => {
 /**
  * Join acknowledgement function.
  */
-function joinAck(success, message, bid) {
+function joinAck(success, message, bid, token) {
     console.log(success)
     console.log(message)
     joinState = success
     if (success) {
         boardid = bid
+        seatToken = token
         console.log(bid)
         name = message
         globalState.value = "wait"
@@ -44,17 +67,16 @@ function joinAck(success, message, bid) {
 }
 
 /**
- * Send user input to server.
+ * Send user input to server, as command byte, uint16 sequence number and
+ * float64 timestamp. The room is the one joined with this socket.
  */
-function sendInput(command) {
+function sendInput(command, event = TAP) {
     if (socket) {
-        ou = JSON.stringify({
-            room: roomid,
-            bid: boardid,
-            command: command
-        })
-        console.log(ou)
-        socket.emit("input", ou)
+        const view = new DataView(new ArrayBuffer(11))
+        view.setUint8(0, COMMANDS.indexOf(command) | (event << 6))
+        view.setUint16(1, inputSeq++ & 0xFFFF)
+        view.setFloat64(3, Date.now())
+        socket.emit("input", view.buffer)
     }
 }
 
@@ -105,11 +127,30 @@ function PlayerName({ state }) {
             e("h1", {"className":"display-3"}, `You are ${name}`))
 }
 
-function ControllerBtn({ name, display, className }) {
+function ControllerBtn({ name, display, className, repeat }) {
+    const held = React.useRef(false)
+    const press = (ev) => {
+        ev.preventDefault()
+        held.current = true
+        sendInput(name, PRESS)
+    }
+    const release = () => {
+        if (held.current) {
+            held.current = false
+            sendInput(name, RELEASE)
+        }
+    }
+    // Held buttons are pressed and released, others are tapped
+    const handlers = repeat ? {
+        "onPointerDown": press,
+        "onPointerUp": release,
+        "onPointerLeave": release,
+        "onPointerCancel": release
+    } : {"onClick": () => sendInput(name)}
     return (e("button",
         {
             "className": "bt " + (className || `bt-${name}`),
-            "onClick": () => sendInput(name)
+            ...handlers
         },
         display
     ))
@@ -118,13 +159,14 @@ function ControllerBtn({ name, display, className }) {
 function Controller({ state }) {
     return state.value ? (
         e("div", {"className":"bt-grid-container"}, 
-            e(ControllerBtn, {"name":"left", "display":"Left"}),
-            e(ControllerBtn, {"name":"right", "display":"Right"}),
-            e(ControllerBtn, {"name":"soft_drop", "display":"Down", "className":"bt-soft"}),
+            e(ControllerBtn, {"name":"left", "display":"Left", "repeat":true}),
+            e(ControllerBtn, {"name":"right", "display":"Right", "repeat":true}),
+            e(ControllerBtn, {"name":"soft_drop", "display":"Down", "className":"bt-soft", "repeat":true}),
             e(ControllerBtn, {"name":"hard_drop", "display":"Drop", "className": "bt-hard"}),
             e(ControllerBtn, {"name":"rotate_cw", "display":"A", "className":"bt-a"}),
             e(ControllerBtn, {"name":"rotate_ccw", "display":"B", "className":"bt-b"}),
             e(ControllerBtn, {"name":"hold", "display":"Hold"}),
+            e(ControllerBtn, {"name":"pause", "display":"Pause"}),
         )
     ) : null
 }
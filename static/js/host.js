@@ -13,54 +13,177 @@ const gameSound = new Howl({
 })
 const socket = io("/host")
 
-const WIDTH = two.height / 20 // Wontfix
-let fields = [
-    new field(WIDTH, WIDTH, WIDTH),
-    new field(WIDTH * 10 + WIDTH, WIDTH, WIDTH)
-] // Fields to be drawn; for now just 2
+const DEFAULT_FIELD = { // Field config until the server sends its own
+    "color": [ "rgb(137, 226, 136)" ],
+    "stroke_color": [ "rgb(95, 165, 94)" ],
+    "stroke_width": 5,
+    "grid_lines": true,
+    "lines_color": "rgb(52, 150, 51)",
+    "grid_stroke": "1",
+    "background_color": "rgb(171, 209, 115)"
+}
+
+let fields = layoutFields(10, 20) // Fields to be drawn; for now just 2
 
 let roomId = ""
+let hostKey = "" // Secret to be the host again after reconnecting
+let frameSeq = -1 // Sequence number of the frame currently shown
+let grids = [] // Current grid of each board, in frame order
+let awaitingKey = false // Asked the server for a keyframe?
+let huds = {} // HUD values of each board by board ID, in board order
+let hudTitles = { // Panel titles, replaced by the server's layout
+    "name": "PLAYER", "points": "SCORE", "lines": "LINE", "level": "LVL",
+    "next": "NEXT", "hold": "HOLD"
+}
+const watchId = new URLSearchParams(window.location.search).get("watch")
+
+let connected = false // Connected before?
 
 socket.on("connect", () => {
-    waitSound.play()
+    if (connected && roomId) {
+        // Reconnected: the room waits a while for its viewers to be back
+        socket.emit("watch", roomId, hostKey, () => {})
+    } else {
+        waitSound.play()
+    }
+    connected = true
 })
 
-socket.emit("host")
+if (watchId) {
+    // Spectator: subscribe to an existing room instead of hosting one
+    roomId = watchId
+    document.getElementById("roomid").innerHTML = `${spaceOut(roomId)}`
+    socket.emit("watch", roomId, (success, message, playfield) => {
+        document.getElementById("readyMessage").innerHTML = message
+        if (playfield) {
+            fields = layoutFields(playfield["width"], playfield["height"],
+                playfield["colors"])
+        }
+    })
+} else {
+    socket.emit("host")
+}
 
 socket.on("start game", () => {
     const elem = document.getElementById("load")
     elem.classList.add("hidden")
 
     waitSound.stop()
-    gameSound.play()
+    if (!gameSound.playing()) {
+        gameSound.play() // Also sent when a paused game resumes
+    }
+})
+
+socket.on("paused", () => {
+    // Any input from a player, or Ready, resumes the game
+    gameSound.pause()
 })
 
 socket.on("host greet", (data) => {
     roomId = data["room_id"]
+    hostKey = data["host_key"]
     document.getElementById("roomid").innerHTML = `${spaceOut(roomId)}`
+    if (data["hud"]) {
+        hudTitles = data["hud"]
+    }
+    const playfield = data["playfield"]
+    if (playfield) {
+        fields = layoutFields(playfield["width"], playfield["height"],
+            playfield["colors"])
+    }
+})
+
+socket.on("host busy", (data) => {
+    // The server is at capacity, ask again after the time it suggests
+    const retry = data["retry"]
+    document.getElementById("roomid").innerHTML =
+        `Server busy, retrying in ${retry} seconds...`
+    setTimeout(() => socket.emit("host"), retry * 1000)
+})
+
+socket.on("hud", (data) => {
+    // Only the values that changed: { boards: [[bid, { name: value }]] }
+    for (const [bid, changed] of data["boards"]) {
+        huds[bid] = Object.assign(huds[bid] || {}, changed)
+    }
+    drawHud()
 })
 
 socket.on("update", (data) => {
+    if (typeof data === "string") {
+        data = JSON.parse(data) // Frames are sent pre-encoded
+    }
+    // data is either a keyframe with every board's grid:
+    //   { seq, key: true, boards: [{ bid, grid }] }
+    // or the rows changed since frame base:
+    //   { seq, base, boards: [{ bid, rows: [[index, row]] }] }
+    if (data["key"]) {
+        grids = data["boards"].map((info) => info["grid"])
+        awaitingKey = false
+    } else if (data["base"] === frameSeq) {
+        data["boards"].forEach((info, i) => {
+            for (const [y, row] of info["rows"]) {
+                grids[i][y] = row
+            }
+        })
+    } else {
+        // Missed a frame (e.g. joined late), wait for a keyframe
+        if (!awaitingKey) {
+            awaitingKey = true
+            socket.emit("keyframe", roomId)
+        }
+        return
+    }
+    frameSeq = data["seq"]
     two.clear()
-    // data is expected to be a list of objects, each with
-    // a board ID and grid data (2D array)
     // For now, only the first two available will be dealt with
-    // Naive assumption that at least two boards are available!
-    for (let i = 0; i < 2; i++) {
-        let info = data[i]
-        let grid = info["grid"]
-        fields[i].draw(grid)
+    for (let i = 0; i < Math.min(2, grids.length); i++) {
+        fields[i].draw(grids[i])
     }
     two.update()
 })
 
 
+socket.on("trace", (seq) => {
+    // Echo traced frames once drawn, for input latency tracing
+    socket.emit("ack", roomId, seq)
+})
+
 function sendReady() {
     if (socket) {
         socket.emit("ready", roomId)
     }
 }
 
+function sendAddBot() {
+    if (socket) {
+        socket.emit("add bot", roomId, (success, message) => {
+            document.getElementById("readyMessage").innerHTML = message
+        })
+    }
+}
+
+/**
+ * Show the HUD panels of the first two boards. Only called when a HUD value
+ * changes, not every frame.
+ */
+function drawHud() {
+    const elem = document.getElementById("hud")
+    elem.innerHTML = ""
+    for (const bid of Object.keys(huds).slice(0, 2)) {
+        const panel = document.createElement("div")
+        for (const [name, title] of Object.entries(hudTitles)) {
+            let value = huds[bid][name]
+            if (value == null) continue
+            if (Array.isArray(value)) value = value.join(" ")
+            const line = document.createElement("div")
+            line.textContent = `${title} ${value}`
+            panel.appendChild(line)
+        }
+        elem.appendChild(panel)
+    }
+}
+
 /**
  * Add spaces every breaks characters in a string.
  * @param s - String to space out.
@@ -82,6 +205,29 @@ function spaceOut(s, breaks) {
 }
 
 
+/**
+ * Make the fields to draw, side by side and sized to fit the window.
+ * @param cols Columns of each board.
+ * @param rows Rows of each board.
+ * @param colors Optional RGB arrays of each block, by grid value - 1.
+ * @returns Array of fields.
+ */
+function layoutFields(cols, rows, colors) {
+    const width = two.height / rows
+    let config
+    if (colors) {
+        config = Object.assign({}, DEFAULT_FIELD, {
+            "color": colors.map((c) => `rgb(${c[0]}, ${c[1]}, ${c[2]})`),
+            "stroke_color": colors.map((c) =>
+                `rgb(${c.map((v) => Math.round(v * 0.7)).join(", ")})`)
+        })
+    }
+    return [
+        new field(width, width, width, config),
+        new field(width * cols + width, width, width, config)
+    ]
+}
+
 /**
  * Construct a playfield for rendering
  * @param width Width of each piece.
@@ -100,15 +246,7 @@ function field(x, y, width, config) {
     this.x = x
     this.y = y
     this.width = width
-    this.config = config || {
-        "color": [ "rgb(137, 226, 136)" ],
-        "stroke_color": [ "rgb(95, 165, 94)" ],
-        "stroke_width": 5,
-        "grid_lines": true,
-        "lines_color": "rgb(52, 150, 51)",
-        "grid_stroke": "1",
-        "background_color": "rgb(171, 209, 115)"
-    }
+    this.config = config || DEFAULT_FIELD
 
     /**
      * Dry draw the playfield. You must call Two.update to reflect the
@@ -148,9 +286,9 @@ function field(x, y, width, config) {
      * @returns Array of piece color and piece stroke color.
      */
     this.determineColor = function(value) {
-        value = Math.abs(value) - 1
+        value = Math.abs(value) - 1 // Ghosts are negative
         let choices = this.config["color"]
-        let color = choices[value - 1] || choices[0]
+        let color = choices[value] || choices[0]
         let strokeChoices = this.config["stroke_color"]
         let strokeColor = strokeChoices[value] || strokeChoices[0]
         return [ color, strokeColor ]
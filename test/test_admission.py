@@ -0,0 +1,53 @@
+import unittest
+from server.admission import Admission, rss_bytes
+from server.metrics import Histogram
+
+
+class TestAdmission(unittest.TestCase):
+
+    def setUp(self):
+        self.ticks = Histogram()
+        self.lag = Histogram()
+        self.depth = 0
+        self.memory = 0
+        self.admission = Admission(self.ticks, self.lag, lambda: self.depth,
+            tick_budget=0.5, lag_p99=0.02, depth_limit=100,
+            memory_limit=1000, max_rooms=3, memory=lambda: self.memory)
+
+    def test_admit(self):
+        admission = self.admission
+        admission.sample(0)
+        self.assertTrue(admission.admit(0))
+        self.assertFalse(admission.admit(3)) # Room cap
+        self.depth = 100
+        admission.sample(1)
+        self.assertFalse(admission.admit(0))
+        self.assertEqual(admission.refused, 2)
+        self.depth = 0
+        admission.sample(2)
+        self.assertTrue(admission.admit(0))
+
+    def test_signals(self):
+        admission = self.admission
+        admission.sample(0)
+        for _ in range(100):
+            self.ticks.record(0.004) # 0.4s of work in 1s
+        admission.sample(1)
+        self.assertAlmostEqual(admission.load, 0.8)
+        self.assertAlmostEqual(admission.pressure(), 0)
+        self.lag.record(0.03)
+        admission.sample(2)
+        self.assertGreater(admission.load, 1)
+        self.assertEqual(admission.pressure(), 1)
+        admission.sample(3) # Lag is only counted since the last sample
+        self.assertEqual(admission.load, 0)
+        self.memory = 900
+        admission.sample(4)
+        self.assertAlmostEqual(admission.load, 0.9)
+        self.assertAlmostEqual(admission.pressure(), 0.5)
+        self.assertEqual(set(admission.to_dict()["signals"]),
+            {"depth", "ticks", "lag", "memory"})
+
+    def test_rss(self):
+        rss = rss_bytes()
+        self.assertTrue(rss is None or rss > 0)
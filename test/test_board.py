@@ -0,0 +1,154 @@
+import unittest
+from json import load
+from game.board import Board, GameInput, INPUTS, OPCODES, PRESS, RELEASE
+
+
+class TestBoard(unittest.TestCase):
+
+    def setUp(self):
+        with open("config/blocks.json") as f:
+            self.blocks = load(f)["blocks"]
+        with open("config/frames.json") as f:
+            self.frames = load(f)
+        self.board = Board(10, 20, self.blocks, self.frames)
+
+    def position(self):
+        return self.board.get_field().get_active_block()[0].get_position()
+
+    def test_opcode(self):
+        for op, name in enumerate(INPUTS):
+            self.assertEqual(GameInput.opcode(name), op)
+        self.assertEqual(GameInput.opcode("nope"), -1)
+
+    def test_perform(self):
+        x, y = self.position()
+        self.board.perform(GameInput.opcode(GameInput.left()))
+        self.assertEqual(self.position(), (x - 1, y))
+        self.board.performInput(GameInput.right())
+        self.assertEqual(self.position(), (x, y))
+        # Unknown inputs and pause are ignored
+        self.board.perform(-1)
+        self.board.perform(len(INPUTS))
+        self.board.performInput(GameInput.pause())
+        self.assertEqual(self.position(), (x, y))
+
+    def test_hard_drop(self):
+        self.board.performInput(GameInput.hard_drop())
+        self.assertTrue(self.board.placed)
+        # A block that already landed is placed once, by the drop itself
+        board = Board(10, 20, self.blocks, [0.05])
+        board.update(1 / 60)
+        self.assertEqual(board.get_field().drop_distance(), 0)
+        board.performInput(GameInput.hard_drop())
+        self.assertTrue(board.placed)
+        cells = sum(1 for row in board.get_field().get_grid().get_raw()
+            for value in row if value > 0)
+        self.assertEqual(cells, 4)
+
+    def test_auto_repeat(self):
+        board = self.board
+        board.set_auto_repeat(3, 2, 1)
+        left = GameInput.opcode(GameInput.left())
+        right = GameInput.opcode(GameInput.right())
+        x, y = self.position()
+        board.perform(left, PRESS)
+        self.assertEqual(self.position()[0], x - 1)
+        board.update(0) # Frame 1, 2 are within DAS
+        board.update(0)
+        self.assertEqual(self.position()[0], x - 1)
+        board.update(0) # Frame 3: DAS charged
+        self.assertEqual(self.position()[0], x - 2)
+        board.update(0) # Frame 4: between repeats
+        self.assertEqual(self.position()[0], x - 2)
+        board.update(0)
+        self.assertEqual(self.position()[0], x - 3)
+        # Latest held shift wins, releasing it goes back to the other one
+        board.perform(right, PRESS)
+        self.assertEqual(self.position()[0], x - 2)
+        board.perform(right, RELEASE)
+        for i in range(3):
+            board.update(0)
+        self.assertEqual(self.position()[0], x - 3)
+        board.perform(left, RELEASE)
+        for i in range(4):
+            board.update(0)
+        self.assertEqual(self.position()[0], x - 3)
+        # Instant repeat reaches the wall
+        board.set_auto_repeat(0, 0, 1)
+        board.perform(right, PRESS)
+        board.update(0)
+        self.assertIsNone(board.get_field().try_step(Board._RIGHT))
+        board.perform(right, RELEASE)
+
+    def test_soft_drop_repeat(self):
+        board = self.board
+        board.set_auto_repeat(10, 2, 2)
+        x, y = self.position()
+        board.perform(GameInput.opcode(GameInput.soft_drop()), PRESS)
+        for i in range(4):
+            board.update(0)
+        self.assertEqual(self.position()[1], y + 3)
+        board.perform(GameInput.opcode(GameInput.soft_drop()), RELEASE)
+        for i in range(4):
+            board.update(0)
+        self.assertEqual(self.position()[1], y + 3)
+        with self.assertRaises(ValueError):
+            board.set_auto_repeat(1, 1, 0)
+
+    def test_state(self):
+        board = self.board
+        for i in range(3):
+            board.performInput(GameInput.hard_drop())
+            board.update(1 / 60)
+        board.performInput(GameInput.hold())
+        board.performInput(GameInput.left())
+        state = board.get_state()
+        copy = Board(10, 20, self.blocks, self.frames)
+        copy.set_state(state)
+        self.assertEqual(copy.get_state(), state)
+        for i in range(120):
+            board.update(1 / 60)
+            copy.update(1 / 60)
+            self.assertEqual(copy.get_raw_grid(), board.get_raw_grid())
+        self.assertEqual(copy.get_preview(), board.get_preview())
+
+    def test_dimensions(self):
+        board = Board(12, 16, self.blocks, self.frames)
+        grid = board.get_raw_grid()
+        self.assertEqual((len(grid), len(grid[0])), (16, 12))
+        self.assertEqual(board.get_field().get_spawn_position(), (6, 0))
+
+    def test_gravity(self):
+        # 2 frames per row, then 20 rows per frame
+        board = self.board = Board(10, 20, self.blocks, [2, 0.05])
+        x, y = self.position()
+        board.update(1 / 60)
+        self.assertEqual(self.position(), (x, y))
+        board.update(1 / 60)
+        self.assertEqual(self.position(), (x, y + 1))
+        board.set_level(1)
+        board.update(1 / 60)
+        self.assertFalse(board.placed) # Landed, still movable
+        x, y = self.position()
+        self.assertEqual(board.get_field().drop_distance(), 0)
+        board.performInput(GameInput.left())
+        self.assertEqual(self.position(), (x - 1, y))
+        for i in range(Board.LOCK_DELAY - 1):
+            board.update(1 / 60)
+            self.assertFalse(board.placed)
+        board.update(1 / 60)
+        self.assertTrue(board.placed)
+
+    def test_register_input(self):
+        calls = []
+        op = Board.register_input("test_input", calls.append)
+        try:
+            self.assertEqual(INPUTS[op], "test_input")
+            self.assertEqual(Board.register_input("test_input",
+                calls.append), op)
+            self.board.performInput("test_input")
+            self.assertEqual(calls, [self.board])
+        finally:
+            INPUTS.pop()
+            del OPCODES["test_input"]
+            Board._DISPATCH.pop()
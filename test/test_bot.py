@@ -0,0 +1,70 @@
+import unittest
+from json import load
+from game.board import Board, GameInput
+import pickle
+from game.bot import Bot, Planner, Shape, Snapshot, _place, _profile
+
+
+class TestShape(unittest.TestCase):
+
+    def test_init(self):
+        shape = Shape([[0, 0, 0], [0, 1, 1], [0, 1, 0]])
+        self.assertEqual(shape.left, 1)
+        self.assertEqual(shape.width, 2)
+        self.assertEqual((shape.top, shape.bottom), (1, 2))
+        self.assertEqual(shape.rows, ((1, 0b11), (2, 0b01)))
+        self.assertEqual(shape.columns, ((0, 1, 2), (1, 1, 1)))
+        with self.assertRaises(ValueError):
+            Shape([[0]])
+
+
+class TestPlace(unittest.TestCase):
+
+    def test_overhang(self):
+        # Column 0 is covered at row 1, with 2 holes below
+        rows = [0, 0b0001, 0, 0]
+        heights, holes = _profile(rows, 4, 4)
+        self.assertEqual(holes[0], 2)
+        score, (placed, heights, holes) = _place(rows, heights, holes, 4, 4,
+            Shape([[1], [1]]), 0, 2)
+        self.assertEqual((heights, holes), _profile(placed, 4, 4))
+        self.assertEqual(holes[0], 0)
+
+
+class TestBot(unittest.TestCase):
+
+    def setUp(self):
+        with open("config/blocks.json") as f:
+            self.blocks = load(f)["blocks"]
+        with open("config/frames.json") as f:
+            self.frames = load(f)
+
+    def test_snapshot(self):
+        board = Board(10, 20, self.blocks, self.frames)
+        snapshot = Snapshot.from_board(board)
+        self.assertEqual(len(snapshot.rows), 20)
+        self.assertEqual(snapshot.preview, tuple(board.get_preview()))
+        copy = pickle.loads(pickle.dumps(snapshot))
+        self.assertEqual(copy.rows, snapshot.rows)
+        self.assertEqual(copy.name, snapshot.name)
+
+    def test_plan(self):
+        board = Board(10, 20, self.blocks, self.frames)
+        plan = Planner(self.blocks).plan(Snapshot.from_board(board))
+        self.assertEqual(plan[-1], GameInput.hard_drop())
+
+    def test_play(self):
+        board = Board(10, 20, self.blocks, self.frames)
+        planner = Planner(self.blocks, False)
+        for _ in range(60):
+            for inp in planner.plan(Snapshot.from_board(board)):
+                board.performInput(inp)
+            board.update(1 / 60)
+            self.assertFalse(board.has_lost())
+        self.assertGreater(board._lines, 0)
+
+    def test_update(self):
+        board = Board(10, 20, self.blocks, self.frames)
+        bot = Bot(self.blocks, budget=1, delay=0)
+        inputs = [bot.update(board) for _ in range(20)]
+        self.assertIn(GameInput.hard_drop(), inputs)
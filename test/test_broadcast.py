@@ -0,0 +1,34 @@
+import unittest
+from server.broadcast import BroadcastClock
+
+
+class TestBroadcastClock(unittest.TestCase):
+
+    def test_due(self):
+        clock = BroadcastClock(20)
+        self.assertTrue(clock.due(0))
+        self.assertFalse(clock.due(0.01))
+        self.assertTrue(clock.due(0.01, True)) # Significant frame
+        self.assertFalse(clock.due(0.03))
+        self.assertTrue(clock.due(0.07))
+
+    def test_report(self):
+        clock = BroadcastClock(20, 5)
+        clock.report(0.04) # 80% of a 50ms interval
+        self.assertEqual(clock.get_current_rate(), 10)
+        for _ in range(5):
+            clock.report(0.1)
+        self.assertEqual(clock.get_current_rate(), 5)
+        for _ in range(30):
+            clock.report(0)
+        self.assertEqual(clock.get_current_rate(), 20)
+
+    def test_set_rate(self):
+        clock = BroadcastClock(30)
+        clock.set_rate(10)
+        self.assertEqual(clock.get_rate(), 10)
+        self.assertEqual(clock.get_current_rate(), 10)
+        clock.set_rate(1)
+        self.assertEqual(clock.get_rate(), 5)
+        with self.assertRaises(ValueError):
+            BroadcastClock(1, 5)
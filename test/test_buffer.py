@@ -0,0 +1,31 @@
+import unittest
+from server.buffer import Frame, FrameBuffer
+
+
+class TestFrameBuffer(unittest.TestCase):
+
+    def test_publish(self):
+        buf = FrameBuffer()
+        self.assertIsNone(buf.latest())
+        first = buf.publish((("a", Frame.freeze([[0, 1]])),))
+        self.assertIs(buf.latest(), first)
+        self.assertEqual(first.seq, 1)
+        self.assertEqual(first.to_list(), [{"bid": "a", "grid": ((0, 1),)}])
+        second = buf.publish((("a", Frame.freeze([[1, 1]])),))
+        self.assertIs(buf.latest(), second)
+        self.assertEqual(second.seq, 2)
+        self.assertFalse(second.same_boards(first))
+
+    def test_previous(self):
+        buf = FrameBuffer(2)
+        frames = [buf.publish((("a", ((n,),)),)) for n in range(3)]
+        self.assertIs(buf.previous(1), frames[1])
+        self.assertIsNone(buf.previous(2)) # Overwritten
+        with self.assertRaises(ValueError):
+            FrameBuffer(1)
+
+    def test_freeze(self):
+        raw = [[0, 1], [1, 0]]
+        frozen = Frame.freeze(raw)
+        raw[0][0] = 5
+        self.assertEqual(frozen, ((0, 1), (1, 0)))
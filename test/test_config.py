@@ -0,0 +1,53 @@
+import unittest
+from copy import deepcopy
+from json import load
+from config import Config, ConfigError, GameConfig, freeze
+
+
+class TestConfig(unittest.TestCase):
+
+    def setUp(self):
+        with open("config/standard.json") as f:
+            self.standard = load(f)
+        with open("config/blocks.json") as f:
+            self.blocks = load(f)
+        with open("config/frames.json") as f:
+            self.frames = load(f)
+
+    def test_freeze(self):
+        frozen = freeze({"a": [1, {"b": [2]}]})
+        self.assertEqual(frozen["a"], (1, {"b": (2,)}))
+        with self.assertRaises(TypeError):
+            frozen["a"] = 1
+        self.assertEqual(Config({"a": 1}).get("a"), 1)
+        self.assertIsNone(Config({}).get("a"))
+
+    def test_from_files(self):
+        config = GameConfig.from_files()
+        self.assertEqual((config.width, config.height), (10, 20))
+        self.assertEqual(config.colors[0], tuple(self.blocks["colors"][0]))
+        self.assertEqual(config.gravity, tuple(self.frames))
+        self.assertEqual(config.blocks["O"][0], (0, 1, 1))
+        self.assertEqual(config.shapes.get("O", 4)[0]._grid[0], [0, 4, 4])
+        with self.assertRaises(ConfigError):
+            GameConfig.from_files("config/missing.json")
+
+    def test_invalid(self):
+        GameConfig(self.standard, self.blocks, self.frames)
+        invalid = [
+            ("standard", lambda c: c["board"]["playfield"].pop("width")),
+            ("standard", lambda c: c["board"]["playfield"].update(
+                height="20")),
+            ("blocks", lambda c: c["blocks"].update(X=[[1, 0]])),
+            ("blocks", lambda c: c["blocks"].update(X=[[2]])),
+            ("blocks", lambda c: c["colors"].pop()),
+            ("frames", lambda c: c.append(0))
+        ]
+        for part, change in invalid:
+            parts = {"standard": deepcopy(self.standard),
+                "blocks": deepcopy(self.blocks),
+                "frames": deepcopy(self.frames)}
+            change(parts[part])
+            with self.assertRaises(ConfigError):
+                GameConfig(parts["standard"], parts["blocks"],
+                    parts["frames"])
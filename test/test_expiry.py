@@ -0,0 +1,37 @@
+import unittest
+from server.expiry import TimerWheel
+
+
+class TestTimerWheel(unittest.TestCase):
+
+    def test_advance(self):
+        wheel = TimerWheel(1, 8)
+        wheel.schedule("a", 2.5)
+        wheel.schedule("b", 5)
+        wheel.schedule("c", 20) # More than a turn ahead
+        self.assertEqual(len(wheel), 3)
+        self.assertEqual(wheel.advance(2), [])
+        self.assertEqual(wheel.advance(3), ["a"])
+        self.assertEqual(wheel.advance(12), ["b"])
+        self.assertIn("c", wheel)
+        self.assertEqual(wheel.advance(20.5), ["c"])
+        self.assertEqual(len(wheel), 0)
+
+    def test_cancel(self):
+        wheel = TimerWheel(1, 8)
+        wheel.schedule("a", 1)
+        self.assertTrue(wheel.cancel("a"))
+        self.assertFalse(wheel.cancel("a"))
+        self.assertEqual(wheel.advance(5), [])
+
+    def test_reschedule(self):
+        wheel = TimerWheel(1, 8)
+        wheel.schedule("a", 1)
+        wheel.schedule("a", 4)
+        self.assertEqual(wheel.advance(3), [])
+        self.assertEqual(wheel.advance(4), ["a"])
+        # Deadlines in the past expire on the next tick
+        wheel.schedule("b", 0)
+        self.assertEqual(wheel.advance(5), ["b"])
+        with self.assertRaises(ValueError):
+            TimerWheel(0)
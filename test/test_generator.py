@@ -26,3 +26,12 @@ class TestGenerator(unittest.TestCase):
         self.assertEqual(popped, "O")
         self.assertEqual(n, 0)
         self.assertGreaterEqual(len(gen.stack), gen.preview_size)
+
+    def test_state(self):
+        gen = generator.Generator(names=["I", "O", "T", "S", "Z"], seed=3)
+        for i in range(12):
+            gen.pop_front()
+        copy = generator.Generator(names=["I", "O", "T", "S", "Z"])
+        copy.set_state(gen.get_state())
+        for i in range(20):
+            self.assertEqual(copy.pop_front(), gen.pop_front())
@@ -0,0 +1,58 @@
+import unittest
+from json import load
+from game.board import Board, GameInput
+from server.hud import HudTracker
+
+
+class TestHudTracker(unittest.TestCase):
+
+    def setUp(self):
+        with open("config/blocks.json") as f:
+            blocks = load(f)["blocks"]
+        with open("config/frames.json") as f:
+            frames = load(f)
+        self.board = Board(10, 20, blocks, frames)
+        self.hud = HudTracker()
+
+    def test_update(self):
+        board = self.board
+        first = self.hud.update("a", board)
+        self.assertEqual(first, board.get_hud())
+        self.assertEqual(len(first["next"]), 4)
+        self.assertEqual(first["hold"], "")
+        self.assertIsNone(self.hud.update("a", board))
+        board.set_score(100)
+        self.assertEqual(self.hud.update("a", board), {"points": 100})
+        # Changed back and forth between updates: nothing to send
+        board.set_lines(3)
+        board.set_lines(0)
+        self.assertIsNone(self.hud.update("a", board))
+
+    def test_hold(self):
+        board = self.board
+        self.hud.update("a", board)
+        preview = board.get_preview()
+        board.performInput(GameInput.hold())
+        changed = self.hud.update("a", board)
+        self.assertNotEqual(changed["hold"], "")
+        self.assertEqual(changed["next"][:3], preview[1:])
+
+    def test_full(self):
+        self.hud.update("a", self.board)
+        self.hud.update("b", self.board)
+        self.assertEqual(self.hud.full(["b", "c"]),
+            [["b", self.board.get_hud()]])
+
+    def test_forget(self):
+        self.hud.update("a", self.board)
+        self.hud.forget(["a"])
+        self.assertEqual(self.hud.full(["a"]), [])
+        self.assertEqual(self.hud.update("a", self.board),
+            self.board.get_hud())
+
+    def test_merge(self):
+        merged = HudTracker.merge({"boards": [["a", {"points": 1}]]},
+            {"boards": [["b", {"lines": 1}], ["a", {"points": 2,
+            "level": 1}]]})
+        self.assertEqual(merged, {"boards": [["a", {"points": 2,
+            "level": 1}], ["b", {"lines": 1}]]})
@@ -0,0 +1,28 @@
+import unittest
+from server.limit import RateLimiter
+
+
+class TestRateLimiter(unittest.TestCase):
+
+    def test_allow(self):
+        limit = RateLimiter(10, 3)
+        self.assertEqual([limit.allow("a", 0) for _ in range(4)],
+            [True, True, True, False])
+        self.assertTrue(limit.allow("b", 0)) # Own bucket
+        self.assertFalse(limit.allow("a", 0.05))
+        self.assertTrue(limit.allow("a", 0.15)) # Refilled one token
+        self.assertFalse(limit.allow("a", 0.15))
+        self.assertEqual(limit.dropped, 3)
+
+    def test_prune(self):
+        limit = RateLimiter(10, 2)
+        limit.allow("a", 0)
+        limit.allow("b", 0.5)
+        self.assertEqual(limit.prune(0.55), 1) # a filled up again
+        self.assertEqual(len(limit), 1)
+        limit.forget("b")
+        self.assertEqual(len(limit), 0)
+
+    def test_invalid(self):
+        with self.assertRaises(ValueError):
+            RateLimiter(0, 1)
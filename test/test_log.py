@@ -0,0 +1,43 @@
+import io
+import unittest
+from json import loads
+from server.log import Logger
+
+
+class TestLogger(unittest.TestCase):
+
+    def test_worker(self):
+        out = io.StringIO()
+        log = Logger(out)
+        self.assertTrue(log.info("hello", room="a"))
+        log.error("oops")
+        log.stop()
+        log.worker()
+        lines = [loads(line) for line in out.getvalue().splitlines()]
+        self.assertEqual(lines[0]["cat"], "info")
+        self.assertEqual(lines[0]["msg"], "hello")
+        self.assertEqual(lines[0]["room"], "a")
+        self.assertEqual(lines[1]["cat"], "error")
+        self.assertEqual(log.written, 2)
+
+    def test_sample(self):
+        log = Logger(io.StringIO())
+        log.configure("input", sample=4)
+        logged = [log.log("input", "x") for _ in range(8)]
+        self.assertEqual(logged.count(True), 2)
+        self.assertTrue(logged[0])
+
+    def test_rate(self):
+        log = Logger(io.StringIO())
+        log.configure("input", rate=3)
+        logged = [log.log("input", "x") for _ in range(10)]
+        self.assertLessEqual(logged.count(True), 6) # May cross a second
+        self.assertGreaterEqual(log.dropped, 4)
+        with self.assertRaises(ValueError):
+            log.configure("input", sample=0)
+
+    def test_full(self):
+        log = Logger(io.StringIO(), 1)
+        self.assertTrue(log.info("a"))
+        self.assertFalse(log.info("b"))
+        self.assertEqual(log.dropped, 1)
@@ -0,0 +1,291 @@
+import unittest
+import time
+from json import dumps
+from unittest import mock
+import main
+from server.expiry import TimerWheel
+from server.limit import RateLimiter
+from server.protocol import encode_input
+
+
+class TestRooms(unittest.TestCase):
+    """Drives the socket handlers in-process, without background workers."""
+
+    @classmethod
+    def setUpClass(cls):
+        main.workers_started = True # Tests advance rooms themselves
+        cls.app = main.create_app()
+
+    def setUp(self):
+        for name in ("input_limit", "address_input_limit", "release_limit",
+            "host_limit", "address_host_limit"):
+            patcher = mock.patch.object(main, name, RateLimiter(1000, 1000))
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        for name in ("naps", "expiry"): # Advanced by the tests
+            patcher = mock.patch.object(main, name, TimerWheel(1, 64,
+                time.perf_counter()))
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.clients = []
+        self.now = time.perf_counter()
+
+    def tearDown(self):
+        for client, namespace in self.clients:
+            if client.is_connected(namespace):
+                client.disconnect(namespace)
+        for room in list(main.rooms.values()):
+            room.running = False
+            room.paused = False
+        main.rooms.clear()
+        main.sessions.clear()
+        main.viewers.clear()
+
+    def host(self):
+        """Connect a host and create a room. Returns the client and room."""
+        client = self.viewer()
+        client.emit("host", namespace="/host")
+        greet = [m for m in client.get_received("/host")
+            if m["name"] == "host greet"][0]["args"][0]
+        return client, main.rooms[greet["room_id"]]
+
+    def viewer(self):
+        client = main.sockets.test_client(self.app, namespace="/host")
+        self.clients.append((client, "/host"))
+        return client
+
+    def controller(self):
+        client = main.sockets.test_client(self.app)
+        self.clients.append((client, None))
+        return client
+
+    def join(self, client, room, **data) -> list:
+        return client.emit("join", dumps({"room": room.name, **data}),
+            callback=True)
+
+    def later(self, seconds: float) -> float:
+        """Get a time seconds after the last one given to a TimerWheel."""
+        self.now = max(self.now, time.perf_counter()) + seconds
+        return self.now
+
+    def wait(self, condition, timeout: float = 2):
+        """Wait for a room's thread to make condition() true."""
+        deadline = time.perf_counter() + timeout
+        while not condition():
+            self.assertLess(time.perf_counter(), deadline)
+            time.sleep(0.01)
+
+    def test_host_only(self):
+        host, room = self.host()
+        self.join(self.controller(), room)
+        spectator = self.viewer()
+        self.assertTrue(spectator.emit("watch", room.name, namespace="/host",
+            callback=True)[0])
+        self.assertFalse(spectator.emit("add bot", room.name,
+            namespace="/host", callback=True)[0])
+        self.assertFalse(spectator.emit("ready", room.name,
+            namespace="/host", callback=True)[0])
+        # A reconnected host takes the room back with its key
+        again = self.viewer()
+        again.emit("watch", room.name, room.host_key, namespace="/host",
+            callback=True)
+        self.assertFalse(host.emit("add bot", room.name, namespace="/host",
+            callback=True)[0])
+        self.assertTrue(again.emit("add bot", room.name, namespace="/host",
+            callback=True)[0])
+        self.assertEqual(len(room.boards), 2)
+        self.assertFalse(room.started)
+
+    def test_claim(self):
+        host, room = self.host()
+        first, second = self.controller(), self.controller()
+        seated = self.join(first, room)
+        self.assertTrue(seated[0])
+        bid, token = seated[2], seated[3]
+        self.assertNotEqual(token, bid)
+        # One seat per socket, even with another seat's token
+        self.assertEqual(self.join(second, room)[1], "Right Board")
+        other = room.tokens[list(room.boards)[1]]
+        self.assertFalse(self.join(first, room, token=other)[0])
+        self.assertEqual(len(room.boards), 2)
+        # Board IDs are seen by every viewer, they don't reclaim seats
+        again = self.controller()
+        self.assertEqual(self.join(again, room, token=bid)[1], "Full Room")
+        first.disconnect()
+        self.assertIn(bid, room.away)
+        rejoined = self.join(again, room, token=token)
+        self.assertEqual(rejoined[:2], [True, "Left Board"])
+        self.assertEqual(list(room.boards)[0], rejoined[2])
+        self.assertEqual(rejoined[3], token)
+        self.assertEqual(room.away, set())
+        # Resumed rooms keep the tokens of their seats
+        resumed = main.new_room()
+        resumed.restore(room.snapshot())
+        self.assertEqual(resumed.tokens, room.tokens)
+
+    def test_claim_refused(self):
+        client = self.viewer()
+        main.room_pool.fill()
+        ready = len(main.room_pool)
+        with mock.patch.object(main.registry, "claim", return_value=False):
+            client.emit("host", namespace="/host")
+        received = client.get_received("/host")
+        self.assertEqual([m["name"] for m in received], ["host busy"])
+        self.assertEqual(len(main.room_pool), ready) # Given back
+        self.assertEqual(main.rooms, {})
+
+    def test_nap(self):
+        host, room = self.host()
+        player = self.controller()
+        bid, token = self.join(player, room)[2:]
+        host.emit("add bot", room.name, namespace="/host", callback=True)
+        # Waiting rooms hibernate when idle, and wake when used
+        main.nap_rooms(self.later(main.NAP_TIME + 1))
+        self.assertTrue(room.hibernating())
+        self.assertTrue(host.emit("ready", room.name, namespace="/host",
+            callback=True)[0])
+        self.wait(lambda: room.running)
+        main.nap_rooms(self.later(main.NAP_TIME + 1)) # Not while ticking
+        self.assertFalse(room.hibernating())
+        # Paused games hibernate as their thread stops
+        room.performInput((bid, main.PAUSE, main.TAP, None))
+        self.wait(lambda: not room.ticking)
+        self.assertTrue(room.paused)
+        self.assertTrue(room.hibernating())
+        main.checkpoints.flush() # Written off the room's thread
+        paused = main.registry.get_checkpoint(room.name)
+        self.assertIsNotNone(paused)
+        # and again once idle after a player came back, checkpointed anew
+        player.disconnect()
+        seat = self.join(self.controller(), room, token=token)
+        self.assertTrue(seat[0])
+        self.assertFalse(room.hibernating())
+        main.nap_rooms(self.later(main.NAP_TIME + 1))
+        self.assertTrue(room.hibernating())
+        main.checkpoints.flush()
+        self.assertNotEqual(main.registry.get_checkpoint(room.name), paused)
+        # Resuming wakes it
+        self.assertTrue(host.emit("ready", room.name, namespace="/host",
+            callback=True)[0])
+        self.wait(lambda: room.running)
+        self.assertEqual(list(room.boards)[0], seat[2])
+
+    def test_deserted(self):
+        host, room = self.host()
+        player = self.controller()
+        self.join(player, room)
+        player.disconnect()
+        self.assertFalse(room.deserting) # The host still watches
+        host.disconnect("/host")
+        self.assertTrue(room.deserting)
+        self.assertFalse(room.hibernating()) # Not under room_lock
+        main.nap_rooms(self.later(1))
+        self.assertTrue(room.hibernating())
+
+    def test_release_held(self):
+        host, room = self.host()
+        player = self.controller()
+        bid, token = self.join(player, room)[2:]
+        host.emit("add bot", room.name, namespace="/host", callback=True)
+        host.emit("ready", room.name, namespace="/host", callback=True)
+        board = room.boards[bid]
+        room.performInput((bid, main.HELD_INPUTS[0], main.PRESS, None))
+        self.wait(lambda: board._shifts_held)
+        player.disconnect()
+        self.wait(lambda: not board._shifts_held)
+        # A seat taken back starts with nothing held either
+        board._press(main.HELD_INPUTS[2])
+        seat = self.join(self.controller(), room, token=token)
+        self.wait(lambda: not board._soft_drop_held)
+        self.assertIs(room.boards[seat[2]], board)
+
+    def test_grace(self):
+        host, room = self.host()
+        player = self.controller()
+        token = self.join(player, room)[3]
+        player.disconnect()
+        host.disconnect("/host")
+        self.assertTrue(room.deserting)
+        # Someone back within GRACE_TIME keeps the room
+        self.assertTrue(self.join(self.controller(), room, token=token)[0])
+        self.assertFalse(room.deserting)
+        main.expire_rooms(self.later(main.GRACE_TIME + 1))
+        self.assertIn(room.name, main.rooms)
+        self.clients[-1][0].disconnect()
+        self.assertTrue(room.deserting)
+        main.expire_rooms(self.later(main.GRACE_TIME + 1))
+        self.assertNotIn(room.name, main.rooms)
+        self.assertIsNone(main.registry.owner(room.name))
+
+    def test_release_limit(self):
+        host, room = self.host()
+        player = self.controller()
+        self.join(player, room)
+        queued = room.input_q.qsize
+        with mock.patch.object(main, "input_limit", RateLimiter(0.001, 1)), \
+            mock.patch.object(main, "release_limit", RateLimiter(0.001, 1)):
+            player.emit("input", encode_input("left", 0, event=main.PRESS))
+            player.emit("input", encode_input("left", 1))
+            self.assertEqual(queued(), 1)
+            # The release of a held input always gets through, once
+            player.emit("input", encode_input("left", 2, event=main.RELEASE))
+            self.assertEqual(queued(), 2)
+            # Other releases have their own bucket
+            for seq in range(100):
+                player.emit("input", dumps({"room": room.name,
+                    "command": "soft_drop", "event": "release"}))
+                player.emit("input", encode_input("left", seq,
+                    event=main.RELEASE))
+            self.assertEqual(queued(), 3)
+            # And anything else that looks like one is an input
+            player.emit("input", encode_input("hard_drop", 3,
+                event=main.RELEASE))
+            player.emit("input", dumps({"room": room.name,
+                "command": "hard_drop", "name": "release"}))
+            self.assertEqual(queued(), 3)
+
+    def test_input_queue(self):
+        host, room = self.host()
+        player = self.controller()
+        bid = self.join(player, room)[2]
+        with mock.patch.object(main, "INPUT_QUEUE", 4):
+            for seq in range(10):
+                player.emit("input", encode_input("left", seq))
+            self.assertEqual(room.input_q.qsize(), 4)
+            # Releases still get queued, so nothing is left held
+            room.release_held(bid)
+            self.assertEqual(room.input_q.qsize(), 4 + len(main.HELD_INPUTS))
+
+    def test_remote_address(self):
+        with self.app.test_request_context(headers={"X-Forwarded-For":
+            "10.0.0.1, 10.0.0.2"}, environ_base={"REMOTE_ADDR": "10.0.0.3"}):
+            self.assertEqual(main.remote_address(), "10.0.0.3")
+            with mock.patch.object(main, "TRUST_PROXY", True):
+                self.assertEqual(main.remote_address(), "10.0.0.2")
+
+    def test_leave(self):
+        host, room = self.host()
+        player, stranger = self.controller(), self.controller()
+        bid = self.join(player, room)[2]
+        stranger.emit("leave", dumps({"room": room.name, "bid": bid}))
+        self.assertEqual(list(room.boards), [bid])
+        player.emit("leave", dumps({"room": room.name, "bid": "other"}))
+        self.assertEqual(room.boards, {})
+
+    def test_paused_inputs(self):
+        host, room = self.host()
+        player = self.controller()
+        bid = self.join(player, room)[2]
+        host.emit("add bot", room.name, namespace="/host", callback=True)
+        host.emit("ready", room.name, namespace="/host", callback=True)
+        room.performInput((bid, main.PAUSE, main.TAP, None))
+        self.wait(lambda: not room.ticking)
+        # Only seated players resume it, and releases don't
+        stranger = self.controller()
+        stranger.emit("input", dumps({"room": room.name, "command": "left"}))
+        player.emit("input", encode_input("left", 0, event=main.RELEASE))
+        self.assertTrue(room.paused)
+        self.assertEqual(room.input_q.qsize(), 1) # Applied once resumed
+        player.emit("input", encode_input("left", 1, event=main.PRESS))
+        self.assertFalse(room.paused)
+        self.wait(lambda: room.input_q.qsize() == 0)
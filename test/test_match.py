@@ -0,0 +1,94 @@
+import unittest
+import random
+from json import load, loads
+from game.board import Board, INPUTS, TAP, PRESS, RELEASE
+from server.match import MatchStream, MatchReplay
+
+
+class TestMatch(unittest.TestCase):
+
+    def setUp(self):
+        with open("config/blocks.json") as f:
+            self.blocks = load(f)["blocks"]
+        with open("config/frames.json") as f:
+            self.frames = load(f)
+        self.boards = {"a": self.new_board(1), "b": self.new_board(2)}
+        self.stream = MatchStream(60, 30)
+        self.sent = [self.stream.start(self.boards)]
+        self.random = random.Random(0)
+
+    def new_board(self, seed=None):
+        return Board(10, 20, self.blocks, self.frames, seed=seed)
+
+    def play(self, ticks):
+        """Run the boards like a room, with random inputs."""
+        for i in range(ticks):
+            for bid, board in self.boards.items():
+                if self.random.random() < 0.2:
+                    op = self.random.randrange(len(INPUTS))
+                    event = self.random.choice((TAP, PRESS, RELEASE))
+                    board.perform(op, event)
+                    self.stream.record(bid, op, event)
+            for board in self.boards.values():
+                board.update(1 / 60)
+            self.sent.extend(self.stream.tick(self.boards))
+
+    def replay(self, messages):
+        replay = MatchReplay(self.new_board)
+        for message in messages:
+            self.assertEqual(replay.apply(loads(message)), [])
+        return replay
+
+    def assertSame(self, replay):
+        # Ticks without inputs aren't sent, viewers run them on their own
+        replay.advance(self.stream.ticks)
+        for bid, board in self.boards.items():
+            self.assertEqual(replay.boards[bid].get_state(),
+                board.get_state())
+
+    def test_seed(self):
+        self.assertEqual(self.new_board(5).get_state(),
+            self.new_board(5).get_state())
+
+    def test_replay(self):
+        self.play(200)
+        self.sent.append(self.stream.end())
+        self.assertTrue(any('"sums"' in m for m in self.sent))
+        replay = self.replay(self.sent)
+        self.assertTrue(replay.ended)
+        self.assertSame(replay)
+
+    def test_late_viewer(self):
+        self.play(75)
+        replay = self.replay(self.stream.sync())
+        self.assertEqual(loads(self.stream.sync()[0])["tick"], 60)
+        self.assertSame(replay)
+        start = len(self.sent)
+        self.play(50)
+        for message in self.sent[start:]:
+            self.assertEqual(replay.apply(loads(message)), [])
+        self.assertSame(replay)
+
+    def test_board_left(self):
+        self.play(10)
+        del self.boards["b"]
+        self.play(1)
+        self.assertEqual(len(loads(self.sent[-1])["boards"]), 1)
+        self.assertSame(self.replay(self.sent))
+
+    def test_resync(self):
+        self.play(10)
+        start = len(self.sent)
+        self.stream.resync() # A message was dropped
+        self.play(1)
+        self.assertIn("boards", loads(self.sent[start]))
+        self.assertSame(self.replay(self.sent[start:]))
+
+    def test_divergence(self):
+        replay = self.replay(self.sent[:1])
+        replay.boards["b"].set_score(1)
+        self.play(30)
+        found = []
+        for message in self.sent[1:]:
+            found += replay.apply(loads(message))
+        self.assertEqual(found, ["b"])
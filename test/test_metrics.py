@@ -0,0 +1,50 @@
+import unittest
+from server.metrics import Histogram, Metrics
+
+
+class TestHistogram(unittest.TestCase):
+
+    def test_percentile(self):
+        hist = Histogram()
+        self.assertEqual(hist.percentile(99), 0)
+        for _ in range(99):
+            hist.record(0.0002)
+        hist.record(0.3)
+        self.assertEqual(hist.get_count(), 100)
+        self.assertEqual(hist.percentile(50), 0.00025)
+        self.assertEqual(hist.percentile(99), 0.00025)
+        self.assertEqual(hist.percentile(100), 0.5)
+        since = hist.snapshot()
+        self.assertEqual(hist.percentile(99, since), 0)
+        hist.record(0.003)
+        self.assertEqual(hist.percentile(50, since), 0.004)
+        hist.record(10) # Past the last bound
+        self.assertEqual(hist.percentile(100), 10)
+        self.assertAlmostEqual(hist.to_dict()["max"], 10000)
+
+    def test_from_buckets(self):
+        hist = Histogram()
+        hist.record(0.0002)
+        before = hist.to_dict()["buckets"]
+        hist.record(0.003)
+        stats = hist.to_dict()
+        copy = Histogram.from_buckets(stats["buckets"], stats["max"] / 1000)
+        self.assertEqual(copy.percentile(50), hist.percentile(50))
+        self.assertEqual(copy.percentile(99, before), 0.004)
+        with self.assertRaises(ValueError):
+            Histogram.from_buckets([1])
+
+
+class TestMetrics(unittest.TestCase):
+
+    def test_count(self):
+        metrics = Metrics()
+        metrics.count("a")
+        metrics.count("a", 2)
+        self.assertEqual(metrics.get_count("a"), 3)
+        self.assertEqual(metrics.get_count("b"), 0)
+        metrics.histogram("tick").record(0.001)
+        self.assertIs(metrics.histogram("tick"), metrics.histogram("tick"))
+        stats = metrics.to_dict()
+        self.assertEqual(stats["counters"], {"a": 3})
+        self.assertEqual(stats["histograms"]["tick"]["count"], 1)
@@ -0,0 +1,79 @@
+import unittest
+from server.buffer import FrameBuffer
+from server.output import OutputStage
+
+
+class TestOutputStage(unittest.TestCase):
+
+    def setUp(self):
+        self.sent = []
+        self.stage = OutputStage(lambda room, data:
+            self.sent.append((room, data)), 1, 3,
+            emit_message=lambda room, event, message:
+            self.sent.append((room, event, message)))
+        self.buffer = FrameBuffer()
+
+    def frame(self, n: int):
+        return self.buffer.publish((("a", ((n,),)),))
+
+    def test_push(self):
+        for n in range(3):
+            self.assertTrue(self.stage.push("room", self.frame(n)))
+        self.assertEqual(self.stage.pressure("room"), 1)
+        self.assertFalse(self.stage.push("room", self.frame(3)))
+        self.assertEqual(self.stage.dropped, 1)
+
+    def test_batch(self):
+        self.stage.push("a", self.frame(0))
+        self.stage.push("b", self.frame(1))
+        latest = self.frame(2)
+        self.stage.push("a", latest)
+        batch = self.stage.take(0)
+        self.assertIs(batch["a"], latest)
+        self.assertEqual(self.stage.stale, 1)
+        self.stage.send(batch)
+        self.assertEqual(self.sent[0],
+            ("a", '{"seq":3,"key":true,"boards":[{"bid":"a","grid":[[2]]}]}'))
+        self.assertIsNotNone(self.stage.keyframe("a"))
+        self.stage.close("a")
+        self.stage.send(self.stage.take(0))
+        self.assertIsNone(self.stage.keyframe("a"))
+        self.assertEqual(self.stage.depth(), 0)
+        self.assertEqual(self.stage.take(0, False), {})
+
+    def test_post(self):
+        merge = lambda older, newer: older + newer
+        self.stage = OutputStage(self.stage._emit, 1, 8,
+            emit_message=self.stage._emit_message)
+        self.stage.push("a", self.frame(0))
+        self.assertTrue(self.stage.post("a", "hud", [1], merge))
+        self.stage.post("a", "match", "m1")
+        self.stage.post("a", "hud", [2], merge)
+        self.stage.post("a", "match", "m2")
+        self.stage.push("a", self.frame(1))
+        batch = self.stage.take(0)
+        self.assertEqual(self.stage.stale, 1) # Frames only
+        self.assertEqual(batch.messages, [["a", "hud", [1, 2]],
+            ["a", "match", "m1"], ["a", "match", "m2"]])
+        self.stage.send(batch)
+        self.assertEqual(self.sent[:3], [("a", "hud", [1, 2]),
+            ("a", "match", "m1"), ("a", "match", "m2")])
+        self.assertEqual(len(self.sent), 4)
+        for n in range(8):
+            self.stage.post("a", "match", n)
+        self.assertFalse(self.stage.post("a", "match", 8))
+        self.assertEqual(self.stage.dropped, 1)
+
+    def test_close_full(self):
+        for n in range(3):
+            self.stage.push("a", self.frame(n))
+        self.assertFalse(self.stage.close("a")) # Dropped, doesn't block
+        self.assertEqual(self.stage.dropped, 1)
+        self.stage.send(self.stage.take(0))
+        self.assertTrue(self.stage.close("a"))
+
+    def test_stop(self):
+        self.stage.push("a", self.frame(0))
+        self.stage.stop()
+        self.stage.worker(0)
+        self.assertEqual(len(self.sent), 1)
@@ -0,0 +1,49 @@
+import unittest
+from json import load
+from time import sleep
+from game.board import Board, GameInput
+from game.bot import Bot, Snapshot
+from server.planner import PlannerPool
+
+
+class TestPlannerPool(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        with open("config/blocks.json") as f:
+            cls.blocks = load(f)["blocks"]
+        with open("config/frames.json") as f:
+            cls.frames = load(f)
+        cls.pool = PlannerPool(cls.blocks, 1)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.pool.shutdown()
+
+    def test_submit(self):
+        board = Board(10, 20, self.blocks, self.frames)
+        request = self.pool.submit(Snapshot.from_board(board), 30)
+        for _ in range(300):
+            if request.done():
+                break
+            sleep(0.1)
+        plan = request.result()
+        self.assertEqual(plan[-1], GameInput.hard_drop())
+
+    def test_expired(self):
+        board = Board(10, 20, self.blocks, self.frames)
+        request = self.pool.submit(Snapshot.from_board(board), -1)
+        self.assertTrue(request.expired())
+        request.cancel()
+        self.assertIsNone(request.result())
+
+    def test_bot(self):
+        board = Board(10, 20, self.blocks, self.frames)
+        bot = Bot(self.blocks, delay=0, pool=self.pool, deadline=30)
+        inputs = []
+        for _ in range(300):
+            inputs.append(bot.update(board))
+            if inputs[-1] is not None:
+                break
+            sleep(0.1)
+        self.assertIsNotNone(inputs[-1])
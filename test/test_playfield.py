@@ -1,5 +1,6 @@
 import unittest
-from game.playfield import Step, PlayField
+from game.playfield import Step, PlayField, ShapeTable, ActiveBlock
+from game.grid import Grid
 
 # Very small class, so we include it in the same test module
 class TestStep(unittest.TestCase):
@@ -63,3 +64,47 @@ class TestPlayField(unittest.TestCase):
     def test_get_view(self):
         empty = self.get_empty()
         self.assertNotEqual(empty.get_view(), empty._field)
+
+    def test_shapes(self):
+        blocks = {"O": [[1, 1], [1, 1]], "T": [[0, 1, 0], [1, 1, 1],
+            [0, 0, 0]]}
+        shapes = ShapeTable(blocks)
+        field = PlayField(blocks, "T", shapes=shapes)
+        field.spawn("T", 2)
+        active = field.get_active_block()[0]
+        self.assertIs(active.get_grid(), shapes.get("T", 2)[0])
+        # Rotations match rotating a copy of the block
+        grid = Grid.from_data(blocks["T"])
+        grid.apply_multiplier(2)
+        for r in range(1, 5):
+            field.step(Step.rotate(1))
+            grid.rotate90()
+            self.assertEqual(field.get_active_block()[0].get_grid(), grid)
+        # Shared grids are left alone by steps and ghosts
+        field.get_view()
+        field.step(Step.vertical())
+        self.assertEqual(shapes.get("T", 2)[0]._grid,
+            [[0, 2, 0], [2, 2, 2], [0, 0, 0]])
+        self.assertEqual(shapes.get("T", -2)[0]._grid,
+            [[0, -2, 0], [-2, -2, -2], [0, 0, 0]])
+        copy = ActiveBlock.copy(field.get_active_block()[0])
+        self.assertIs(copy.get_grid(), field.get_active_block()[0].get_grid())
+
+    def test_drop_distance(self):
+        field = PlayField({"T": [[0, 1, 0], [1, 1, 1], [0, 0, 0]]}, "T")
+        field._field.set_at(5, 12, 1) # Under the middle of the T
+        field._field.fill_row(15, 1)
+        stepped = 0
+        probe = field.get_active_block()[0]
+        while field.try_step_with(probe, Step.vertical()) is not None:
+            probe = field.try_step_with(probe, Step.vertical())
+            stepped += 1
+        self.assertEqual(field.drop_distance(), stepped)
+        self.assertEqual(field.get_ghost_block().y, probe.y)
+        y = field.get_active_block()[0].y
+        self.assertFalse(field.drop(3))
+        self.assertEqual(field.get_active_block()[0].y, y + 3)
+        self.assertFalse(field.drop(20)) # Lands without being placed
+        self.assertEqual(field.get_active_block()[0].y, probe.y)
+        self.assertTrue(field.drop(1))
+        self.assertEqual(field.get_grid().get_at(5, probe.y + 1), 1)
@@ -0,0 +1,21 @@
+import unittest
+from itertools import count
+from server.pool import Pool
+
+
+class TestPool(unittest.TestCase):
+
+    def test_take(self):
+        made = count()
+        pool = Pool(lambda: next(made), 2)
+        self.assertEqual(pool.fill(), 2)
+        self.assertEqual(pool.fill(), 0)
+        self.assertEqual(pool.take(), 0)
+        self.assertEqual(pool.take(), 1)
+        self.assertEqual(pool.take(), 2) # Empty, made on the spot
+        self.assertEqual(pool.to_dict(), {"ready": 0, "taken": 3,
+            "misses": 1})
+        self.assertEqual(pool.fill(), 2)
+        self.assertEqual(len(pool), 2)
+        pool.put(2) # Unused, given back
+        self.assertEqual(pool.take(), 2)
@@ -0,0 +1,35 @@
+import unittest
+from game.board import GameInput, TAP, PRESS, RELEASE
+from server.protocol import COMMANDS, encode_input, decode_input, \
+    is_release
+
+
+class TestProtocol(unittest.TestCase):
+
+    def test_round_trip(self):
+        for op, command in enumerate(COMMANDS):
+            data = encode_input(command, 7)
+            self.assertEqual(len(data), 3)
+            self.assertEqual(decode_input(data), (op, TAP, 7, None))
+        data = encode_input(GameInput.left(), 70000, 1234.5)
+        self.assertEqual(len(data), 11)
+        self.assertEqual(decode_input(data),
+            (GameInput.opcode(GameInput.left()), TAP, 70000 & 0xFFFF, 1234.5))
+        for event in PRESS, RELEASE:
+            data = encode_input(GameInput.soft_drop(), 1, event=event)
+            self.assertEqual(decode_input(data),
+                (GameInput.opcode(GameInput.soft_drop()), event, 1, None))
+
+    def test_malformed(self):
+        self.assertIsNone(decode_input(b""))
+        self.assertIsNone(decode_input(b"\x00\x01"))
+        self.assertIsNone(decode_input(bytes([len(COMMANDS), 0, 0])))
+        self.assertIsNone(decode_input(bytes([3 << 6, 0, 0])))
+
+    def test_is_release(self):
+        self.assertTrue(is_release(encode_input("left", 1, event=RELEASE)))
+        self.assertFalse(is_release(encode_input("left", 1, event=PRESS)))
+        self.assertFalse(is_release(b""))
+        self.assertTrue(is_release('{"command":"left","event":"release"}'))
+        self.assertFalse(is_release('{"command":"left","event":"press"}'))
+        self.assertFalse(is_release(None))
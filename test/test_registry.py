@@ -0,0 +1,191 @@
+import unittest
+from queue import Queue, Empty
+from threading import Lock
+from unittest import mock
+from server.registry import CheckpointWriter, LocalRegistry, RedisRegistry
+
+
+class FakePubSub:
+    """In-process stand-in for a redis-py PubSub."""
+
+    def __init__(self, server):
+        self._server = server
+        self._messages = Queue()
+
+    def subscribe(self, *channels):
+        for channel in channels:
+            self._server.subscribers.setdefault(channel, []).append(self)
+
+    def deliver(self, channel, data):
+        self._messages.put({"type": "message", "channel": channel.encode(),
+            "data": data.encode() if isinstance(data, str) else data})
+
+    def get_message(self, timeout=0):
+        try:
+            return self._messages.get(timeout=timeout)
+        except Empty:
+            return None
+
+    def close(self):
+        for subscribers in self._server.subscribers.values():
+            if self in subscribers:
+                subscribers.remove(self)
+
+
+class FakePipeline:
+
+    def __init__(self, server):
+        self._server = server
+        self._calls = []
+
+    def expire(self, key, seconds):
+        self._calls.append((key, seconds))
+
+    def execute(self):
+        return [self._server.expire(*call) for call in self._calls]
+
+
+class FakeRedis:
+    """In-process stand-in for the redis-py client commands used."""
+
+    def __init__(self):
+        self.data = {}
+        self.expires = {}
+        self.subscribers = {}
+        self._lock = Lock()
+
+    def set(self, key, value, nx=False, ex=None):
+        with self._lock:
+            if nx and key in self.data:
+                return None
+            self.data[key] = value.encode() if isinstance(value, str) \
+                else value
+            self.expires[key] = ex
+            return True
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def delete(self, key):
+        self.expires.pop(key, None)
+        return 1 if self.data.pop(key, None) is not None else 0
+
+    def expire(self, key, seconds):
+        if key not in self.data:
+            return False
+        self.expires[key] = seconds
+        return True
+
+    def pipeline(self):
+        return FakePipeline(self)
+
+    def publish(self, channel, data):
+        subscribers = list(self.subscribers.get(channel, []))
+        for subscriber in subscribers:
+            subscriber.deliver(channel, data)
+        return len(subscribers)
+
+    def pubsub(self, ignore_subscribe_messages=False):
+        return FakePubSub(self)
+
+
+def handler(kind, room, args):
+    if kind == "echo":
+        return [room] + args
+    handler.received.append((kind, room, args))
+
+
+class TestLocalRegistry(unittest.TestCase):
+
+    def test_local(self):
+        registry = LocalRegistry()
+        handler.received = []
+        registry.start(handler)
+        self.assertIsNone(registry.call("a", "echo", [1]))
+        self.assertTrue(registry.claim("a"))
+        self.assertFalse(registry.claim("a"))
+        self.assertEqual(registry.owner("a"), registry.node)
+        self.assertEqual(registry.call("a", "echo", [1]), ["a", 1])
+        self.assertTrue(registry.send("a", "input", [2]))
+        self.assertEqual(handler.received, [("input", "a", [2])])
+        registry.release("a")
+        self.assertIsNone(registry.owner("a"))
+        self.assertFalse(registry.send("a", "input", [2]))
+        registry.set_checkpoint("a", b"data")
+        self.assertEqual(registry.get_checkpoint("a"), b"data")
+        registry.drop_checkpoint("a")
+        self.assertIsNone(registry.get_checkpoint("a"))
+
+
+class TestCheckpointWriter(unittest.TestCase):
+
+    def test_write(self):
+        registry = LocalRegistry()
+        writer = CheckpointWriter(registry)
+        writer.set("a", b"old")
+        writer.set("a", b"new")
+        writer.set("b", b"data")
+        writer.drop("b") # After its write
+        self.assertIsNone(registry.get_checkpoint("a")) # Not written yet
+        self.assertEqual(writer.get("a"), b"new")
+        self.assertIsNone(writer.get("b"))
+        writer.flush()
+        self.assertEqual(registry.get_checkpoint("a"), b"new")
+        self.assertIsNone(registry.get_checkpoint("b"))
+        self.assertEqual(writer.written, 2)
+        with mock.patch.object(registry, "set_checkpoint",
+            side_effect=ConnectionError):
+            writer.set("a", b"lost")
+            writer.flush()
+        self.assertEqual(writer.failed, 1)
+        self.assertEqual(writer.get("a"), b"new")
+
+
+class TestRedisRegistry(unittest.TestCase):
+
+    def setUp(self):
+        self.server = FakeRedis()
+        self.first = RedisRegistry(self.server, "first", ttl=5)
+        self.second = RedisRegistry(self.server, "second", cache=0)
+        handler.received = []
+        self.first.start(handler)
+        self.second.start(handler)
+
+    def tearDown(self):
+        self.first.stop()
+        self.second.stop()
+
+    def test_claim(self):
+        self.assertTrue(self.first.claim("a"))
+        self.assertFalse(self.second.claim("a"))
+        self.assertEqual(self.second.owner("a"), "first")
+        self.assertEqual(self.server.expires["tetris:room:a"], 5)
+        self.server.expires["tetris:room:a"] = 1
+        self.first.renew(["a"])
+        self.assertEqual(self.server.expires["tetris:room:a"], 5)
+        self.second.release("a") # Not the owner
+        self.assertEqual(self.second.owner("a"), "first")
+        self.first.release("a")
+        self.assertIsNone(self.second.owner("a"))
+        self.assertTrue(self.second.claim("a"))
+
+    def test_messages(self):
+        self.first.claim("a")
+        self.assertEqual(self.second.call("a", "echo", [1, "x"]),
+            ["a", 1, "x"])
+        self.assertTrue(self.second.send("a", "input", [2]))
+        self.assertEqual(self.second.call("a", "echo", []), ["a"])
+        self.assertEqual(handler.received, [("input", "a", [2])])
+        self.assertIsNone(self.second.call("b", "echo", []))
+        self.assertFalse(self.second.send("b", "input", []))
+
+    def test_call_timeout(self):
+        self.first.claim("a")
+        self.first.stop()
+        self.assertIsNone(self.second.call("a", "echo", [], 0.05))
+
+    def test_checkpoint(self):
+        self.first.set_checkpoint("a", b"data")
+        self.assertEqual(self.second.get_checkpoint("a"), b"data")
+        self.second.drop_checkpoint("a")
+        self.assertIsNone(self.first.get_checkpoint("a"))
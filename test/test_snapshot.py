@@ -0,0 +1,20 @@
+import unittest
+from server import snapshot
+
+
+class TestSnapshot(unittest.TestCase):
+
+    def test_round_trip(self):
+        state = {"boards": [["a", {"grid": [[0] * 10] * 20}]], "losses": 0}
+        data = snapshot.dump(state)
+        self.assertEqual(data[0], snapshot.VERSION)
+        self.assertEqual(snapshot.load(data), state)
+
+    def test_invalid(self):
+        data = snapshot.dump({})
+        with self.assertRaises(snapshot.SnapshotError):
+            snapshot.load(b"")
+        with self.assertRaises(snapshot.SnapshotError):
+            snapshot.load(bytes([snapshot.VERSION + 1]) + data[1:])
+        with self.assertRaises(snapshot.SnapshotError):
+            snapshot.load(data[:-2])
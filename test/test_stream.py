@@ -0,0 +1,40 @@
+import unittest
+from json import loads
+from server.buffer import FrameBuffer
+from server.stream import FrameStream
+
+
+class TestFrameStream(unittest.TestCase):
+
+    def setUp(self):
+        self.buffer = FrameBuffer()
+
+    def frame(self, *rows, bid="a"):
+        return self.buffer.publish(((bid, tuple(rows)),))
+
+    def test_delta(self):
+        stream = FrameStream()
+        self.assertIsNone(stream.keyframe())
+        first = loads(stream.encode(self.frame((0, 0), (1, 1))))
+        self.assertTrue(first["key"])
+        self.assertEqual(first["boards"][0]["grid"], [[0, 0], [1, 1]])
+        second = loads(stream.encode(self.frame((0, 1), (1, 1))))
+        self.assertNotIn("key", second)
+        self.assertEqual(second["base"], first["seq"])
+        self.assertEqual(second["boards"], [{"bid": "a", "rows": [[0, [0, 1]]]}])
+        # Late joiners get the whole latest frame
+        late = loads(stream.keyframe())
+        self.assertEqual(late["seq"], second["seq"])
+        self.assertEqual(late["boards"][0]["grid"], [[0, 1], [1, 1]])
+
+    def test_keyframe_interval(self):
+        stream = FrameStream(2)
+        keys = [loads(stream.encode(self.frame((n,)))).get("key", False)
+            for n in range(6)]
+        self.assertEqual(keys, [True, False, False, True, False, False])
+
+    def test_boards_changed(self):
+        stream = FrameStream()
+        stream.encode(self.frame((0,)))
+        changed = loads(stream.encode(self.frame((0,), bid="b")))
+        self.assertTrue(changed["key"])
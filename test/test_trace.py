@@ -0,0 +1,45 @@
+import time
+import unittest
+from server.metrics import Metrics
+from server.trace import LatencyTracer
+
+
+class TestLatencyTracer(unittest.TestCase):
+
+    def test_sample(self):
+        tracer = LatencyTracer(Metrics(), 3)
+        sampled = [tracer.sample("a") for _ in range(6)]
+        self.assertEqual([t is not None for t in sampled],
+            [False, False, True, False, False, True])
+        self.assertIsNone(LatencyTracer(Metrics(), 0).sample("a"))
+        trace = LatencyTracer(Metrics(), 1).sample("a", 4,
+            time.time() * 1000 - 50)
+        self.assertEqual(trace.seq, 4)
+        self.assertAlmostEqual(trace.uplink, 0.05, 1)
+
+    def test_path(self):
+        metrics = Metrics()
+        tracer = LatencyTracer(metrics, 1)
+        trace = tracer.sample("a")
+        tracer.applied(trace)
+        tracer.published([trace], 10)
+        self.assertFalse(tracer.emitted("a", 9))
+        self.assertFalse(tracer.emitted("b", 10))
+        self.assertTrue(tracer.emitted("a", 11))
+        tracer.acked("a", 11)
+        for stage in "queue", "tick", "output", "return", "total":
+            self.assertEqual(
+                metrics.histogram("trace_" + stage).get_count(), 1)
+        self.assertEqual(tracer.to_dict()["a"]["count"], 1)
+        tracer.close("a")
+        self.assertEqual(tracer.to_dict(), {})
+
+    def test_limit(self):
+        tracer = LatencyTracer(Metrics(), 1, 2)
+        traces = [tracer.sample("a") for _ in range(3)]
+        for trace in traces:
+            tracer.applied(trace)
+        tracer.published(traces, 1)
+        tracer.emitted("a", 1)
+        tracer.acked("a", 1)
+        self.assertEqual(tracer.to_dict()["a"]["count"], 2)
@@ -0,0 +1,305 @@
+"""Load generator for a locally running server (python main.py).
+
+Spins up N simulated hosts and 2N controllers. Each host creates a room
+with "host", controllers "join" it, the host sends "ready", and
+controllers then send a stream of "input" commands. Reports frames
+received, input-to-update latency (client side, from an input to the
+next update its room's host receives), and the server's /stats tick
+metrics over each step. Games end when a board tops out, so rooms that
+stop receiving updates are replaced to keep the number of live rooms up.
+With --ramp, rooms are added in steps until the server degrades.
+
+Requires the Socket.IO client: pip install "python-socketio[client]"
+
+    python tools/loadtest.py --rooms 20 --duration 30
+    python tools/loadtest.py --ramp 10 --max-rooms 200
+"""
+from argparse import ArgumentParser
+from math import log
+from json import dumps, loads
+from random import choice, random
+from threading import Event, Lock, Thread
+from urllib.request import urlopen
+import sys
+import time
+import os
+
+import socketio
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from server.metrics import Histogram # noqa: E402
+from server.protocol import encode_input # noqa: E402
+
+
+COMMANDS = ["left", "right", "rotate_cw", "rotate_ccw", "soft_drop",
+    "hard_drop", "hold"]
+WEIGHTS = [4, 4, 2, 1, 3, 1, 1] # Roughly how often players press each
+
+
+class Room:
+    """A simulated host and its two controllers."""
+
+    def __init__(self, url: str, rate: float, results):
+        """
+        url - Server URL.
+        rate - Inputs per second sent by each controller.
+        results - Shared Results.
+        """
+        self.url = url
+        self.rate = rate
+        self.results = results
+        self.room_id = None
+        self.greeted = Event()
+        self.pending = [] # Send times of inputs not yet seen in an update
+        self.lock = Lock()
+        self.host = socketio.Client(reconnection=False)
+        self.controllers = []
+        self.running = False
+        self.last_update = None # When the last update arrived
+        self.host.on("host greet", self._greet, namespace="/host")
+        self.host.on("update", self._update, namespace="/host")
+        self.host.on("trace", self._trace, namespace="/host")
+
+    def _greet(self, data):
+        self.room_id = data["room_id"]
+        self.greeted.set()
+
+    def _trace(self, seq):
+        self.host.emit("ack", (self.room_id, seq), namespace="/host")
+
+    def _update(self, data):
+        now = time.perf_counter()
+        self.last_update = now
+        self.results.frame()
+        with self.lock:
+            pending, self.pending = self.pending, []
+        for sent in pending:
+            self.results.latency(now - sent)
+
+    def start(self, timeout: float = 10) -> bool:
+        """Create, fill and start the room. Returns False on failure."""
+        self.host.connect(self.url, namespaces=["/host"])
+        self.host.emit("host", namespace="/host")
+        if not self.greeted.wait(timeout):
+            return False
+        for _ in range(2):
+            c = socketio.Client(reconnection=False)
+            c.connect(self.url)
+            ok = c.call("join", dumps({"room": self.room_id}),
+                timeout=timeout)
+            if not ok or not ok[0]:
+                return False
+            self.controllers.append((c, ok[2]))
+        ok = self.host.call("ready", self.room_id, namespace="/host",
+            timeout=timeout)
+        if not ok or not ok[0]:
+            return False
+        self.running = True
+        self.last_update = time.perf_counter() # Counts as live to start
+        for c, bid in self.controllers:
+            Thread(target=self._play, args=(c, bid), daemon=True).start()
+        return True
+
+    def _play(self, client, bid: str):
+        """Send inputs with exponential gaps averaging 1 / rate seconds."""
+        seq = 0
+        while self.running:
+            time.sleep(-1 / self.rate * _log(random()))
+            command = choice([c for c, w in zip(COMMANDS, WEIGHTS)
+                for _ in range(w)])
+            try:
+                with self.lock:
+                    self.pending.append(time.perf_counter())
+                client.emit("input", encode_input(command, seq,
+                    time.time() * 1000))
+                seq += 1
+                self.results.input()
+            except Exception:
+                self.running = False
+
+    def live(self, now: float, idle: float) -> bool:
+        """Check if the game still runs: updates arrived in the last idle
+        seconds. Ended games aren't sent updates anymore.
+        """
+        return self.running and now - self.last_update < idle
+
+    def stop(self):
+        self.running = False
+        clients = [c for c, _ in self.controllers] + [self.host]
+        threads = [Thread(target=c.disconnect) for c in clients]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+
+def _log(x: float) -> float:
+    return log(max(x, 1e-9))
+
+
+class Results:
+    """Client side counters, shared by every room."""
+
+    def __init__(self):
+        self._lock = Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.frames = 0
+            self.inputs = 0
+            self.latencies = Histogram()
+            self.start = time.perf_counter()
+
+    def frame(self):
+        with self._lock:
+            self.frames += 1
+
+    def input(self):
+        with self._lock:
+            self.inputs += 1
+
+    def latency(self, seconds: float):
+        with self._lock:
+            self.latencies.record(seconds)
+
+    def report(self) -> dict:
+        elapsed = time.perf_counter() - self.start
+        with self._lock:
+            return {
+                "seconds": round(elapsed, 1),
+                "frames_per_s": round(self.frames / elapsed, 1),
+                "inputs_per_s": round(self.inputs / elapsed, 1),
+                "input_to_update_ms": self.latencies.to_dict()
+            }
+
+
+def server_stats(url: str) -> dict:
+    """Fetch the server's /stats, empty if unavailable."""
+    try:
+        with urlopen(url.rstrip("/") + "/stats", timeout=5) as r:
+            return loads(r.read())
+    except Exception as e:
+        print(f"Could not fetch stats: {e}")
+        return {}
+
+
+def add_rooms(url: str, n: int, rate: float, results: Results) -> list:
+    rooms = []
+    for _ in range(n):
+        room = Room(url, rate, results)
+        try:
+            if room.start():
+                rooms.append(room)
+            else:
+                print("Room failed to start (server full?)")
+                room.stop()
+        except Exception as e:
+            print(f"Room failed to start: {e}")
+    return rooms
+
+
+def stop_rooms(rooms: list):
+    threads = [Thread(target=room.stop) for room in rooms]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+
+def top_up(url: str, rooms: list, target: int, rate: float,
+    results: Results, idle: float) -> list:
+    """Stop the rooms whose game ended and add rooms up to target.
+    Returns the rooms still running, then the new ones.
+    """
+    now = time.perf_counter()
+    live = [room for room in rooms if room.live(now, idle)]
+    stop_rooms([room for room in rooms if room not in live])
+    return live + add_rooms(url, target - len(live), rate, results)
+
+
+def step_p99(before: dict, after: dict, name: str) -> float:
+    """Get the p99 (ms) of a server histogram over a step only, from /stats
+    fetched before and after it. The /stats percentiles count everything
+    since the server started, which hides a step that degraded.
+    """
+    stats = after.get("histograms", {}).get(name)
+    if stats is None or "buckets" not in stats:
+        return 0
+    since = before.get("histograms", {}).get(name, {}).get("buckets")
+    hist = Histogram.from_buckets(stats["buckets"], stats["max"] / 1000)
+    return hist.percentile(99, since) * 1000
+
+
+def print_step(rooms: int, results: Results, before: dict, stats: dict):
+    """
+    rooms - Rooms live at the end of the step.
+    """
+    tick = step_p99(before, stats, "tick")
+    lag = step_p99(before, stats, "tick_lag")
+    traced = step_p99(before, stats, "trace_total")
+    report = results.report()
+    latency = report["input_to_update_ms"]
+    print(f"rooms {rooms:4d} (server running {stats.get('running', '?')}) "
+        f"| frames/s {report['frames_per_s']:8.1f} | "
+        f"inputs/s {report['inputs_per_s']:7.1f} | "
+        f"input->update p50 {latency['p50']:7.1f}ms p99 {latency['p99']:7.1f}ms"
+        f" | tick p99 {tick:6.1f}ms lag p99 {lag:6.1f}ms | traced p99 "
+        f"{traced:6.1f}ms | out {stats.get('output', {})}")
+    return report, tick, lag
+
+
+def main():
+    parser = ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", default="http://localhost:33507")
+    parser.add_argument("--rooms", type=int, default=10,
+        help="Rooms (N hosts, 2N controllers) to run")
+    parser.add_argument("--rate", type=float, default=5,
+        help="Inputs per second per controller")
+    parser.add_argument("--duration", type=float, default=20,
+        help="Seconds to measure (per step with --ramp)")
+    parser.add_argument("--ramp", type=int, default=0,
+        help="Rooms to add per step until the server degrades")
+    parser.add_argument("--max-rooms", type=int, default=500)
+    parser.add_argument("--max-lag", type=float, default=16.7,
+        help="Tick lag p99 (ms) considered degraded")
+    parser.add_argument("--max-latency", type=float, default=100,
+        help="Input to update p50 (ms) considered degraded")
+    parser.add_argument("--idle", type=float, default=3,
+        help="Seconds without updates after which a game counts as ended")
+    args = parser.parse_args()
+
+    results = Results()
+    rooms = []
+    try:
+        step = args.ramp if args.ramp > 0 else args.rooms
+        target = 0
+        while target < args.max_rooms:
+            target += step
+            rooms = top_up(args.url, rooms, target, args.rate, results,
+                args.idle)
+            results.reset()
+            before = server_stats(args.url)
+            end = time.perf_counter() + args.duration
+            while time.perf_counter() < end: # Replace games that ended
+                time.sleep(min(1, max(0, end - time.perf_counter())))
+                rooms = top_up(args.url, rooms, target, args.rate, results,
+                    args.idle)
+            now = time.perf_counter()
+            live = sum(1 for room in rooms if room.live(now, args.idle))
+            report, tick, lag = print_step(live, results, before,
+                server_stats(args.url))
+            if args.ramp < 1:
+                break
+            # Inputs without a visible effect wait for the next changed
+            # frame, so the median is the meaningful latency here
+            latency = report["input_to_update_ms"]["p50"]
+            if lag > args.max_lag or latency > args.max_latency:
+                print(f"Degraded at {live} live rooms")
+                break
+    finally:
+        stop_rooms(rooms)
+
+
+if __name__ == "__main__":
+    main()